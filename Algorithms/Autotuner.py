@@ -0,0 +1,236 @@
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+from FrameSource import FrameSource
+from SyntheticMotion import SyntheticMotion
+from Farneback import Farneback
+from DIS import DIS
+from HornSchunck import HornSchunck
+from BlockMatching import BlockMatching
+
+ENGINES = {
+    'farneback': Farneback,
+    'dis': DIS,
+    'hs': HornSchunck,
+    'bm': BlockMatching,
+}
+
+# Espaços de busca padrão. Chaves com ponto ('fb_params.levels') alteram um item do dicionário.
+SPACES = {
+    'farneback': {
+        'fb_params.levels': [1, 2, 3, 5],
+        'fb_params.winsize': [9, 15, 21],
+        'fb_params.iterations': [1, 3, 5],
+        'scale_factor': [0.25, 0.5, 0.75],
+    },
+    'dis': {
+        'preset': ['ultrafast', 'fast', 'medium'],
+        'variational_refinement': [True, False],
+        'scale_factor': [0.25, 0.5, 0.75, 1.0],
+    },
+    'hs': {
+        'alpha': [5.0, 10.0, 20.0, 40.0],
+        'iterations': [10, 20, 40, 80],
+        'derivative': ['hs', 'sobel', 'scharr'],
+        'scale_factor': [0.25, 0.5, 0.75],
+    },
+    'bm': {
+        'block_size': [8, 16, 32],
+        'search_range': [4, 7, 15],
+        'search': ['diamond', 'three_step'],
+        'scale_factor': [0.5, 1.0],
+    },
+}
+
+def configure(engine, params):
+    """Aplica um conjunto de parâmetros (como os do Autotuner) a um algoritmo já criado."""
+    for name, value in params.items():
+        if '.' in name:
+            attr, key = name.split('.', 1)
+            getattr(engine, attr)[key] = value
+        else:
+            setattr(engine, name, value)
+    if hasattr(engine, '_create_dis'):
+        engine._dis = engine._create_dis() # Preset/refinamento só valem recriando o DIS
+    return engine
+
+def resize_flow(flow, size, scale=None):
+    """
+    Leva o fluxo para outra resolução (w, h), reescalando também os vetores.
+    :param scale: Escala de processamento em que os vetores foram medidos (scale_factor
+                  do algoritmo). Se None, é deduzida do tamanho do fluxo (fluxo denso);
+                  para grades de blocos (BlockMatching) é preciso informar.
+    """
+    w, h = size
+    fh, fw = flow.shape[:2]
+    factor = np.float32([w / fw, h / fh]) if scale is None else np.float32(1.0 / scale)
+    if (fw, fh) != (w, h):
+        flow = cv.resize(flow, (w, h), interpolation=cv.INTER_LINEAR)
+    return flow * factor if np.any(factor != 1.0) else flow
+
+def endpoint_error(flow, gt, scale=None):
+    """EPE médio: distância entre o vetor estimado e o verdadeiro (na resolução do gt)."""
+    flow = resize_flow(flow, (gt.shape[1], gt.shape[0]), scale)
+    return float(np.linalg.norm(flow - gt, axis=2).mean())
+
+def warp_error(prev, gray, flow, scale=None):
+    """
+    Erro fotométrico (proxy de precisão sem ground truth): desloca `gray` pelo fluxo
+    e compara com `prev`. Média do |erro| em níveis de cinza, só onde a amostra cai
+    dentro da imagem. Fluxo em qualquer resolução (é levado à resolução de prev).
+    """
+    h, w = prev.shape[:2]
+    flow = resize_flow(flow, (w, h), scale)
+    xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    map_x = xs + flow[..., 0]
+    map_y = ys + flow[..., 1]
+    warped = cv.remap(gray, map_x, map_y, cv.INTER_LINEAR)
+    valid = (map_x >= 0) & (map_x <= w - 1) & (map_y >= 0) & (map_y <= h - 1)
+    if not valid.any():
+        return float('inf')
+    return float(np.abs(prev.astype(np.float32) - warped.astype(np.float32))[valid].mean())
+
+# --- Processos de avaliação (cada um carrega as amostras uma vez só) ---
+
+_clips = None
+
+def _load_clips(clips, max_frames):
+    """Cada amostra vira (frames em cinza, fluxos verdadeiros ou None)."""
+    global _clips
+    cv.setNumThreads(1) # Uma configuração por núcleo: tempos comparáveis entre si
+    _clips = []
+    for clip in clips:
+        if isinstance(clip, SyntheticMotion):
+            frames, flows = clip.generate()
+            grays = [cv.cvtColor(frame, cv.COLOR_BGR2GRAY) for frame in frames[:max_frames]]
+            _clips.append((grays, flows))
+            continue
+        source = FrameSource(clip)
+        grays = []
+        while len(grays) < max_frames:
+            ret, _, gray = source.read_gray(1.0, need_color=False)
+            if not ret: break
+            grays.append(gray)
+        source.release()
+        _clips.append((grays, None))
+
+def _evaluate(engine_name, params):
+    """
+    Mede ms por par (só o cálculo do fluxo) e o erro médio de uma configuração:
+    EPE onde há ground truth (SyntheticMotion), erro fotométrico nas demais.
+    """
+    engine = configure(ENGINES[engine_name](None), params)
+    initial_state = engine._get_state()
+    scale = engine.scale_factor
+    elapsed, pairs, errors = 0.0, 0, []
+    for grays, gt in _clips:
+        h, w = grays[0].shape
+        size = (max(int(w * scale), 1), max(int(h * scale), 1))
+        small = [g if scale == 1.0 else cv.resize(g, size, interpolation=cv.INTER_AREA) for g in grays]
+        engine._set_state(initial_state)
+        engine._process_and_draw(None, small[0])
+        for i in range(1, len(small)):
+            t0 = time.perf_counter()
+            engine._process_and_draw(None, small[i])
+            elapsed += time.perf_counter() - t0
+            pairs += 1
+            # O erro é medido na resolução original, para comparar escalas diferentes
+            if gt is not None:
+                errors.append(endpoint_error(engine.last_flow, gt[i - 1], scale))
+            else:
+                errors.append(warp_error(grays[i - 1], grays[i], engine.last_flow, scale))
+    return dict(params=params, ms_per_pair=1000 * elapsed / max(pairs, 1),
+                error=float(np.mean(errors)) if errors else float('inf'), pairs=pairs)
+
+class Autotuner:
+    """
+    Busca automática de parâmetros (velocidade x precisão) para um algoritmo denso.
+
+    Cada configuração roda sobre amostras curtas (clips) em paralelo, um processo por
+    núcleo (com o OpenCV em 1 thread, para os tempos serem comparáveis). Para cada uma
+    mede o tempo por par e o erro: EPE contra o ground truth nas amostras sintéticas
+    (SyntheticMotion) e erro fotométrico (warp_error) nas reais. O resultado é a frente de
+    Pareto (nenhuma outra configuração é mais rápida E mais precisa) e um preset
+    recomendado para cada orçamento de tempo.
+    """
+
+    def __init__(self, engine, clips, space=None, max_frames=20, workers=None):
+        """
+        :param engine: 'farneback', 'dis', 'hs' ou 'bm'.
+        :param clips: Lista de amostras curtas: vídeos ou pastas da câmera de interesse,
+                      ou SyntheticMotion (com ground truth, em qualquer resolução).
+                      Não misture os dois tipos: as métricas têm escalas diferentes.
+        :param space: Dicionário parâmetro -> valores (padrão: SPACES[engine]).
+        :param max_frames: Frames usados de cada amostra.
+        :param workers: Processos em paralelo (padrão: número de núcleos).
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Algoritmo desconhecido: {engine}. Use: {', '.join(ENGINES)}")
+        self.engine = engine
+        self.clips = list(clips)
+        self.space = space or SPACES[engine]
+        self.max_frames = max_frames
+        self.workers = workers or os.cpu_count()
+        self.results = []
+
+    def candidates(self, search='grid', n=30, seed=0):
+        """Configurações a avaliar: grade completa ou n sorteadas (sem repetição) dela."""
+        names = list(self.space)
+        grid = [dict(zip(names, values)) for values in itertools.product(*self.space.values())]
+        if search == 'grid':
+            return grid
+        if search == 'random':
+            return random.Random(seed).sample(grid, min(n, len(grid)))
+        raise ValueError("Busca desconhecida. Use: 'grid', 'random'")
+
+    def run(self, search='grid', n=30, seed=0):
+        """Avalia as configurações em paralelo e retorna a frente de Pareto."""
+        candidates = self.candidates(search, n, seed)
+        print(f"Autotuner {self.engine}: {len(candidates)} configurações, "
+              f"{len(self.clips)} amostras, {self.workers} processos")
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_load_clips,
+                                 initargs=(self.clips, self.max_frames)) as pool:
+            futures = [pool.submit(_evaluate, self.engine, params) for params in candidates]
+            self.results = [f.result() for f in futures]
+        return self.pareto()
+
+    def pareto(self):
+        """Configurações não dominadas, da mais rápida para a mais precisa."""
+        front = []
+        for r in sorted(self.results, key=lambda r: (r['ms_per_pair'], r['error'])):
+            if not front or r['error'] < front[-1]['error']:
+                front.append(r)
+        return front
+
+    def recommend(self, budgets_ms=(10, 33, 100)):
+        """Para cada orçamento (ms por par), a configuração mais precisa que cabe nele."""
+        presets = {}
+        for budget in budgets_ms:
+            fitting = [r for r in self.results if r['ms_per_pair'] <= budget]
+            presets[budget] = min(fitting, key=lambda r: r['error']) if fitting else None
+        return presets
+
+    def save(self, path, budgets_ms=(10, 33, 100)):
+        """Salva resultados, frente de Pareto e presets em JSON (ex: um arquivo por câmera)."""
+        data = dict(engine=self.engine, clips=[str(clip) for clip in self.clips], max_frames=self.max_frames,
+                    results=self.results, pareto=self.pareto(),
+                    presets={str(b): r for b, r in self.recommend(budgets_ms).items()})
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+if __name__ == "__main__":
+    tuner = Autotuner('farneback', ['Dataset/cars6'], max_frames=20)
+    # Com ground truth (EPE), na resolução da câmera-alvo:
+    #tuner = Autotuner('farneback', [SyntheticMotion(1280, 720, 20, rotation=0.5, seed=s) for s in range(3)])
+    for r in tuner.run(search='random', n=24):
+        print(f"{r['ms_per_pair']:8.1f} ms | erro {r['error']:6.2f} | {r['params']}")
+    for budget, r in tuner.recommend((10, 33, 100)).items():
+        print(f"Orçamento {budget} ms: {r['params'] if r else 'nenhuma configuração cabe'}")
+    tuner.save('Outputs/autotune_farneback.json')
@@ -0,0 +1,233 @@
+import cv2 as cv
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from Farneback import Farneback
+
+class BlockMatching(Farneback):
+    """
+    Fluxo Óptico grosseiro por Casamento de Blocos (Block Matching).
+    Um vetor de movimento por bloco (ex: 16x16), pensado para rodar em
+    tempo real em hardware fraco (rig de caminhada embarcado).
+
+    Características:
+    - Custo SAD ou SSD (médio por pixel) calculado de forma vetorizada para todos os blocos.
+    - Busca 'full' (exaustiva), 'diamond' ou 'three_step' (com parada antecipada).
+    - Vetores do frame anterior usados como preditores.
+    - Saída: grade de baixa resolução (n_blocos_y, n_blocos_x, 2), que a
+      visualização do Farneback já sabe redimensionar.
+    """
+
+    # Padrões de busca (dx, dy)
+    LARGE_DIAMOND = np.array([(0, 0), (2, 0), (-2, 0), (0, 2), (0, -2),
+                              (1, 1), (1, -1), (-1, 1), (-1, -1)])
+    SMALL_DIAMOND = np.array([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)])
+    SQUARE = np.array([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1),
+                       (1, 1), (1, -1), (-1, 1), (-1, -1)])
+
+    _state_attrs = Farneback._state_attrs + ('prev_vectors',)
+
+    def __init__(self, input_source, block_size=16, search_range=7, search='diamond',
+                 metric='sad', flow_cache=None, global_motion=None,
+                 temporal_filter=None, consistency=None):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param block_size: Lado do bloco em pixels (na resolução de processamento).
+        :param search_range: Deslocamento máximo (pixels) em cada direção.
+        :param search: 'diamond', 'three_step' ou 'full'.
+        :param metric: 'sad' (soma das diferenças absolutas) ou 'ssd' (quadráticas).
+        :param flow_cache: FlowCache opcional (ver Farneback).
+        :param global_motion: GlobalMotion opcional (ver Farneback).
+        :param temporal_filter: TemporalFilter opcional (ver Farneback).
+        :param consistency: ConsistencyCheck opcional (ver Farneback).
+        """
+        if search not in ('diamond', 'three_step', 'full'):
+            raise ValueError("Busca desconhecida. Use: 'diamond', 'three_step', 'full'")
+        if metric not in ('sad', 'ssd'):
+            raise ValueError("Métrica desconhecida. Use: 'sad', 'ssd'")
+
+        super().__init__(input_source, flow_cache=flow_cache, global_motion=global_motion,
+                         temporal_filter=temporal_filter, consistency=consistency)
+
+        # --- Parâmetros Block Matching ---
+        self.scale_factor = 1.0 # Blocos já reduzem a resolução; não precisa de downscale
+        self.block_size = block_size
+        self.search_range = search_range
+        self.search = search
+        self.metric = metric
+        # Parada antecipada: bloco cujo custo médio por pixel fica abaixo disso
+        # com o melhor preditor não é mais buscado (fundo parado).
+        self.early_stop = 2.0
+        self.max_diamond_steps = 8
+
+        # Vetores do par anterior (preditores temporais)
+        self.prev_vectors = None
+
+    def _cache_params(self):
+        return dict(block_size=self.block_size, search_range=self.search_range,
+                    search=self.search, metric=self.metric, early_stop=self.early_stop,
+                    scale_factor=self.scale_factor)
+
+    # ------------------------------------------------------------------ custo
+
+    def _setup_frame(self, prev_gray, gray_frame):
+        """
+        Prepara o par atual. O custo de um candidato pode vir de dois caminhos:
+        - Volume (deslocamento, bloco_y, bloco_x): um deslocamento é calculado UMA
+          vez para TODOS os blocos (diferença do frame inteiro + média por bloco).
+          Compensa quando muitos blocos ativos compartilham poucos deslocamentos.
+        - Gather: copia só os blocos candidatos (janelas deslizantes, sem cópia do
+          frame). Compensa quando restam poucos blocos ativos, espalhados.
+        """
+        bs, R = self.block_size, self.search_range
+        self._nby, self._nbx = prev_gray.shape[0] // bs, prev_gray.shape[1] // bs
+        self._h, self._w = self._nby * bs, self._nbx * bs
+        n = self._nby * self._nbx
+
+        self._prev = prev_gray[:self._h, :self._w]
+        self._blocks = self._prev.reshape(self._nby, bs, self._nbx, bs).transpose(0, 2, 1, 3).reshape(n, 1, bs * bs)
+        # Frame atual com borda replicada de R pixels: qualquer deslocamento em [-R, R] é válido
+        self._ref = cv.copyMakeBorder(gray_frame, R, R, R, R, cv.BORDER_REPLICATE)
+        self._windows = sliding_window_view(self._ref, (bs, bs))
+
+        side = 2 * R + 1
+        self._volume = np.empty((side, side, self._nby, self._nbx), dtype=np.float32)
+        self._computed = np.zeros((side, side), dtype=bool)
+        self._by, self._bx = np.divmod(np.arange(n), self._nbx)
+
+    def _cost_map(self, dx, dy):
+        """Custo médio por pixel de todos os blocos para o deslocamento (dx, dy)."""
+        R = self.search_range
+        i, j = dy + R, dx + R
+        shifted = self._ref[i:i + self._h, j:j + self._w]
+        diff = cv.absdiff(shifted, self._prev)
+        if self.metric == 'sad':
+            diff = diff.astype(np.float32)
+        else:
+            diff = cv.multiply(diff, diff, dtype=cv.CV_32F)
+        # INTER_AREA com razão inteira = média exata de cada bloco
+        self._volume[i, j] = cv.resize(diff, (self._nbx, self._nby), interpolation=cv.INTER_AREA)
+        self._computed[i, j] = True
+
+    def _gather_cost(self, ids, dx, dy):
+        """Custo médio por pixel copiando só os blocos candidatos."""
+        bs, R = self.block_size, self.search_range
+        n, K = dx.shape
+        y = self._by[ids][:, None] * bs + R + dy
+        x = self._bx[ids][:, None] * bs + R + dx
+        cand = self._windows[y, x].reshape(n * K, bs * bs)
+        blocks = np.broadcast_to(self._blocks[ids], (n, K, bs * bs)).reshape(n * K, bs * bs)
+        diff = cv.absdiff(cand, blocks)
+        if self.metric == 'sad':
+            cost = diff.sum(axis=1, dtype=np.int32)
+        else:
+            cost = cv.multiply(diff, diff, dtype=cv.CV_32F).sum(axis=1)
+        return cost.reshape(n, K).astype(np.float32) / (bs * bs)
+
+    def _cost(self, ids, dx, dy):
+        """
+        Custo de cada bloco ids[i] para cada candidato (dx[i, k], dy[i, k]).
+        Retorna (len(ids), K), escolhendo o caminho mais barato (ver _setup_frame).
+        """
+        R, side = self.search_range, 2 * self.search_range + 1
+        codes = np.unique((dy + R) * side + (dx + R))
+        missing = codes[~self._computed.ravel()[codes]]
+
+        # Gather custa ~2x mais por pixel que o caminho do volume (operações do OpenCV)
+        if 2 * dx.size * self.block_size ** 2 < missing.size * self._h * self._w:
+            return self._gather_cost(ids, dx, dy)
+
+        for code in missing:
+            i, j = divmod(int(code), side)
+            self._cost_map(j - R, i - R)
+        return self._volume[dy + R, dx + R, self._by[ids][:, None], self._bx[ids][:, None]]
+
+    # ---------------------------------------------------------------- buscas
+
+    def _refine(self, ids, best, best_cost, pattern, step=1):
+        """Avalia o padrão ao redor do melhor vetor atual; retorna quem mudou de centro."""
+        R = self.search_range
+        dx = np.clip(best[ids, 0][:, None] + pattern[:, 0] * step, -R, R)
+        dy = np.clip(best[ids, 1][:, None] + pattern[:, 1] * step, -R, R)
+        costs = self._cost(ids, dx, dy)
+        k = costs.argmin(axis=1)
+        rows = np.arange(len(ids))
+        best[ids, 0] = dx[rows, k]
+        best[ids, 1] = dy[rows, k]
+        best_cost[ids] = costs[rows, k]
+        return k != 0 # centro (índice 0) continua sendo o melhor -> convergiu
+
+    def _full_search(self):
+        """Busca exaustiva: calcula o volume inteiro e pega o mínimo de cada bloco."""
+        R, side = self.search_range, 2 * self.search_range + 1
+        for dy in range(-R, R + 1):
+            for dx in range(-R, R + 1):
+                self._cost_map(dx, dy)
+        k = self._volume.reshape(side * side, -1).argmin(axis=0)
+        dy, dx = np.divmod(k, side)
+        return np.stack((dx - R, dy - R), axis=1)
+
+    def _calc_flow(self, prev_gray, gray_frame):
+        self._setup_frame(prev_gray, gray_frame)
+        nby, nbx = self._nby, self._nbx
+        n = nby * nbx
+
+        if self.search == 'full':
+            best = self._full_search()
+        else:
+            # 1. Preditores: vetor zero e vetor do mesmo bloco no par anterior
+            ids = np.arange(n)
+            predictors = np.zeros((n, 2, 2), dtype=np.int64)
+            if self.prev_vectors is not None and self.prev_vectors.shape[:2] == (nby, nbx):
+                predictors[:, 1] = np.rint(self.prev_vectors.reshape(n, 2))
+            costs = self._cost(ids, predictors[..., 0], predictors[..., 1])
+            k = costs.argmin(axis=1)
+            best = predictors[ids, k].copy()
+            best_cost = costs[ids, k]
+
+            # 2. Parada antecipada: blocos já bons com o preditor não são buscados
+            active = ids[best_cost > self.early_stop]
+
+            # 3. Refinamento pelo padrão escolhido (só nos blocos ativos)
+            if self.search == 'diamond':
+                searched = active
+                # Diamante grande até o centro ser o melhor (cada bloco para sozinho)
+                for _ in range(self.max_diamond_steps):
+                    if active.size == 0: break
+                    moved = self._refine(active, best, best_cost, self.LARGE_DIAMOND)
+                    active = active[moved]
+                # Ajuste final com o diamante pequeno
+                if searched.size:
+                    self._refine(searched, best, best_cost, self.SMALL_DIAMOND)
+            else:
+                step = max(1, (self.search_range + 1) // 2)
+                while step >= 1 and active.size:
+                    self._refine(active, best, best_cost, self.SQUARE, step)
+                    step //= 2
+
+        flow = best.reshape(nby, nbx, 2).astype(np.float32)
+        self.prev_vectors = flow
+        return flow
+
+    def _flow_cell(self):
+        return self.block_size
+
+    def _flow_step(self):
+        return 1 # Vetores inteiros (sem refinamento subpixel)
+
+    def _calc_reverse(self, gray_frame, prev_gray, init=None):
+        """
+        Volta com o fluxo de ida negado como preditor de cada bloco (no lugar do
+        vetor do par anterior): a maioria dos blocos para já no preditor.
+        """
+        prev_vectors = self.prev_vectors
+        self.prev_vectors = init
+        try:
+            return self._calc_flow(gray_frame, prev_gray)
+        finally:
+            self.prev_vectors = prev_vectors
+
+    def _compute_flow(self, prev_gray, gray_frame):
+        # Mesmo vindo do cache, o fluxo vira o preditor do próximo par
+        flow = super()._compute_flow(prev_gray, gray_frame)
+        self.prev_vectors = flow
+        return flow
@@ -0,0 +1,122 @@
+import cv2 as cv
+import os
+import pickle
+
+class Checkpoint:
+    """
+    Checkpoint periódico para execuções longas (ex: nós de batch preemptíveis).
+
+    A cada `every` frames, salva o estado do algoritmo (prev_gray, p0, ...) e a
+    posição na entrada, e fecha o segmento de vídeo atual. Um job reiniciado com
+    o mesmo checkpoint continua do último ponto salvo em vez do frame zero.
+
+    Com checkpoint, o vídeo de saída é sempre gravado em segmentos
+    ('<saida>.partNNNN.mp4') e juntado no final. Como os cortes caem sempre nos
+    mesmos frames, uma execução interrompida e retomada gera exatamente o mesmo
+    resultado final que uma execução direta.
+    """
+
+    def __init__(self, path, every=500, fps=20.0):
+        """
+        :param path: Arquivo do checkpoint (ex: 'Outputs/job.ckpt').
+        :param every: Intervalo (em frames) entre checkpoints.
+        :param fps: FPS dos segmentos de vídeo (o mesmo dos algoritmos).
+        """
+        self.path = path
+        self.every = every
+        self.fps = fps
+        self.frames_done = 0
+        self.segments = [] # Segmentos já fechados (e seguros em disco)
+        self._writer = None
+        self._segment_path = None
+        self._output_file = None
+
+    def resume(self, engine):
+        """
+        Restaura o estado do algoritmo e a posição da entrada, se houver checkpoint.
+        Retorna o número de frames já processados (0 se começar do zero).
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, 'rb') as f:
+            data = pickle.load(f)
+
+        engine._set_state(data['engine'])
+        engine.source.seek(data['position'])
+        self.frames_done = data['frames_done']
+        self.segments = data['segments']
+        print(f"Retomando do checkpoint: {self.frames_done} frames já processados")
+        return self.frames_done
+
+    def write(self, image, output_file):
+        """Grava um frame no segmento atual (abre um novo se preciso)."""
+        if self._writer is None:
+            self._output_file = output_file
+            stem, ext = os.path.splitext(output_file)
+            self._segment_path = f"{stem}.part{len(self.segments):04d}{ext}"
+            h, w = image.shape[:2]
+            fourcc = cv.VideoWriter_fourcc(*'mp4v')
+            self._writer = cv.VideoWriter(self._segment_path, fourcc, self.fps, (w, h))
+        self._writer.write(image)
+
+    def step(self, engine):
+        """Chamar depois de cada frame processado."""
+        self.frames_done += 1
+        if self.frames_done % self.every == 0:
+            self.save(engine)
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self.segments.append(self._segment_path)
+            self._writer = None
+
+    def save(self, engine):
+        """Fecha o segmento atual e grava o estado de forma atômica."""
+        self._close_segment()
+        data = dict(engine=engine._get_state(), frames_done=self.frames_done,
+                    position=engine.source.position, segments=self.segments)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def finalize(self, output_file=None):
+        """Junta os segmentos no vídeo final e apaga o checkpoint."""
+        self._close_segment()
+        output_file = output_file or self._output_file
+        if output_file and self.segments:
+            self._concat(output_file)
+            for segment in self.segments:
+                os.remove(segment)
+        self.segments = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _concat(self, output_file):
+        """Junta os segmentos: com ffmpeg (sem recodificar) se existir; senão, via OpenCV."""
+        import shutil, subprocess # Só no fim do job (importação lenta para jobs curtos)
+        if shutil.which('ffmpeg'):
+            list_path = output_file + '.txt'
+            with open(list_path, 'w') as f:
+                for segment in self.segments:
+                    f.write(f"file '{os.path.abspath(segment)}'\n")
+            subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_path, '-c', 'copy', output_file], check=True)
+            os.remove(list_path)
+            return
+
+        writer = None
+        for segment in self.segments:
+            cap = cv.VideoCapture(segment)
+            while True:
+                ret, frame = cap.read()
+                if not ret: break
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    fourcc = cv.VideoWriter_fourcc(*'mp4v')
+                    writer = cv.VideoWriter(output_file, fourcc, self.fps, (w, h))
+                writer.write(frame)
+            cap.release()
+        if writer: writer.release()
@@ -0,0 +1,67 @@
+import cv2 as cv
+import numpy as np
+
+class ConsistencyCheck:
+    """
+    Confiabilidade do fluxo denso pela consistência ida-e-volta (forward-backward).
+
+    Se o fluxo de ida leva o pixel x para x + F(x), o fluxo de volta naquele ponto,
+    B(x + F(x)), deveria trazê-lo de volta: F(x) + B(x + F(x)) ~ 0. Onde isso
+    falha, o pixel está ocluído (some no frame seguinte) ou o vetor não é confiável:
+
+        |F + B'|^2 > rel * (|F|^2 + |B'|^2) + abs_px^2
+
+    (critério de Sundaram et al., 2010), com B' = B amostrado em x + F(x) via
+    cv.remap. Pixels que saem da imagem também contam como ocluídos. Para vetores
+    quantizados (BlockMatching, passo inteiro), abs_px cresce com o passo.
+    """
+
+    def __init__(self, rel=0.01, abs_px=0.7):
+        """
+        :param rel: Tolerância relativa ao tamanho dos vetores.
+        :param abs_px: Tolerância absoluta (px) para vetores pequenos.
+        """
+        self.rel = rel
+        self.abs_px = abs_px
+        self._grid_cache = {}
+
+    def params(self):
+        """Configuração da verificação (como GlobalMotion.params)."""
+        return dict(rel=self.rel, abs_px=self.abs_px)
+
+    def _grid(self, shape):
+        """Coordenadas (x, y) de cada pixel, calculadas uma vez por resolução."""
+        if shape not in self._grid_cache:
+            h, w = shape
+            xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+            self._grid_cache[shape] = (xs, ys)
+        return self._grid_cache[shape]
+
+    def mask(self, forward, backward, cell=1, step=0):
+        """
+        :param forward: Fluxo de ida (H, W, 2), do frame anterior para o atual.
+        :param backward: Fluxo de volta (H, W, 2), do atual para o anterior.
+        :param cell: Pixels por célula do fluxo (ex: block_size do BlockMatching,
+                     cujo fluxo é uma grade de blocos com vetores em pixels).
+        :param step: Quantização dos vetores em pixels (0 = subpixel; 1 no
+                     BlockMatching, de passo inteiro). Ida e volta arredondam cada
+                     uma até step/2 por componente, então a tolerância absoluta
+                     vira abs_px + step.
+        :return: Máscara (H, W) bool: True = vetor consistente, False = ocluído/não confiável.
+        """
+        h, w = forward.shape[:2]
+        xs, ys = self._grid((h, w))
+        fx, fy = forward[..., 0], forward[..., 1]
+        map_x = xs + fx / cell if cell != 1 else xs + fx
+        map_y = ys + fy / cell if cell != 1 else ys + fy
+        # Borda replicada: com NaN de borda, a interpolação contamina até os pontos
+        # exatamente na última linha/coluna (peso 0 * NaN). Quem sai da célula
+        # da borda para fora da imagem é marcado à parte.
+        warped = cv.remap(backward, map_x, map_y, cv.INTER_LINEAR,
+                          borderMode=cv.BORDER_REPLICATE)
+        inside = (map_x >= -0.5) & (map_x <= w - 0.5) & (map_y >= -0.5) & (map_y <= h - 0.5)
+
+        bx, by = warped[..., 0], warped[..., 1]
+        err = (fx + bx) ** 2 + (fy + by) ** 2
+        tolerance = self.rel * (fx * fx + fy * fy + bx * bx + by * by) + (self.abs_px + step) ** 2
+        return (err <= tolerance) & inside
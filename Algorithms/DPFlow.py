@@ -0,0 +1,391 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from functools import partial
+
+import cv2 as cv
+import numpy as np
+from Farneback import Farneback
+from MemoryBudget import MemoryBudget, format_size
+
+def ptlflow_loader(model='dpflow', ckpt_path='sintel', threads=None):
+    """
+    Carrega um modelo do ptlflow (ex: DPFlow) para inferência em CPU.
+    O torch e o ptlflow só são importados aqui, dentro do worker: quem não usa
+    fluxo aprendido não paga a importação (nem precisa ter os pacotes).
+
+    :return: infer(prev, next) com lotes BGR uint8 (N, H, W, 3) -> fluxos (N, H, W, 2)
+    """
+    import torch
+    import ptlflow
+
+    if threads:
+        torch.set_num_threads(threads)
+    net = ptlflow.get_model(model, ckpt_path=ckpt_path).eval()
+    stride = getattr(net, 'output_stride', 32)
+
+    def infer(prev, nxt):
+        n, h, w = prev.shape[:3]
+        # O modelo exige lados múltiplos do stride: completa com borda replicada
+        pad_h, pad_w = -h % stride, -w % stride
+        images = np.stack([prev, nxt], axis=1) # (N, 2, H, W, 3)
+        if pad_h or pad_w:
+            images = np.pad(images, ((0, 0), (0, 0), (0, pad_h), (0, pad_w), (0, 0)), mode='edge')
+        tensor = torch.from_numpy(images).permute(0, 1, 4, 2, 3).float() / 255.0
+        with torch.inference_mode():
+            flows = net({'images': tensor})['flows'][:, 0] # (N, 2, H, W)
+        return flows.permute(0, 2, 3, 1).numpy()[:, :h, :w].astype(np.float32)
+
+    return infer
+
+def stand_in_loader(preset=cv.DISOPTICAL_FLOW_PRESET_FAST):
+    """
+    Modelo substituto, sem torch: mesma interface em lote do ptlflow_loader, mas
+    calculado com DIS par a par. Serve para testar o pipeline (lotes, tiles, worker)
+    em máquinas sem o modelo treinado.
+    """
+    dis = cv.DISOpticalFlow_create(preset)
+
+    def infer(prev, nxt):
+        return np.stack([dis.calc(cv.cvtColor(a, cv.COLOR_BGR2GRAY), cv.cvtColor(b, cv.COLOR_BGR2GRAY), None)
+                         for a, b in zip(prev, nxt)])
+
+    return infer
+
+class _ModelWorker:
+    """
+    Thread de longa duração que mantém o modelo carregado e atende pedidos em lote.
+    Um worker é compartilhado por todas as instâncias de DPFlow com o mesmo modelo:
+    processar vários clipes seguidos não recarrega nada.
+    """
+
+    _workers = {}
+    _lock = threading.Lock()
+    batch_window = 0.02 # s
+
+    @classmethod
+    def get(cls, key, loader, batch_size):
+        with cls._lock:
+            worker = cls._workers.get(key)
+            if worker is None:
+                worker = cls._workers[key] = _ModelWorker(loader, batch_size)
+            worker.batch_size = max(worker.batch_size, batch_size)
+            return worker
+
+    def __init__(self, loader, batch_size):
+        self.loader = loader
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.pairs = 0
+        self.load_seconds = None
+        threading.Thread(target=self._loop, name='dpflow-worker', daemon=True).start()
+
+    def submit(self, prev, nxt, batch_size=None):
+        """
+        :param batch_size: Maior lote em que este par pode entrar (ex: o lote que cabe no
+                           orçamento de memória de quem enviou). None = o lote do worker.
+        """
+        from concurrent.futures import Future # Importado no primeiro par, não no import do módulo
+        future = Future()
+        self.queue.put((prev, nxt, future, batch_size or self.batch_size))
+        return future
+
+    def _loop(self):
+        t0 = time.perf_counter()
+        try:
+            infer = self.loader()
+        except Exception as e:
+            # Sem modelo: todos os pedidos (atuais e futuros) recebem o erro
+            while True:
+                self.queue.get()[2].set_exception(e)
+        self.load_seconds = time.perf_counter() - t0
+
+        while True:
+            # Espera um pouco pelos próximos pares para formar o lote
+            items = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            # Um lote precisa de imagens do mesmo tamanho (tiles e frames de um clipe são)
+            # e não passa do lote pedido por quem enviou os pares
+            groups = {}
+            for item in items:
+                groups.setdefault((item[0].shape, item[3]), []).append(item)
+            for (_, limit), same in groups.items():
+                for i in range(0, len(same), limit):
+                    self._infer(infer, same[i:i + limit])
+
+    def _infer(self, infer, group):
+        try:
+            flows = infer(np.stack([g[0] for g in group]), np.stack([g[1] for g in group]))
+            for (_, _, future, _), flow in zip(group, flows):
+                future.set_result(flow)
+        except Exception as e:
+            for _, _, future, _ in group:
+                future.set_exception(e)
+        self.batches += 1
+        self.pairs += len(group)
+
+class _TiledFlow:
+    """Resultado de um par dividido em tiles: junta os fluxos com pesos suaves nas bordas."""
+
+    def __init__(self, shape, tiles):
+        self.shape = shape
+        self.tiles = tiles # [(y0, x0, h, w, future)]
+
+    def result(self):
+        h, w = self.shape
+        flow = np.zeros((h, w, 2), np.float32)
+        weight = np.zeros((h, w, 1), np.float32)
+        for y0, x0, th, tw, future in self.tiles:
+            # Peso que cai para perto de 0 nas bordas do tile (sem costuras visíveis)
+            wy = np.minimum(np.arange(th) + 1, th - np.arange(th)).astype(np.float32)
+            wx = np.minimum(np.arange(tw) + 1, tw - np.arange(tw)).astype(np.float32)
+            tile_weight = np.minimum.outer(wy, wx)[..., None]
+            flow[y0:y0 + th, x0:x0 + tw] += future.result() * tile_weight
+            weight[y0:y0 + th, x0:x0 + tw] += tile_weight
+        return flow / np.maximum(weight, 1e-6)
+
+class DPFlow(Farneback):
+    """
+    Fluxo óptico aprendido (DPFlow, via ptlflow) com a mesma interface do Farneback.
+
+    Em vez de rodar o infer.py uma vez por vídeo (recarregando o modelo a cada
+    clipe), o modelo fica carregado num worker de longa duração e os pares são
+    enviados em lotes (batch_size) para a inferência em CPU. Frames grandes podem
+    ser divididos em tiles com sobreposição (os tiles de um par também vão no mesmo lote).
+    """
+
+    # Memória de inferência por pixel de entrada (ativações e volumes de correlação na
+    # CPU), estimada para os modelos do ptlflow; ajuste se o modelo usado for outro
+    MODEL_BYTES_PER_PIXEL = 4096
+    MIN_TILE = 256 # Menor tile usado para caber no orçamento de memória
+
+    def __init__(self, input_source, model='dpflow', ckpt_path='sintel', batch_size=4, threads=None,
+                 tile_size=None, tile_overlap=64, model_loader=None, flow_cache=None,
+                 temporal_filter=None, consistency=None, max_memory=None):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param model: Nome do modelo no ptlflow.
+        :param ckpt_path: Checkpoint do modelo (ex: 'sintel', 'kitti' ou um arquivo .ckpt).
+        :param batch_size: Pares por lote de inferência.
+        :param threads: Threads do torch na CPU (None = padrão do torch).
+        :param tile_size: Lado máximo (px) de cada tile. None = frame inteiro de uma vez.
+        :param tile_overlap: Sobreposição entre tiles vizinhos (px).
+        :param model_loader: Função sem argumentos que devolve infer(prev, next) em lote
+                             (ver ptlflow_loader). Padrão: o modelo do ptlflow. Para testes
+                             sem torch, use stand_in_loader.
+        :param flow_cache: FlowCache opcional (ver Farneback).
+        :param temporal_filter: TemporalFilter opcional (ver Farneback).
+        :param consistency: ConsistencyCheck opcional (ver Farneback). O fluxo de volta é
+                            uma segunda inferência, enviada no mesmo lote da ida.
+        :param max_memory: Limite de memória do job ('2GB' ou um MemoryBudget). No primeiro
+                           frame, o lote é reduzido até caber e, se nem um par por lote
+                           couber, os tiles diminuem (até MIN_TILE) em vez de estourar.
+                           O lote ajustado vale só para esta instância. Exige
+                           tile_overlap < MIN_TILE / 2.
+        """
+        if tile_size is not None and not 0 <= tile_overlap < tile_size:
+            # overlap == tile_size daria passo 0; maior, deixaria faixas do frame sem tile
+            raise ValueError(f"tile_overlap deve estar em [0, tile_size): {tile_overlap} com tile_size {tile_size}")
+        super().__init__(input_source, flow_cache=flow_cache, temporal_filter=temporal_filter,
+                         consistency=consistency)
+
+        # --- Parâmetros DPFlow ---
+        self.model = model
+        self.ckpt_path = ckpt_path
+        self.batch_size = batch_size
+        self.threads = threads
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.scale_factor = 1.0 # O modelo usa a resolução cheia (ou tiles)
+        self.memory = None
+        if max_memory is not None:
+            if not tile_overlap < self.MIN_TILE / 2:
+                raise ValueError(f"Com max_memory, tile_overlap deve ser menor que {self.MIN_TILE // 2} "
+                                 f"(MIN_TILE / 2) para os tiles poderem diminuir: {tile_overlap}")
+            self.memory = max_memory if isinstance(max_memory, MemoryBudget) else MemoryBudget(max_memory)
+        self._memory_shape = None # Resolução para a qual o lote e os tiles foram ajustados
+
+        if model_loader is None:
+            key = (model, ckpt_path, threads)
+            model_loader = partial(ptlflow_loader, model, ckpt_path, threads)
+        else:
+            key = model_loader
+        self._worker = _ModelWorker.get(key, model_loader, batch_size)
+
+    def _cache_params(self):
+        return dict(model=self.model, ckpt_path=self.ckpt_path, scale_factor=self.scale_factor,
+                    tile_size=self.tile_size, tile_overlap=self.tile_overlap)
+
+    def _prepare(self, frame, gray_frame=None):
+        """Imagem de entrada do modelo: BGR na escala de processamento."""
+        if frame is None:
+            # Sem frame colorido (ex: MultiEngine sem saída visual): cinza nos 3 canais
+            image = cv.cvtColor(gray_frame, cv.COLOR_GRAY2BGR)
+        elif self.scale_factor != 1.0:
+            h, w = frame.shape[:2]
+            image = cv.resize(frame, (int(w * self.scale_factor), int(h * self.scale_factor)),
+                              interpolation=cv.INTER_AREA)
+        else:
+            image = frame
+        if self.memory and self._memory_shape != image.shape[:2]:
+            self._fit_memory(image.shape[:2])
+        return image
+
+    def _fit_memory(self, shape):
+        """
+        Ajusta batch_size e tile_size ao orçamento. Um item do lote (par ou tile) custa
+        MODEL_BYTES_PER_PIXEL por pixel do tile; cada par em voo guarda o frame, a
+        imagem de entrada e o(s) fluxo(s). Primeiro diminui o lote; se nem um item
+        cabe, diminui os tiles pela metade.
+        """
+        h, w = shape
+        flows = 2 if self.consistency else 1
+        per_pair = h * w * (3 + 3 + 8 * flows)
+        tile = self.tile_size or max(h, w)
+        while True:
+            per_item = min(tile, h) * min(tile, w) * self.MODEL_BYTES_PER_PIXEL
+            if self.memory.fits(per_item + per_pair, exclude='dpflow') or tile <= self.MIN_TILE:
+                break
+            smaller = max(self.MIN_TILE, tile // 2, 2 * self.tile_overlap)
+            if smaller >= tile:
+                break # Não dá para diminuir mais sem a sobreposição engolir o tile
+            tile = smaller
+        if tile < max(h, w):
+            self.tile_size = tile
+        # O lote do orçamento vale só para esta instância (o worker é compartilhado):
+        # vai junto com cada par enviado
+        self.batch_size = self.memory.fit('dpflow', per_item + per_pair, wanted=self.batch_size)
+        self._memory_shape = shape
+        tiles = f"tiles de {self.tile_size} px" if self.tile_size else "frame inteiro"
+        print(f"Memória: lotes de {self.batch_size}, {tiles} "
+              f"({format_size(per_item + per_pair)} por item)")
+
+    def _tile_starts(self, length):
+        if length <= self.tile_size:
+            return [0]
+        step = self.tile_size - self.tile_overlap
+        starts = list(range(0, length - self.tile_size, step))
+        return starts + [length - self.tile_size]
+
+    def _submit(self, prev, image):
+        """Envia o par ao worker (inteiro ou em tiles). Retorna algo com .result()."""
+        h, w = image.shape[:2]
+        if not self.tile_size or (h <= self.tile_size and w <= self.tile_size):
+            return self._worker.submit(prev, image, self.batch_size)
+        th, tw = min(self.tile_size, h), min(self.tile_size, w)
+        tiles = [(y0, x0, th, tw, self._worker.submit(prev[y0:y0 + th, x0:x0 + tw],
+                                                      image[y0:y0 + th, x0:x0 + tw], self.batch_size))
+                 for y0 in self._tile_starts(h) for x0 in self._tile_starts(w)]
+        return _TiledFlow((h, w), tiles)
+
+    def _calc_flow(self, prev_image, image):
+        return self._submit(prev_image, image).result()
+
+    def _calc_residual_flow(self, prev_image, image):
+        return self._calc_flow(prev_image, image)
+
+    def _calc_backward(self, prev_image, image, forward):
+        return self._calc_flow(image, prev_image)
+
+    def _process_and_draw(self, frame, gray_frame=None, frame_idx=None):
+        """Igual ao Farneback, mas o "prev_gray" guarda a imagem BGR de entrada do modelo."""
+        return super()._process_and_draw(frame, self._prepare(frame, gray_frame), frame_idx)
+
+    def run(self, save_video=False, output_file='output_dpflow.mp4', display=True, flow_dir=None,
+            start=None, end=None, stride=None, analytics=None, summary=None):
+        """
+        Executa o loop principal com os pares em voo: até batch_size pares ficam
+        enviados ao worker ao mesmo tempo (formando lotes), e as saídas são
+        gravadas na ordem dos frames.
+
+        :param save_video: Se True, salva o vídeo lado a lado em output_file.
+        :param display: Se True, mostra a janela com o resultado.
+        :param flow_dir: Se fornecido, salva o fluxo bruto de cada par como .npy nessa pasta.
+        :param start: Primeiro frame processado (ver Farneback.run).
+        :param end: Frame onde o processamento para (exclusivo).
+        :param stride: Passo entre frames.
+        :param analytics: FlowAnalytics opcional (ver Farneback.run).
+        :param summary: MotionSummary opcional (ver Farneback.run).
+        """
+        print(f"Iniciando DPFlow ({self.model}, lotes de {self.batch_size}) em: {self.input_source}")
+        if (start, end, stride) != (None, None, None):
+            self.source.set_range(start, end, stride)
+        if flow_dir:
+            os.makedirs(flow_dir, exist_ok=True)
+        need_color = save_video or display or summary is not None
+        writer = None
+        # (frame, índice, chaves do cache, ida e volta: fluxo ou pedido em andamento)
+        pending = deque()
+
+        while True:
+            ret, frame = self.source.read()
+            if ret:
+                image = self._prepare(frame)
+                self.prev_idx, self.frame_idx = self.frame_idx, self.source.last_index
+                if self.prev_gray is not None:
+                    keys = [None, None]
+                    if self.flow_cache:
+                        keys = [self._cache_key(), self._cache_key(backward=True)]
+                    pairs = [(self.prev_gray, image), (image, self.prev_gray)]
+                    if self.consistency is None:
+                        keys, pairs = keys[:1], pairs[:1]
+                    flows = []
+                    for key, (first, second) in zip(keys, pairs):
+                        flow = self.flow_cache.get(key) if key else None
+                        flows.append(flow if flow is not None else self._submit(first, second))
+                    pending.append((frame, self.frame_idx, keys, flows))
+                    final_image = None
+                else:
+                    final_image = np.hstack((frame, np.zeros_like(frame))) if need_color else None
+                self.prev_gray = image
+
+            if pending and (not ret or len(pending) >= self.batch_size):
+                frame, frame_idx, keys, flows = pending.popleft()
+                for i, (key, flow) in enumerate(zip(keys, flows)):
+                    if not isinstance(flow, np.ndarray):
+                        flows[i] = flow.result()
+                        if key: self.flow_cache.put(key, flows[i])
+                flow = flows[0]
+                self.last_mask = self.consistency.mask(flow, flows[1]) if self.consistency else None
+                if self.temporal_filter is not None:
+                    flow = self.temporal_filter.apply(flow)
+                self.last_flow = flow
+                if analytics:
+                    analytics.update(frame_idx, flow, self.source.timestamp(frame_idx), self.last_mask)
+                if flow_dir:
+                    np.save(os.path.join(flow_dir, f"{frame_idx:06d}.npy"), flow)
+                final_image = self._draw_flow(frame, flow, self.last_mask) if need_color else None
+                if summary:
+                    summary.update(frame_idx, flow, final_image, self.source.timestamp(frame_idx),
+                                   self.last_mask)
+            elif ret and final_image is None:
+                continue # Par enviado; a saída sai quando o lote voltar
+            elif not ret:
+                break
+
+            if display:
+                cv.imshow('Original vs DPFlow', final_image)
+                if cv.waitKey(1) & 0xFF == ord('q'): break
+            if save_video:
+                if writer is None:
+                    h, w = final_image.shape[:2]
+                    fourcc = cv.VideoWriter_fourcc(*'mp4v')
+                    writer = cv.VideoWriter(output_file, fourcc, 20.0, (w, h))
+                writer.write(final_image)
+
+        self.source.release()
+        if writer: writer.release()
+        if analytics: analytics.close()
+        if summary: summary.close()
+        cv.destroyAllWindows()
+        print(f"Worker: {self._worker.pairs} pares em {self._worker.batches} lotes")
+        if self.memory:
+            self.memory.report()
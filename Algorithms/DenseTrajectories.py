@@ -0,0 +1,319 @@
+import cv2 as cv
+import numpy as np
+from FrameSource import FrameSource
+from DIS import DIS
+from ConsistencyCheck import ConsistencyCheck
+
+class TrajectoryStore:
+    """
+    Armazenamento compacto das trajetórias: uma amostra (trajetória, frame, x, y)
+    por ponto por frame, em arrays colunares que crescem dobrando de capacidade
+    (sem uma lista Python por trajetória).
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self.track = np.empty(capacity, np.int32)
+        self.frame = np.empty(capacity, np.int32)
+        self.xy = np.empty((capacity, 2), np.float32)
+        self.size = 0
+        self._order = None # Amostras ordenadas por trajetória (calculado sob demanda)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, ids, frame_idx, xy):
+        """Acrescenta as posições (N, 2) das trajetórias ids no(s) frame(s) frame_idx."""
+        n = len(ids)
+        if self.size + n > len(self.track):
+            capacity = max(2 * len(self.track), self.size + n)
+            for name in ('track', 'frame', 'xy'):
+                old = getattr(self, name)
+                new = np.empty((capacity,) + old.shape[1:], old.dtype)
+                new[:self.size] = old[:self.size]
+                setattr(self, name, new)
+        self.track[self.size:self.size + n] = ids
+        self.frame[self.size:self.size + n] = frame_idx
+        self.xy[self.size:self.size + n] = xy
+        self.size += n
+        self._order = None
+
+    def _sorted(self):
+        if self._order is None:
+            order = np.argsort(self.track[:self.size], kind='stable') # Mantém a ordem dos frames
+            bounds = np.flatnonzero(np.diff(self.track[order])) + 1
+            self._order = (order, np.concatenate(([0], bounds, [self.size])))
+        return self._order
+
+    def tracks(self, min_length=2):
+        """Gera (id, frames (L,), posições (L, 2)) de cada trajetória com pelo menos min_length pontos."""
+        order, bounds = self._sorted()
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b - a >= min_length:
+                idx = order[a:b]
+                yield int(self.track[idx[0]]), self.frame[idx], self.xy[idx]
+
+    def save(self, path):
+        """Grava as amostras num .npz (colunas track, frame, xy)."""
+        np.savez_compressed(path, track=self.track[:self.size], frame=self.frame[:self.size],
+                            xy=self.xy[:self.size])
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        store = cls(capacity=max(len(data['track']), 1))
+        store.append(data['track'], data['frame'], data['xy'])
+        return store
+
+def sample_flow(flow, xy, block=1024):
+    """
+    Fluxo (N, 2) nas posições contínuas xy (N, 2), com interpolação bilinear (cv.remap).
+    Os pontos vão num bloco 2D de block colunas: o remap exige mapas com os dois
+    lados abaixo de SHRT_MAX (32767), e um mapa (N, 1) passaria disso com muitos pontos.
+    """
+    n = len(xy)
+    rows = -(-n // block)
+    maps = np.zeros((2, rows * block), np.float32)
+    maps[:, :n] = xy.T
+    sampled = cv.remap(flow, maps[0].reshape(rows, block), maps[1].reshape(rows, block),
+                       cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+    return sampled.reshape(-1, 2)[:n]
+
+class DenseTrajectories:
+    """
+    Trajetórias densas de pontos, encadeando o fluxo denso par a par.
+
+    Pontos semeados numa grade são levados de um frame para o outro pelo fluxo
+    (amostragem bilinear vetorizada com cv.remap, todos os pontos de uma vez).
+    Uma trajetória termina quando o ponto sai da imagem ou cai num vetor que
+    falha na verificação ida-e-volta (ConsistencyCheck do algoritmo de fluxo);
+    células da grade que ficam vazias recebem pontos novos. Pontos que convergem
+    para o mesmo lugar (meia célula da grade) são redundantes: fica só o mais
+    antigo, e o número de pontos ativos não cresce ao longo do vídeo. O custo é o de um
+    fluxo denso por frame mais O(pontos), muito mais denso que o LK (que rastreia
+    cada ponto separadamente e recomeça a cada redetecção).
+
+    Saída visual: o frame com a cauda recente de cada trajetória, colorida pela
+    direção do movimento (mesmas cores da roda do fluxo denso).
+    """
+
+    # Atributos que carregam estado de um frame para o próximo (salvos no Checkpoint)
+    _state_attrs = ('frame_idx', 'points', 'ids', 'ages', 'tails', '_tail_pos', 'next_id', 'store')
+
+    def __init__(self, input_source, flow_engine=None, grid_step=8, quality=0.001,
+                 max_length=None, tail_length=15):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param flow_engine: Função que recebe a FrameSource e cria o algoritmo de fluxo
+                            denso (como no MultiEngine). Padrão: DIS com ConsistencyCheck.
+                            Sem consistency, as trajetórias só terminam na borda.
+        :param grid_step: Espaçamento (px, na resolução do fluxo) da grade de sementes.
+        :param quality: Sementes só onde o menor autovalor da textura passa de
+                        quality * máximo do frame (áreas lisas não rastreiam bem).
+                        None = semeia em todas as células.
+        :param max_length: Comprimento máximo (frames) de uma trajetória. None = sem limite.
+        :param tail_length: Frames de cauda desenhados na visualização.
+        """
+        self.source = FrameSource.open(input_source)
+        self.input_source = self.source.input_source if self.source is not None else None
+
+        if flow_engine is None:
+            flow_engine = lambda src: DIS(src, consistency=ConsistencyCheck())
+        self.flow = flow_engine(self.source)
+        self.scale_factor = self.flow.scale_factor
+
+        # --- Parâmetros ---
+        self.grid_step = grid_step
+        self.quality = quality
+        self.max_length = max_length
+        self.tail_length = tail_length
+
+        # --- Variáveis de Estado (arrays alinhados: uma linha por ponto ativo) ---
+        self.frame_idx = -1
+        self.points = np.empty((0, 2), np.float32) # Posição na resolução do fluxo
+        self.ids = np.empty(0, np.int64)
+        self.ages = np.empty(0, np.int32)
+        self.tails = np.empty((0, tail_length, 2), np.float32) # Buffer circular das posições
+        self._tail_pos = 0
+        self.next_id = 0
+        self.store = TrajectoryStore()
+
+    def _get_state(self):
+        """Estado entre frames (para Checkpoint), incluindo o do algoritmo de fluxo."""
+        state = {name: getattr(self, name) for name in self._state_attrs}
+        state['flow'] = self.flow._get_state()
+        return state
+
+    def _set_state(self, state):
+        state = dict(state)
+        self.flow._set_state(state.pop('flow'))
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _keep(self, alive):
+        self.points = self.points[alive]
+        self.ids = self.ids[alive]
+        self.ages = self.ages[alive]
+        self.tails = self.tails[alive]
+
+    def _advect(self, flow, mask, shape):
+        """Move os pontos pelo fluxo e encerra os que saem da imagem ou falham na consistência."""
+        if len(self.points) == 0:
+            return
+        # Fluxo em grade (ex: BlockMatching): coordenadas contínuas na grade do fluxo
+        cell = shape[1] / flow.shape[1]
+        grid_xy = (self.points + 0.5) / cell - 0.5 if cell != 1 else self.points
+        displacement = sample_flow(flow, grid_xy)
+
+        h, w = shape
+        moved = self.points + displacement
+        alive = ((moved[:, 0] >= 0) & (moved[:, 0] <= w - 1) &
+                 (moved[:, 1] >= 0) & (moved[:, 1] <= h - 1))
+        if mask is not None:
+            gx = np.clip(np.rint(grid_xy[:, 0]).astype(np.intp), 0, mask.shape[1] - 1)
+            gy = np.clip(np.rint(grid_xy[:, 1]).astype(np.intp), 0, mask.shape[0] - 1)
+            alive &= mask[gy, gx]
+        if self.max_length:
+            alive &= self.ages + 1 < self.max_length
+
+        self.points = moved
+        self.ages += 1
+        self._keep(alive)
+        self.tails[:, self._tail_pos] = self.points
+
+    def _dedupe(self, shape):
+        """Um ponto por meia célula da grade: entre pontos que convergiram, fica o mais antigo."""
+        if len(self.points) < 2:
+            return
+        step = max(1, self.grid_step // 2)
+        cols = shape[1] // step + 1
+        cell = (self.points[:, 1] // step).astype(np.intp) * cols + (self.points[:, 0] // step).astype(np.intp)
+        by_age = np.argsort(-self.ages, kind='stable') # Mais antigos primeiro (empate: o de menor id)
+        _, first = np.unique(cell[by_age], return_index=True)
+        if len(first) < len(self.points):
+            alive = np.zeros(len(self.points), bool)
+            alive[by_age[first]] = True
+            self._keep(alive)
+
+    def _seed(self, gray_frame):
+        """Semeia pontos nas células da grade sem nenhum ponto ativo."""
+        h, w = gray_frame.shape
+        step = self.grid_step
+        rows, cols = h // step, w // step
+        occupied = np.zeros(rows * cols, bool)
+        if len(self.points):
+            cx = np.minimum(self.points[:, 0] // step, cols - 1).astype(np.intp)
+            cy = np.minimum(self.points[:, 1] // step, rows - 1).astype(np.intp)
+            occupied[cy * cols + cx] = True
+
+        free = np.flatnonzero(~occupied)
+        ys = (free // cols) * step + step // 2
+        xs = (free % cols) * step + step // 2
+        if self.quality is not None and free.size:
+            eig = cv.cornerMinEigenVal(gray_frame, 3)
+            textured = eig[ys, xs] > self.quality * eig.max()
+            xs, ys = xs[textured], ys[textured]
+        if xs.size == 0:
+            return
+
+        n = xs.size
+        new = np.stack((xs, ys), axis=1).astype(np.float32)
+        self.points = np.concatenate((self.points, new))
+        self.ids = np.concatenate((self.ids, np.arange(self.next_id, self.next_id + n)))
+        self.ages = np.concatenate((self.ages, np.zeros(n, np.int32)))
+        self.tails = np.concatenate((self.tails, np.repeat(new[:, None], self.tail_length, axis=1)))
+        self.next_id += n
+
+    def _process_and_draw(self, frame, gray_frame=None, frame_idx=None):
+        """
+        Calcula o fluxo do par (pelo algoritmo de fluxo), avança as trajetórias e
+        desenha. Com frame=None (sem saída visual), só rastreia e retorna None.
+        """
+        if gray_frame is None:
+            h, w = frame.shape[:2]
+            small = cv.resize(frame, (int(w * self.scale_factor), int(h * self.scale_factor)),
+                              interpolation=cv.INTER_AREA)
+            gray_frame = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+
+        self.flow._process_and_draw(None, gray_frame, frame_idx)
+        self.frame_idx = self.flow.frame_idx
+        self._tail_pos = (self._tail_pos + 1) % self.tail_length
+        if self.flow.last_flow is not None:
+            self._advect(self.flow.last_flow, self.flow.last_mask, gray_frame.shape)
+            self._dedupe(gray_frame.shape)
+        self._seed(gray_frame)
+
+        self.store.append(self.ids, self.frame_idx, self.points / self.scale_factor)
+        return self._draw_tracks(frame) if frame is not None else None
+
+    def _draw_tracks(self, frame):
+        """Caudas das trajetórias em movimento, agrupadas por cor (uma chamada por cor)."""
+        vis_frame = frame.copy()
+        if len(self.points) == 0:
+            return vis_frame
+        # Cauda do mais antigo para o mais novo, na resolução original
+        order = (self._tail_pos + 1 + np.arange(self.tail_length)) % self.tail_length
+        tails = self.tails[:, order] / self.scale_factor
+        disp = tails[:, -1] - tails[:, 0]
+        moving = np.hypot(disp[:, 0], disp[:, 1]) >= 1.0
+        tails, disp = tails[moving], disp[moving]
+
+        hue_bins = 12
+        hue = ((np.arctan2(disp[:, 1], disp[:, 0]) % (2 * np.pi)) / (2 * np.pi) * hue_bins).astype(int) % hue_bins
+        tails = np.rint(tails).astype(np.int32)
+        for b in range(hue_bins):
+            group = tails[hue == b]
+            if len(group) == 0:
+                continue
+            hsv = np.uint8([[[int((b + 0.5) * 180 / hue_bins), 255, 255]]])
+            color = tuple(int(c) for c in cv.cvtColor(hsv, cv.COLOR_HSV2BGR)[0, 0])
+            cv.polylines(vis_frame, list(group), False, color, 1, cv.LINE_AA)
+        return vis_frame
+
+    def run(self, save_video=False, output_file='output_trajectories.mp4', display=True,
+            tracks_file=None, checkpoint=None, start=None, end=None, stride=None):
+        """
+        Executa o loop principal.
+
+        :param save_video: Se True, salva o vídeo com as trajetórias em output_file.
+        :param display: Se True, mostra a janela com o resultado.
+        :param tracks_file: Se fornecido, grava as trajetórias (TrajectoryStore) nesse .npz.
+        :param checkpoint: Checkpoint opcional (ver LucasKanade.run).
+        :param start: Primeiro frame processado (índice absoluto na entrada).
+        :param end: Frame onde o processamento para (exclusivo).
+        :param stride: Passo entre frames.
+        """
+        print(f"Iniciando Trajetórias Densas em: {self.input_source}")
+        if (start, end, stride) != (None, None, None):
+            self.source.set_range(start, end, stride)
+        writer = None
+        need_color = save_video or display
+        if checkpoint: checkpoint.resume(self)
+
+        while True:
+            ret, frame, gray_frame = self.source.read_gray(self.scale_factor, need_color)
+            if not ret: break
+
+            final_image = self._process_and_draw(frame, gray_frame, self.source.last_index)
+
+            if display:
+                cv.imshow('Trajetorias Densas', final_image)
+                if cv.waitKey(1) & 0xFF == ord('q'): break
+
+            if save_video and checkpoint:
+                checkpoint.write(final_image, output_file)
+            elif save_video:
+                if writer is None:
+                    h, w = final_image.shape[:2]
+                    fourcc = cv.VideoWriter_fourcc(*'mp4v')
+                    writer = cv.VideoWriter(output_file, fourcc, 20.0, (w, h))
+                writer.write(final_image)
+
+            if checkpoint: checkpoint.step(self)
+
+        self.source.release()
+        if writer: writer.release()
+        if checkpoint: checkpoint.finalize(output_file if save_video else None)
+        cv.destroyAllWindows()
+        if tracks_file:
+            self.store.save(tracks_file)
+        print(f"Trajetórias: {self.next_id} iniciadas, {len(self.store)} amostras")
@@ -1,6 +1,8 @@
 import cv2 as cv
 import numpy as np
 import os
+from FrameSource import FrameSource
+from FlowCache import FlowCache
 
 class Farneback:
     """
@@ -8,33 +10,54 @@ class Farneback:
     Exibe: Vídeo Original + Fluxo HSV (Lado a Lado) em Resolução Original.
     """
 
-    def __init__(self, input_source):
-        self.input_source = input_source
-        self.is_video_file = os.path.isfile(input_source)
-        self.image_paths = []
-        self.current_img_idx = 0
-        self.cap = None
-
-        # --- Configuração da Fonte ---
-        if self.is_video_file:
-            self.cap = cv.VideoCapture(input_source)
-            if not self.cap.isOpened():
-                raise ValueError(f"Erro ao abrir: {input_source}")
-        elif os.path.isdir(input_source):
-            valid_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
-            self.image_paths = sorted([os.path.join(input_source, f) for f in os.listdir(input_source) if f.lower().endswith(valid_exts)])
-            if not self.image_paths:
-                raise ValueError(f"Pasta vazia: {input_source}")
-        else:
-            raise ValueError(f"Entrada inválida.")
+    # Atributos que carregam estado de um frame para o próximo (salvos no Checkpoint)
+    _state_attrs = ('prev_gray', 'frame_idx')
+
+    def __init__(self, input_source, flow_cache=None, global_motion=None, temporal_filter=None,
+                 consistency=None):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens
+                             (None: sem fonte, só para calcular pares avulsos).
+        :param flow_cache: FlowCache opcional. Se fornecido, o fluxo de cada par é
+                           buscado no cache antes de ser calculado.
+                           Precisa de input_source (a entrada faz parte da chave).
+        :param global_motion: GlobalMotion opcional. Se fornecido, o movimento da câmera
+                              é removido e o fluxo resultante é o residual.
+        :param temporal_filter: TemporalFilter opcional. Suaviza o fluxo ao longo do tempo
+                                (o cache guarda o fluxo bruto, antes do filtro).
+        :param consistency: ConsistencyCheck opcional. Calcula também o fluxo de volta e
+                            marca os vetores ocluídos/não confiáveis (last_mask), que
+                            aparecem em cinza na visualização e ficam fora das estatísticas.
+        """
+        # --- Configuração da Fonte (pode ser compartilhada com outros algoritmos) ---
+        self.source = FrameSource.open(input_source)
+        self.input_source = self.source.input_source if self.source is not None else None
 
         # --- Parâmetros Farneback (Otimizados para velocidade) ---
         self.fb_params = dict(pyr_scale=0.5, levels=3, winsize=15, iterations=3, 
                               poly_n=5, poly_sigma=1.2, flags=0)
+        self.scale_factor = 0.5 # Downscale antes do cálculo (processamento rápido)
+
+        # --- Cache de Fluxo ---
+        self.flow_cache = flow_cache
+        self._input_hash = FlowCache.input_fingerprint(self.input_source) if flow_cache else None
+
+        # --- Compensação do Movimento da Câmera ---
+        self.global_motion = global_motion
+
+        # --- Suavização Temporal ---
+        self.temporal_filter = temporal_filter
+
+        # --- Consistência Ida-e-Volta ---
+        self.consistency = consistency
 
         # --- Variáveis de Estado ---
         self.prev_gray = None
         self.hsv = None
+        self.frame_idx = -1 # Índice do frame atual (o segundo de cada par)
+        self.prev_idx = -1 # Índice do primeiro frame do par
+        self.last_flow = None # Último fluxo calculado (na resolução reduzida)
+        self.last_mask = None # Vetores consistentes do último fluxo (se houver consistency)
         
         # Cria a legenda (roda de cores)
         self.legend_img = self._create_color_wheel(size=60) 
@@ -75,45 +98,172 @@ class Farneback:
         
         return wheel_bgr
 
+    def _get_state(self):
+        """Estado entre frames (para Checkpoint), incluindo o histórico do TemporalFilter."""
+        state = {name: getattr(self, name) for name in self._state_attrs}
+        if self.temporal_filter is not None:
+            state['temporal_filter'] = self.temporal_filter._get_state()
+        return state
+
+    def _set_state(self, state):
+        state = dict(state)
+        filter_state = state.pop('temporal_filter', None)
+        if filter_state is not None and self.temporal_filter is not None:
+            self.temporal_filter._set_state(filter_state)
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def _read_next_frame(self):
-        if self.is_video_file:
-            return self.cap.read()
-        else:
-            if self.current_img_idx < len(self.image_paths):
-                frame = cv.imread(self.image_paths[self.current_img_idx])
-                self.current_img_idx += 1
-                return (frame is not None), frame
-            return False, None
-
-    def _process_and_draw(self, frame):
-        # Guarda o tamanho original
-        orig_h, orig_w = frame.shape[:2]
+        return self.source.read()
 
-        # 1. Redimensionar (Downscale) para processamento rápido
-        scale_factor = 0.5 
-        small_w = int(orig_w * scale_factor)
-        small_h = int(orig_h * scale_factor)
-        frame_small = cv.resize(frame, (small_w, small_h), interpolation=cv.INTER_AREA)
-        
-        gray_frame = cv.cvtColor(frame_small, cv.COLOR_BGR2GRAY)
+    def _cache_params(self):
+        """Parâmetros que influenciam o fluxo (fazem parte da chave do cache)."""
+        return dict(fb_params=self.fb_params, scale_factor=self.scale_factor)
+
+    def _calc_flow(self, prev_gray, gray_frame):
+        """Cálculo do fluxo propriamente dito (sem cache)."""
+        return cv.calcOpticalFlowFarneback(prev_gray, gray_frame, None, **self.fb_params)
+
+    def _calc_residual_flow(self, prev_gray, gray_frame):
+        """Fluxo do par, sem o movimento da câmera se houver GlobalMotion."""
+        if self.global_motion is None:
+            return self._calc_flow(prev_gray, gray_frame)
+        return self.global_motion.apply(self._calc_flow, prev_gray, gray_frame)
+
+    # --- Fluxo de volta (ConsistencyCheck) ---
+
+    def _flow_cell(self):
+        """Pixels por célula do fluxo (1 = fluxo denso por pixel)."""
+        return 1
+
+    def _flow_step(self):
+        """Quantização dos vetores em pixels (0 = subpixel)."""
+        return 0
+
+    def _calc_reverse(self, gray_frame, prev_gray, init=None):
+        """
+        Fluxo do frame atual para o anterior. Com init (o fluxo de ida negado), a
+        pirâmide não é necessária: um só nível e uma iteração refinam o chute
+        (~metade do custo da ida, ~0.03 px de diferença da volta completa).
+        """
+        if init is None:
+            return cv.calcOpticalFlowFarneback(gray_frame, prev_gray, None, **self.fb_params)
+        params = dict(self.fb_params, levels=0, iterations=1,
+                      flags=self.fb_params['flags'] | cv.OPTFLOW_USE_INITIAL_FLOW)
+        return cv.calcOpticalFlowFarneback(gray_frame, prev_gray, init, **params)
+
+    def _calc_backward(self, prev_gray, gray_frame, forward):
+        """
+        Fluxo de volta do par. O fluxo de ida negado serve de chute inicial; com
+        GlobalMotion o fluxo de ida é residual (sem a câmera), então a volta é
+        calculada do zero e o movimento da câmera é removido dela também.
+        """
+        if self.global_motion is None:
+            return self._calc_reverse(gray_frame, prev_gray, -forward)
+        return self.global_motion.apply(self._calc_reverse, gray_frame, prev_gray)
+
+    def _compute_backward(self, prev_gray, gray_frame, forward):
+        """Consulta o cache (se houver) antes de calcular o fluxo de volta do par."""
+        if self.flow_cache is None:
+            return self._calc_backward(prev_gray, gray_frame, forward)
+        key = self._cache_key(backward=True)
+        flow = self.flow_cache.get(key)
+        if flow is None:
+            flow = self._calc_backward(prev_gray, gray_frame, forward)
+            self.flow_cache.put(key, flow)
+        return flow
+
+    def _cache_key(self, backward=False):
+        """Chave do par atual no FlowCache (backward=True: a do fluxo de volta)."""
+        params = self._cache_params()
+        params['reduced_decode'] = self.source.reduced_decode
+        if backward:
+            params['backward'] = True
+        if self.frame_idx - self.prev_idx != 1:
+            params['gap'] = self.frame_idx - self.prev_idx # Par com frames pulados (stride)
+        if self.global_motion is not None:
+            params['global_motion'] = self.global_motion.params()
+        return self.flow_cache.make_key(self._input_hash, self.frame_idx,
+                                        type(self).__name__, params)
+
+    def _compute_flow(self, prev_gray, gray_frame):
+        """Consulta o cache (se houver) antes de calcular o fluxo do par."""
+        if self.flow_cache is None:
+            return self._calc_residual_flow(prev_gray, gray_frame)
+
+        key = self._cache_key()
+        flow = self.flow_cache.get(key)
+        if flow is None:
+            flow = self._calc_residual_flow(prev_gray, gray_frame)
+            self.flow_cache.put(key, flow)
+        return flow
+
+    def _process_and_draw(self, frame, gray_frame=None, frame_idx=None):
+        """
+        :param frame: Frame colorido original, ou None se nenhuma saída visual precisa
+                      dele (aí só o fluxo é calculado e o retorno é None).
+        :param gray_frame: Frame em cinza já reduzido (scale_factor). Se None, é
+                           calculado aqui a partir do frame colorido.
+        :param frame_idx: Índice absoluto do frame na entrada (com start/stride, não é
+                          só um contador). Se None, é o anterior + 1.
+        """
+        self.prev_idx = self.frame_idx
+        self.frame_idx = self.frame_idx + 1 if frame_idx is None else frame_idx
+
+        if gray_frame is None:
+            # Guarda o tamanho original
+            orig_h, orig_w = frame.shape[:2]
+
+            # 1. Redimensionar (Downscale) para processamento rápido
+            small_w = int(orig_w * self.scale_factor)
+            small_h = int(orig_h * self.scale_factor)
+            frame_small = cv.resize(frame, (small_w, small_h), interpolation=cv.INTER_AREA)
+            
+            gray_frame = cv.cvtColor(frame_small, cv.COLOR_BGR2GRAY)
         
         # Inicialização
         if self.prev_gray is None:
             self.prev_gray = gray_frame
+            self.last_flow = None
+            if frame is None: return None
             # Retorna visualização vazia inicial
             return np.hstack((frame, np.zeros_like(frame)))
 
         # 2. Calcular Fluxo (na imagem pequena)
-        flow = cv.calcOpticalFlowFarneback(self.prev_gray, gray_frame, None, **self.fb_params)
+        flow = self._compute_flow(self.prev_gray, gray_frame)
+        self.last_mask = None
+        if self.consistency is not None:
+            backward = self._compute_backward(self.prev_gray, gray_frame, flow)
+            self.last_mask = self.consistency.mask(flow, backward, self._flow_cell(), self._flow_step())
+        if self.temporal_filter is not None:
+            flow = self.temporal_filter.apply(flow)
+        self.last_flow = flow
+
+        combined = self._draw_flow(frame, flow, self.last_mask) if frame is not None else None
+        
+        self.prev_gray = gray_frame.copy()
+        return combined
+
+    def _draw_flow(self, frame, flow, mask=None):
+        """
+        Converte o fluxo em cores HSV e junta lado a lado com o frame original.
+        O fluxo pode ter qualquer resolução (ex: grade de blocos): ele é
+        redimensionado para o tamanho original do frame.
+        Com mask (ConsistencyCheck), os vetores não confiáveis ficam em cinza.
+        """
+        orig_h, orig_w = frame.shape[:2]
+        flow_h, flow_w = flow.shape[:2]
 
         # 3. Converter para Cores HSV
         mag, ang = cv.cartToPolar(flow[..., 0], flow[..., 1])
         
         # Cria array HSV pequeno
-        hsv_small = np.zeros_like(frame_small)
+        hsv_small = np.zeros((flow_h, flow_w, 3), dtype=np.uint8)
         hsv_small[..., 1] = 255
         hsv_small[..., 0] = ang * 180 / np.pi / 2
         hsv_small[..., 2] = cv.normalize(mag, None, 0, 255, cv.NORM_MINMAX)
+        if mask is not None:
+            hsv_small[~mask] = (0, 0, 96)
         
         bgr_flow_small = cv.cvtColor(hsv_small, cv.COLOR_HSV2BGR)
 
@@ -142,26 +292,62 @@ class Farneback:
             bgr_flow_large[y_offset:y_offset+l_h, x_offset:x_offset+l_w] = dst
 
         # 6. Juntar lado a lado (Original | Fluxo Grande)
-        combined = np.hstack((frame, bgr_flow_large))
-        
-        self.prev_gray = gray_frame.copy()
-        return combined
+        return np.hstack((frame, bgr_flow_large))
+
+    def run(self, save_video=False, output_file='output_comparison.mp4', display=True, flow_dir=None,
+            checkpoint=None, start=None, end=None, stride=None, analytics=None, summary=None):
+        """
+        Executa o loop principal.
 
-    def run(self, save_video=False, output_file='output_comparison.mp4', display=True):
-        print(f"Iniciando Farneback (HD) em: {self.input_source}")
+        :param save_video: Se True, salva o vídeo lado a lado em output_file.
+        :param display: Se True, mostra a janela com o resultado.
+        :param flow_dir: Se fornecido, salva o fluxo bruto de cada par como .npy nessa pasta.
+        :param checkpoint: Checkpoint opcional. Salva o estado periodicamente e, se já
+                           existir um checkpoint, continua de onde parou.
+        :param start: Primeiro frame processado (índice absoluto na entrada).
+        :param end: Frame onde o processamento para (exclusivo).
+        :param stride: Passo entre frames (cada par vira (i, i + stride)).
+                       Em start/end/stride, None mantém o intervalo da FrameSource
+                       (por padrão, a entrada inteira).
+        :param analytics: FlowAnalytics opcional. Grava as estatísticas de cada par
+                          (por região) no CSV dele, em vez do campo inteiro.
+        :param summary: MotionSummary opcional. Grava, à parte, só os trechos com muito
+                        movimento (e o índice deles). Não é retomado pelo Checkpoint.
+        """
+        print(f"Iniciando {type(self).__name__} (HD) em: {self.input_source}")
+        if (start, end, stride) != (None, None, None):
+            self.source.set_range(start, end, stride)
         writer = None
+        if flow_dir:
+            os.makedirs(flow_dir, exist_ok=True)
+        # Sem vídeo nem janela, o frame colorido em resolução cheia não é necessário
+        need_color = save_video or display or summary is not None
+        if checkpoint: checkpoint.resume(self)
 
         while True:
-            ret, frame = self._read_next_frame()
+            ret, frame, gray_frame = self.source.read_gray(self.scale_factor, need_color)
             if not ret: break
 
-            final_image = self._process_and_draw(frame)
+            final_image = self._process_and_draw(frame, gray_frame, self.source.last_index)
+
+            if analytics and self.last_flow is not None:
+                analytics.update(self.frame_idx, self.last_flow, self.source.timestamp(self.frame_idx),
+                                 self.last_mask)
+
+            if summary and self.last_flow is not None:
+                summary.update(self.frame_idx, self.last_flow, final_image,
+                               self.source.timestamp(self.frame_idx), self.last_mask)
+
+            if flow_dir and self.last_flow is not None:
+                np.save(os.path.join(flow_dir, f"{self.frame_idx:06d}.npy"), self.last_flow)
 
             if display:
                 cv.imshow('Original vs Fluxo Denso', final_image)
                 if cv.waitKey(1) & 0xFF == ord('q'): break
             
-            if save_video:
+            if save_video and checkpoint:
+                checkpoint.write(final_image, output_file)
+            elif save_video:
                 if writer is None:
                     h, w = final_image.shape[:2]
                     fourcc = cv.VideoWriter_fourcc(*'mp4v')
@@ -169,6 +355,13 @@ class Farneback:
                     writer = cv.VideoWriter(output_file, fourcc, 20.0, (w, h))
                 writer.write(final_image)
 
-        if self.cap: self.cap.release()
+            if checkpoint: checkpoint.step(self)
+
+        self.source.release()
         if writer: writer.release()
-        cv.destroyAllWindows()
\ No newline at end of file
+        if checkpoint: checkpoint.finalize(output_file if save_video else None)
+        if analytics: analytics.close()
+        if summary: summary.close()
+        cv.destroyAllWindows()
+        if self.flow_cache:
+            print(f"Cache de fluxo: {self.flow_cache.hits} hits, {self.flow_cache.misses} misses")
\ No newline at end of file
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class FlowCache:
+    """
+    Cache persistente (em disco) de campos de fluxo já calculados.
+
+    Cada campo é salvo como .npy, endereçado pelo hash de:
+    (entrada, índice do frame, nome do algoritmo, parâmetros do algoritmo).
+    Assim, mudar só a visualização (sensitivity, threshold, cores) reaproveita
+    todo o fluxo já calculado em vez de recalcular do zero.
+
+    O tamanho total é limitado (max_size_mb); quando passa do limite,
+    os arquivos usados há mais tempo são apagados (LRU).
+
+    Pode ser compartilhado por algoritmos que rodam em threads (MultiEngine):
+    o índice LRU só é alterado com a trava; a leitura e a escrita dos .npy, não.
+    """
+
+    def __init__(self, cache_dir='.flow_cache', max_size_mb=2048):
+        """
+        :param cache_dir: Pasta onde os campos de fluxo são guardados.
+        :param max_size_mb: Tamanho máximo do cache em disco (MB).
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # chave -> tamanho em bytes, na ordem do último acesso (mais antigo primeiro)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._scan()
+
+    def __getstate__(self):
+        # A trava não vai junto (ex: engine_kwargs de um SharedPipeline com 'spawn')
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        """Reconstrói o índice LRU a partir dos arquivos já existentes (ordem por mtime)."""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if f.endswith('.npy'):
+                    st = os.stat(os.path.join(root, f))
+                    found.append((st.st_mtime, f[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        # Subpastas com os 2 primeiros caracteres evitam pastas com milhares de arquivos
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    @staticmethod
+    def input_fingerprint(input_source, chunk_size=1 << 20):
+        """
+        Gera um hash barato da entrada.
+        - Vídeo: tamanho + primeiro e último MB do arquivo.
+        - Pasta: nome, tamanho e data de modificação de cada imagem.
+        Sem entrada (algoritmo criado com input_source=None, como os do FlowService)
+        não há como identificar os pares: o cache é recusado.
+        """
+        if input_source is None:
+            raise ValueError("FlowCache precisa da entrada (input_source) para identificar os pares; "
+                             "algoritmos sem fonte não usam cache")
+        h = hashlib.sha1()
+        if os.path.isfile(input_source):
+            size = os.path.getsize(input_source)
+            h.update(str(size).encode())
+            with open(input_source, 'rb') as f:
+                h.update(f.read(chunk_size))
+                if size > chunk_size:
+                    f.seek(max(size - chunk_size, chunk_size))
+                    h.update(f.read(chunk_size))
+        else:
+            for name in sorted(os.listdir(input_source)):
+                st = os.stat(os.path.join(input_source, name))
+                h.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def make_key(input_hash, frame_idx, engine_name, params):
+        """Combina entrada, frame, algoritmo e parâmetros em uma única chave."""
+        payload = json.dumps([input_hash, int(frame_idx), engine_name, params],
+                             sort_keys=True, default=repr)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """Retorna o fluxo salvo para a chave, ou None se não estiver no cache."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+        path = self._path(key)
+        try:
+            flow = np.load(path)
+            os.utime(path, None) # Usado recentemente também no disco, para o próximo _scan
+        except (OSError, ValueError):
+            # Arquivo apagado por fora (ou por outra thread) ou corrompido: trata como ausente
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return flow
+
+    def put(self, key, flow):
+        """Salva um campo de fluxo no cache e aplica o limite de tamanho."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Escrita atômica: um processo interrompido nunca deixa .npy pela metade
+        tmp_path = f"{path}.{threading.get_ident()}.tmp" # Uma por thread: a mesma chave pode vir de duas
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(flow, dtype=np.float32))
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+            self._evict()
+
+    def _forget(self, key):
+        self._total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        """Remove os campos menos usados até caber no limite (chamado com a trava)."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Apaga todo o conteúdo do cache."""
+        with self._lock:
+            for key in list(self._entries):
+                self._forget(key)
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,135 @@
+import hashlib
+import os
+
+import cv2 as cv
+import numpy as np
+from FlowIO import read_flo, read_kitti
+from FrameSource import natural_key
+
+class FlowDataset:
+    """
+    Base dos datasets de fluxo com ground truth (layouts Sintel / KITTI em disco).
+
+    Nada é lido na construção: cada amostra só é carregada quando acessada
+    (dataset[i]), e os .flo são mapeados em memória. Com cache_dir, cada imagem
+    (e cada ground truth em PNG) é decodificada uma vez só e guardada como .npy,
+    que nas leituras seguintes também é mapeado em memória em vez de decodificado.
+
+    Amostra: dict(name, frame1, frame2 (BGR uint8), flow (H, W, 2), valid (H, W) bool).
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.samples = [] # [(nome, frame1, frame2, ground truth)] (só caminhos)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _cached(self, path, load):
+        """Resultado de load(path), guardado como .npy no cache (e mapeado em memória)."""
+        if not self.cache_dir:
+            return load(path)
+        name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest() + '.npy'
+        cache_path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(cache_path):
+            tmp_path = cache_path + '.tmp.npy'
+            np.save(tmp_path, load(path))
+            os.replace(tmp_path, cache_path)
+        return np.load(cache_path, mmap_mode='r')
+
+    def _image(self, path):
+        def load(p):
+            image = cv.imread(p)
+            if image is None:
+                raise ValueError(f"Não foi possível ler a imagem: {p}")
+            return image
+        return self._cached(path, load)
+
+    def _ground_truth(self, path):
+        raise NotImplementedError
+
+    def __getitem__(self, index):
+        name, path1, path2, gt_path = self.samples[index]
+        flow, valid = self._ground_truth(gt_path)
+        return dict(name=name, frame1=self._image(path1), frame2=self._image(path2),
+                    flow=flow, valid=valid)
+
+class SintelDataset(FlowDataset):
+    """
+    MPI-Sintel: <root>/training/<pass>/<cena>/frame_0001.png e
+    <root>/training/flow/<cena>/frame_0001.flo (fluxo do frame 1 para o 2).
+    """
+
+    def __init__(self, root, split='training', dstype='clean', cache_dir=None):
+        """
+        :param root: Pasta do Sintel.
+        :param split: 'training' (só ele tem ground truth).
+        :param dstype: 'clean' ou 'final'.
+        :param cache_dir: Cache opcional das imagens decodificadas (ver FlowDataset).
+        """
+        super().__init__(cache_dir)
+        image_root = os.path.join(root, split, dstype)
+        flow_root = os.path.join(root, split, 'flow')
+        if not os.path.isdir(image_root):
+            raise ValueError(f"Pasta do Sintel não encontrada: {image_root}")
+
+        for scene in sorted(os.listdir(image_root)):
+            images = sorted([f for f in os.listdir(os.path.join(image_root, scene))
+                             if f.endswith('.png')], key=natural_key)
+            for first, second in zip(images, images[1:]):
+                gt_path = os.path.join(flow_root, scene, os.path.splitext(first)[0] + '.flo')
+                if os.path.exists(gt_path):
+                    self.samples.append((f"{scene}/{first}",
+                                         os.path.join(image_root, scene, first),
+                                         os.path.join(image_root, scene, second), gt_path))
+
+    def _ground_truth(self, path):
+        flow = read_flo(path) # Mapeado em memória
+        return flow, np.ones(flow.shape[:2], bool)
+
+class KittiDataset(FlowDataset):
+    """
+    KITTI 2012/2015: <root>/training/image_2/000000_10.png e 000000_11.png, com
+    o ground truth em <root>/training/flow_occ/000000_10.png (PNG de 16 bits).
+    No KITTI 2012, use image_dir='colored_0'.
+    """
+
+    def __init__(self, root, split='training', image_dir='image_2', flow_dir='flow_occ',
+                 cache_dir=None):
+        """
+        :param root: Pasta do KITTI.
+        :param split: 'training' (só ele tem ground truth).
+        :param image_dir: Pasta das imagens ('image_2' no 2015, 'colored_0' no 2012).
+        :param flow_dir: 'flow_occ' (todos os pixels) ou 'flow_noc' (só os não ocluídos).
+        :param cache_dir: Cache opcional das imagens e ground truth decodificados.
+        """
+        super().__init__(cache_dir)
+        image_root = os.path.join(root, split, image_dir)
+        flow_root = os.path.join(root, split, flow_dir)
+        if not os.path.isdir(flow_root):
+            raise ValueError(f"Pasta do KITTI não encontrada: {flow_root}")
+
+        for name in sorted(os.listdir(flow_root)):
+            if not name.endswith('_10.png'):
+                continue
+            frame_id = name[:-len('_10.png')]
+            self.samples.append((frame_id,
+                                 os.path.join(image_root, f"{frame_id}_10.png"),
+                                 os.path.join(image_root, f"{frame_id}_11.png"),
+                                 os.path.join(flow_root, name)))
+
+    @staticmethod
+    def _load_packed(path):
+        # (u, v, válido) num array só, para caber num único .npy do cache
+        flow, valid = read_kitti(path)
+        return np.dstack([flow, valid.astype(np.float32)])
+
+    def _ground_truth(self, path):
+        packed = self._cached(path, self._load_packed)
+        return packed[..., :2], packed[..., 2] > 0
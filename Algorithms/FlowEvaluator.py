@@ -0,0 +1,138 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+from LucasKanade import LucasKanade
+from Farneback import Farneback
+from HornSchunck import HornSchunck
+from DIS import DIS
+from BlockMatching import BlockMatching
+from Autotuner import resize_flow
+
+ENGINES = {
+    'lk': LucasKanade,
+    'farneback': Farneback,
+    'hs': HornSchunck,
+    'dis': DIS,
+    'bm': BlockMatching,
+}
+
+def _gray(frame, scale):
+    gray = cv.cvtColor(np.asarray(frame), cv.COLOR_BGR2GRAY)
+    if scale != 1.0:
+        h, w = gray.shape
+        gray = cv.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv.INTER_AREA)
+    return gray
+
+def _errors(engine, sample):
+    """
+    Calcula o fluxo do par e devolve (erros de cada pixel/ponto avaliado, |gt| neles).
+    Densos: todos os pixels válidos. Lucas-Kanade: só os pontos rastreados.
+    """
+    gt, valid = np.asarray(sample['flow']), np.asarray(sample['valid'])
+    scale = engine.scale_factor
+    prev_gray, gray = _gray(sample['frame1'], scale), _gray(sample['frame2'], scale)
+
+    if isinstance(engine, LucasKanade):
+        engine._process_frame_logic(None, prev_gray)
+        old, new = engine._process_frame_logic(None, gray)
+        if len(old) == 0:
+            return np.zeros(0, np.float32), np.zeros(0, np.float32)
+        old, new = old.reshape(-1, 2) / scale, new.reshape(-1, 2) / scale
+        h, w = valid.shape
+        xs = np.clip(np.round(old[:, 0]).astype(int), 0, w - 1)
+        ys = np.clip(np.round(old[:, 1]).astype(int), 0, h - 1)
+        keep = valid[ys, xs]
+        diff = (new - old)[keep] - gt[ys[keep], xs[keep]]
+        return np.linalg.norm(diff, axis=1), np.linalg.norm(gt[ys[keep], xs[keep]], axis=1)
+
+    engine._process_and_draw(None, prev_gray)
+    engine._process_and_draw(None, gray)
+    flow = resize_flow(engine.last_flow, (gt.shape[1], gt.shape[0]), scale)
+    return np.linalg.norm(flow - gt, axis=2)[valid], np.linalg.norm(gt, axis=2)[valid]
+
+# --- Processos de avaliação ---
+
+_dataset = None
+_engines = None
+
+def _init_worker(dataset, engine_names):
+    global _dataset, _engines
+    cv.setNumThreads(1) # Paralelismo entre amostras, não dentro de cada uma
+    _dataset = dataset
+    _engines = {}
+    for name in engine_names:
+        engine = ENGINES[name](None)
+        _engines[name] = (engine, engine._get_state())
+
+def _evaluate_sample(index):
+    """Somatórios de uma amostra por algoritmo (agregados depois, ponderados por pixel)."""
+    sample = _dataset[index]
+    stats = {}
+    for name, (engine, initial_state) in _engines.items():
+        engine._set_state(initial_state) # Cada amostra é um par independente
+        t0 = time.perf_counter()
+        epe, magnitude = _errors(engine, sample)
+        elapsed = time.perf_counter() - t0
+        # Outlier (Fl do KITTI): erro > 3 px E > 5% do deslocamento verdadeiro
+        outliers = int(np.count_nonzero((epe > 3.0) & (epe > 0.05 * magnitude)))
+        stats[name] = dict(epe_sum=float(epe.sum()), count=int(epe.size), outliers=outliers,
+                           seconds=elapsed, image_epe=float(epe.mean()) if epe.size else float('nan'))
+    return sample['name'], stats
+
+class FlowEvaluator:
+    """
+    Avaliação de precisão dos algoritmos sobre datasets com ground truth
+    (SintelDataset, KittiDataset), com as amostras distribuídas entre processos.
+
+    Métricas (ponderadas por pixel, como nos benchmarks):
+    - EPE: erro médio de ponto final (distância entre vetor estimado e verdadeiro).
+    - Fl: % de outliers (erro > 3 px e > 5% do deslocamento verdadeiro).
+    O Lucas-Kanade é esparso: as métricas dele valem só nos pontos rastreados.
+    """
+
+    def __init__(self, dataset, engines=('lk', 'farneback', 'hs'), workers=None, max_samples=None):
+        """
+        :param dataset: FlowDataset (ex: SintelDataset('Dataset/Sintel')).
+        :param engines: Algoritmos avaliados: 'lk', 'farneback', 'hs', 'dis', 'bm'.
+        :param workers: Processos em paralelo (padrão: número de núcleos).
+        :param max_samples: Limita o número de pares avaliados (None = todos).
+        """
+        unknown = [name for name in engines if name not in ENGINES]
+        if unknown:
+            raise ValueError(f"Algoritmo desconhecido: {', '.join(unknown)}. Use: {', '.join(ENGINES)}")
+        self.dataset = dataset
+        self.engines = tuple(engines)
+        self.workers = workers or os.cpu_count()
+        self.max_samples = max_samples
+        self.per_sample = {} # nome da amostra -> estatísticas por algoritmo
+
+    def run(self):
+        """Avalia e retorna {algoritmo: {'epe', 'fl', 'points', 'ms_per_pair'}}."""
+        n = len(self.dataset) if self.max_samples is None else min(self.max_samples, len(self.dataset))
+        totals = {name: dict(epe_sum=0.0, count=0, outliers=0, seconds=0.0) for name in self.engines}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.dataset, self.engines)) as pool:
+            for sample_name, stats in pool.map(_evaluate_sample, range(n), chunksize=4):
+                self.per_sample[sample_name] = stats
+                for name, s in stats.items():
+                    for key in totals[name]:
+                        totals[name][key] += s[key]
+
+        return {name: dict(epe=t['epe_sum'] / max(t['count'], 1),
+                           fl=100.0 * t['outliers'] / max(t['count'], 1),
+                           points=t['count'],
+                           ms_per_pair=1000 * t['seconds'] / max(n, 1))
+                for name, t in totals.items()}
+
+
+if __name__ == "__main__":
+    from FlowDatasets import SintelDataset
+
+    dataset = SintelDataset('Dataset/Sintel', dstype='clean', cache_dir='Outputs/sintel_cache')
+    results = FlowEvaluator(dataset, engines=('lk', 'farneback', 'hs')).run()
+    print(f"{'Algoritmo':<12} {'EPE':>8} {'Fl (%)':>8} {'ms/par':>8}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['epe']:8.3f} {r['fl']:8.2f} {r['ms_per_pair']:8.1f}")
@@ -0,0 +1,56 @@
+import cv2 as cv
+import numpy as np
+
+# Formato .flo (Middlebury / Sintel): 'PIEH' (float 202021.25), largura e altura
+# em int32 e depois os vetores (u, v) em float32, linha a linha.
+FLO_MAGIC = 202021.25
+FLO_HEADER = 12 # bytes
+
+def read_flo(path, mmap=True):
+    """
+    Lê um arquivo .flo. Com mmap=True, o campo é mapeado em memória (só as páginas
+    usadas são lidas do disco) e não pode ser alterado.
+    :return: fluxo (H, W, 2) float32
+    """
+    with open(path, 'rb') as f:
+        magic = np.fromfile(f, np.float32, 1)
+        if magic.size == 0 or magic[0] != FLO_MAGIC:
+            raise ValueError(f"Arquivo .flo inválido: {path}")
+        w, h = np.fromfile(f, np.int32, 2)
+        if not mmap:
+            return np.fromfile(f, np.float32, int(w) * int(h) * 2).reshape(h, w, 2)
+    return np.memmap(path, np.float32, 'r', offset=FLO_HEADER, shape=(int(h), int(w), 2))
+
+def write_flo(path, flow):
+    """Grava um fluxo (H, W, 2) no formato .flo."""
+    flow = np.asarray(flow, dtype=np.float32)
+    h, w = flow.shape[:2]
+    with open(path, 'wb') as f:
+        np.float32(FLO_MAGIC).tofile(f)
+        np.int32([w, h]).tofile(f)
+        flow.tofile(f)
+
+def read_kitti(path):
+    """
+    Lê um fluxo no formato KITTI: PNG de 16 bits com (u, v, válido) nos canais
+    R, G, B; u = (R - 2^15) / 64.
+    :return: (fluxo (H, W, 2) float32, máscara de válidos (H, W) bool)
+    """
+    png = cv.imread(path, cv.IMREAD_UNCHANGED)
+    if png is None or png.dtype != np.uint16:
+        raise ValueError(f"PNG de fluxo KITTI inválido: {path}")
+    png = png[..., ::-1].astype(np.float32) # BGR -> RGB
+    flow = (png[..., :2] - 2 ** 15) / 64.0
+    valid = png[..., 2] > 0
+    flow[~valid] = 0
+    return flow, valid
+
+def write_kitti(path, flow, valid=None):
+    """Grava um fluxo no formato KITTI (valores fora de ±512 px são saturados)."""
+    h, w = flow.shape[:2]
+    if valid is None:
+        valid = np.ones((h, w), bool)
+    png = np.zeros((h, w, 3), np.uint16)
+    png[..., :2] = np.clip(np.asarray(flow) * 64.0 + 2 ** 15, 0, 2 ** 16 - 1).astype(np.uint16)
+    png[..., 2] = valid
+    cv.imwrite(path, png[..., ::-1])
@@ -0,0 +1,327 @@
+import io
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2 as cv
+import numpy as np
+from FrameSource import FrameSource
+
+class _Job:
+    """Um pedido na fila de um algoritmo (respondido quando `done` é sinalizado)."""
+
+    def __init__(self, input_source=None, pairs=None, images=None, span=None):
+        self.input_source = input_source
+        self.pairs = pairs or [] # [(i, j), ...] com índices absolutos na entrada
+        self.span = span # (start, end, stride): pares consecutivos, resolvidos pelo worker
+        self.images = images # [(prev, next), ...] para pares avulsos enviados pelo cliente
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class _EngineWorker:
+    """
+    Thread que mantém uma instância "quente" de um algoritmo e atende a fila dele.
+    Pares consecutivos ((i, j) seguido de (j, k)) reaproveitam o estado do algoritmo
+    (filtros do HS, preditores do BlockMatching), como numa execução normal.
+    """
+
+    def __init__(self, service, name, create):
+        self.service = service
+        self.name = name
+        self.engine = create(None)
+        self.initial_state = self.engine._get_state()
+        self.queue = queue.Queue()
+        self.sources = OrderedDict() # Entradas abertas (LRU)
+        self._last = None # Último frame entregue ao algoritmo (chave)
+        self.thread = threading.Thread(target=self._loop, name=f"flow-{name}", daemon=True)
+
+    def _next_batch(self):
+        """Espera um pedido e junta os que chegarem em seguida (até max_batch / batch_window)."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.service.batch_window
+        while batch[-1] is not None and len(batch) < self.service.max_batch:
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self._process_batch(jobs)
+            if stop:
+                return
+
+    def _process_batch(self, jobs):
+        # Intervalos sem fim viram pares aqui, com a fonte do pool (o fim é o último frame)
+        for job in [job for job in jobs if job.span is not None]:
+            try:
+                job.pairs = self._span_pairs(job.input_source, *job.span)
+            except Exception as e:
+                job.error = str(e)
+                job.done.set()
+                jobs.remove(job)
+        # Pedidos da mesma entrada juntos e em ordem de frame: os frames em comum
+        # são decodificados uma vez só e os pares seguidos aproveitam o estado.
+        jobs.sort(key=lambda job: (job.input_source or '', job.pairs[0] if job.pairs else (0, 0)))
+        grays = {}
+        for job in jobs:
+            try:
+                if job.images is not None:
+                    flows = [self._flow(None, None, self._prepare(prev), self._prepare(nxt))
+                             for prev, nxt in job.images]
+                else:
+                    flows = [self._flow((job.input_source, i), (job.input_source, j),
+                                        self._gray(grays, job.input_source, i),
+                                        self._gray(grays, job.input_source, j))
+                             for i, j in job.pairs]
+                job.result = flows
+            except Exception as e:
+                job.error = str(e)
+            job.done.set()
+        self.service._count_batch(len(jobs), sum(len(job.result or []) for job in jobs))
+
+    def _span_pairs(self, input_source, start, end, stride):
+        if end is None:
+            end = self._source(input_source).frame_count()
+        idx = list(range(start, end, stride))
+        return list(zip(idx, idx[1:]))
+
+    def _source(self, input_source):
+        source = self.sources.pop(input_source, None) or FrameSource(input_source)
+        self.sources[input_source] = source
+        while len(self.sources) > self.service.max_sources:
+            self.sources.popitem(last=False)[1].release()
+        return source
+
+    def _gray(self, grays, input_source, index):
+        """Frame em cinza na escala do algoritmo (decodificado uma vez por grupo de pedidos)."""
+        key = (input_source, index)
+        if key not in grays:
+            source = self._source(input_source)
+            source.seek(index)
+            ret, _, gray = source.read_gray(self.engine.scale_factor, need_color=False)
+            if not ret:
+                raise ValueError(f"Frame {index} não existe em: {input_source}")
+            grays[key] = gray
+        return grays[key]
+
+    def _prepare(self, image):
+        """Imagem enviada pelo cliente (cinza ou BGR, resolução original) -> cinza reduzido."""
+        image = np.asarray(image, dtype=np.uint8)
+        gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        h, w = gray.shape
+        scale = self.engine.scale_factor
+        if scale != 1.0:
+            gray = cv.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv.INTER_AREA)
+        return gray
+
+    def _flow(self, first, second, prev_gray, gray):
+        """Fluxo de um par pelo caminho normal do algoritmo (_process_and_draw sem desenho)."""
+        if first is None or first != self._last:
+            self.engine._set_state(self.initial_state)
+            self.engine._process_and_draw(None, prev_gray)
+        self.engine._process_and_draw(None, gray)
+        self._last = second
+        return self.engine.last_flow
+
+class FlowService:
+    """
+    Serviço local (HTTP em localhost) que mantém os algoritmos de fluxo "quentes".
+
+    Várias ferramentas pedem fluxo para pares de frames avulsos; em vez de cada uma
+    importar e inicializar os algoritmos, um processo de longa duração atende todas.
+
+    Rotas:
+    - POST /flow?engine=<nome> com JSON:
+        {"input": caminho, "pairs": [[i, j], ...]} ou
+        {"input": caminho, "start": 0, "end": 100, "stride": 1} (pares consecutivos)
+    - POST /flow?engine=<nome> com um .npz (application/octet-stream) contendo
+      'prev' e 'next' (um par ou N pares empilhados, cinza ou BGR).
+    - GET /metrics: fila, grupos de pedidos ("batches") e latência (JSON).
+
+    Resposta de /flow: .npz com 'flow' (N, h, w, 2) em float16 (metade do tamanho;
+    a precisão sobra para fluxo em pixels), 'pairs' e 'scale' (escala do algoritmo).
+
+    Pedidos simultâneos para o mesmo algoritmo são agrupados (até max_batch, esperando
+    no máximo batch_window segundos): é um agrupamento de pedidos, não inferência em
+    lote. No grupo, os frames em comum são decodificados uma vez só e pares seguidos
+    aproveitam o estado do algoritmo, mas cada par ainda é calculado separadamente
+    (os algoritmos do OpenCV calculam um par por chamada).
+    """
+
+    def __init__(self, engines, host='127.0.0.1', port=8765, max_batch=32, batch_window=0.005,
+                 max_sources=4):
+        """
+        :param engines: Dicionário nome -> função que cria o algoritmo (recebe a fonte,
+                        que aqui é None). Ex: {'dis': lambda src: DIS(src, preset='fast')}
+        :param host: Endereço (só localhost, por padrão).
+        :param port: Porta HTTP.
+        :param max_batch: Máximo de pedidos agrupados.
+        :param batch_window: Tempo (s) que o grupo espera por mais pedidos.
+        :param max_sources: Quantas entradas (vídeos/pastas) cada algoritmo mantém abertas.
+        """
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_sources = max_sources
+        self.workers = {name: _EngineWorker(self, name, create) for name, create in engines.items()}
+        self._server = None
+
+        # --- Métricas ---
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        self.pairs = 0
+        self._latencies = deque(maxlen=1000) # ms dos últimos pedidos
+
+    def submit(self, engine, job):
+        """Coloca o pedido na fila do algoritmo e espera a resposta."""
+        if engine not in self.workers:
+            raise ValueError(f"Algoritmo desconhecido: {engine}. Use: {', '.join(self.workers)}")
+        t0 = time.perf_counter()
+        self.workers[engine].queue.put(job)
+        job.done.wait()
+        with self._lock:
+            self.requests += 1
+            self.errors += job.error is not None
+            self._latencies.append((time.perf_counter() - t0) * 1000)
+        if job.error is not None:
+            raise ValueError(job.error)
+        return job.result
+
+    def _count_batch(self, jobs, pairs):
+        with self._lock:
+            self.batches += 1
+            self.batched_jobs += jobs
+            self.pairs += pairs
+
+    def metrics(self):
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+            return dict(
+                uptime_s=round(time.time() - self.started, 1),
+                requests=self.requests,
+                errors=self.errors,
+                pairs=self.pairs,
+                batches=self.batches,
+                mean_batch_size=round(self.batched_jobs / max(self.batches, 1), 2),
+                queue_depth={name: w.queue.qsize() for name, w in self.workers.items()},
+                latency_ms=dict(p50=round(float(np.percentile(latencies, 50)), 2),
+                                p95=round(float(np.percentile(latencies, 95)), 2),
+                                max=round(float(latencies.max()), 2)),
+            )
+
+    def _parse_request(self, content_type, body):
+        """Corpo do POST /flow -> _Job."""
+        if content_type.startswith('application/json'):
+            req = json.loads(body)
+            if 'pairs' in req:
+                pairs = [tuple(pair) for pair in req['pairs']]
+            else:
+                # O fim (se omitido) é resolvido pelo worker, com a fonte que ele já mantém aberta
+                span = (req.get('start', 0), req.get('end'), req.get('stride', 1))
+                return _Job(input_source=req['input'], span=span)
+            return _Job(input_source=req['input'], pairs=pairs)
+
+        arrays = np.load(io.BytesIO(body))
+        prev, nxt = arrays['prev'], arrays['next']
+        if prev.ndim == 2 or (prev.ndim == 3 and prev.shape[-1] == 3):
+            prev, nxt = prev[None], nxt[None] # Um par só
+        return _Job(images=list(zip(prev, nxt)))
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass # Sem log por pedido (as métricas ficam em /metrics)
+
+            def _reply(self, code, body, content_type):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _reply_json(self, code, data):
+                self._reply(code, json.dumps(data).encode(), 'application/json')
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/metrics':
+                    self._reply_json(200, service.metrics())
+                else:
+                    self._reply_json(404, dict(error='Rota desconhecida'))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != '/flow':
+                    return self._reply_json(404, dict(error='Rota desconhecida'))
+                engine = parse_qs(url.query).get('engine', [next(iter(service.workers))])[0]
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    job = service._parse_request(self.headers.get('Content-Type', ''), body)
+                    flows = service.submit(engine, job)
+                except (ValueError, KeyError, OSError) as e:
+                    return self._reply_json(400, dict(error=str(e)))
+
+                buffer = io.BytesIO()
+                np.savez(buffer,
+                         flow=np.stack(flows).astype(np.float16) if flows else np.zeros((0, 0, 0, 2), np.float16),
+                         pairs=np.array(job.pairs, dtype=np.int32).reshape(-1, 2),
+                         scale=np.float32(service.workers[engine].engine.scale_factor))
+                self._reply(200, buffer.getvalue(), 'application/octet-stream')
+
+        return Handler
+
+    def start(self):
+        """Sobe os algoritmos e o servidor HTTP (em threads; retorna logo)."""
+        for worker in self.workers.values():
+            worker.thread.start()
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self._server.server_address[1] # Útil com port=0 (porta livre qualquer)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"FlowService em http://{self.host}:{self.port} ({', '.join(self.workers)})")
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for worker in self.workers.values():
+            worker.queue.put(None)
+            worker.thread.join()
+            for source in worker.sources.values():
+                source.release()
+
+
+if __name__ == "__main__":
+    from Farneback import Farneback
+    from HornSchunck import HornSchunck
+    from DIS import DIS
+
+    FlowService({
+        'farneback': lambda src: Farneback(src),
+        'dis': lambda src: DIS(src, preset='fast'),
+        'hs': lambda src: HornSchunck(src),
+    }, port=8765).serve_forever()
@@ -0,0 +1,340 @@
+import bisect
+import cv2 as cv
+import json
+import os
+import re
+import time
+
+def natural_key(path):
+    """Chave de ordenação que respeita números no nome ('frame2' antes de 'frame10')."""
+    return [int(part) if part.isdigit() else part.lower()
+            for part in re.split(r'(\d+)', os.path.basename(path))]
+
+class FrameSource:
+    """
+    Fonte de frames compartilhada pelos algoritmos.
+    Suporta entrada de arquivos de vídeo (.mp4, .avi) ou pastas com sequências de imagens.
+    """
+
+    VALID_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+    # Decodificação já reduzida e em cinza (o JPEG decodifica direto em 1/2, 1/4, 1/8)
+    REDUCED_FLAGS = {
+        1: cv.IMREAD_GRAYSCALE,
+        2: cv.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+
+    # Sem índice de keyframes: avançar com grab() até este número de frames;
+    # mais longe que isso, um seek (que volta ao keyframe anterior) sai mais barato
+    MAX_GRAB = 30
+
+    def __init__(self, input_source, reduced_decode=False, start=0, end=None, stride=1,
+                 follow=False, idle_timeout=10.0, poll_interval=0.5):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param reduced_decode: Só para pastas de imagens. Se True, o frame em cinza usado
+                               no cálculo é decodificado direto na resolução reduzida
+                               (IMREAD_REDUCED_GRAYSCALE_*), e o frame colorido em resolução
+                               cheia só é decodificado quando alguma saída visual precisa dele.
+                               Ideal para execuções sem vídeo/janela (fluxo bruto, cache, análises).
+        :param start: Primeiro frame lido (índice absoluto na entrada).
+        :param end: Frame onde a leitura para (exclusivo). None = até o fim.
+        :param stride: Passo entre frames lidos (2 = um frame sim, um não).
+        :param follow: Só para pastas. Se True, a pasta é vigiada enquanto é gravada:
+                       ao chegar no último frame, a leitura espera por novos arquivos
+                       em vez de terminar (o algoritmo continua com o mesmo estado).
+        :param idle_timeout: No modo follow, segundos sem nenhum frame novo até encerrar.
+        :param poll_interval: No modo follow, intervalo (s) entre verificações da pasta.
+        """
+        self.input_source = input_source
+        self.reduced_decode = reduced_decode
+        self.frame_size = None # (largura, altura) originais, descobertas no primeiro frame
+        self.is_video_file = os.path.isfile(input_source)
+        self.image_paths = []
+        self.follow = follow and not os.path.isfile(input_source)
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self._pending = None # (caminho, tamanho) do arquivo mais novo, talvez ainda sendo gravado
+        self.position = 0 # Índice absoluto do próximo frame a ser lido
+        self.last_index = -1 # Índice absoluto do último frame lido
+        self.cap = None
+        self.fps = None
+        self._cap_pos = 0 # Próximo frame que o decodificador de vídeo entrega
+        self._index = None # Índice do vídeo (timestamps e keyframes), carregado sob demanda
+
+        # --- Configuração da Fonte de Entrada ---
+        if self.is_video_file:
+            # Modo Vídeo
+            self.cap = cv.VideoCapture(input_source)
+            if not self.cap.isOpened():
+                raise ValueError(f"Não foi possível abrir o vídeo: {input_source}")
+            self.fps = self.cap.get(cv.CAP_PROP_FPS) or None
+        elif os.path.isdir(input_source):
+            # Modo Sequência de Imagens
+            self._refresh()
+            if not self.image_paths and not self.follow:
+                raise ValueError(f"Nenhuma imagem encontrada na pasta: {input_source}")
+        else:
+            raise ValueError(f"Entrada inválida (não é arquivo nem pasta): {input_source}")
+
+        self.start, self.end, self.stride = 0, None, 1
+        self.set_range(start, end, stride)
+
+    @staticmethod
+    def open(input_source):
+        """
+        Aceita um caminho ou uma FrameSource já aberta (compartilhada entre algoritmos).
+        None devolve None: algoritmo sem fonte, que só calcula pares avulsos (ex: FlowService).
+        """
+        if input_source is None or isinstance(input_source, FrameSource):
+            return input_source
+        return FrameSource(input_source)
+
+    def set_range(self, start=None, end=None, stride=None):
+        """
+        Define o intervalo lido (start, end exclusivo, stride) e volta para o início dele.
+        Argumentos None mantêm o valor atual.
+        """
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        stride = self.stride if stride is None else stride
+        if start < 0 or stride < 1 or (end is not None and end < start):
+            raise ValueError(f"Intervalo inválido: start={start}, end={end}, stride={stride}")
+        self.start, self.end, self.stride = start, end, stride
+        self.seek(start)
+
+    def __len__(self):
+        """Quantos frames o intervalo atual tem (pode ser aproximado em vídeos sem índice)."""
+        total = self.frame_count()
+        end = total if self.end is None else min(self.end, total)
+        return len(range(self.start, end, self.stride))
+
+    def frame_count(self):
+        if not self.is_video_file:
+            return len(self.image_paths)
+        index = self.index()
+        if index is not None:
+            return len(index['timestamps'])
+        return int(self.cap.get(cv.CAP_PROP_FRAME_COUNT))
+
+    def _exhausted(self):
+        if self.end is not None and self.position >= self.end:
+            return True
+        if self.is_video_file or self.position < len(self.image_paths):
+            return False
+        return not (self.follow and self._wait_for_frames())
+
+    # --- Pastas (e modo follow) ---
+
+    def _refresh(self):
+        """
+        Lista a pasta (ordem natural, para garantir a ordem temporal) e acrescenta
+        os arquivos novos. No modo follow, o arquivo mais novo só entra quando
+        chega outro depois dele ou quando seu tamanho para de mudar (gravação terminada).
+        """
+        known = set(self.image_paths)
+        new_paths = sorted([
+            os.path.join(self.input_source, f) for f in os.listdir(self.input_source)
+            if f.lower().endswith(self.VALID_EXTS)
+        ], key=natural_key)
+        new_paths = [path for path in new_paths if path not in known]
+
+        if self.follow and new_paths:
+            newest = new_paths[-1]
+            size = os.path.getsize(newest)
+            if self._pending != (newest, size):
+                self._pending = (newest, size)
+                new_paths.pop()
+        self.image_paths.extend(new_paths)
+
+    def _wait_for_frames(self):
+        """Espera por novos frames na pasta. Retorna False se passar idle_timeout sem nenhum."""
+        deadline = time.monotonic() + self.idle_timeout
+        while True:
+            self._refresh()
+            if self.position < len(self.image_paths):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    def read(self):
+        """Lê o próximo frame do intervalo (seja de vídeo ou lista de imagens)."""
+        if self._exhausted():
+            return False, None
+        if self.is_video_file:
+            self._goto(self.position)
+            ret, frame = self.cap.read()
+            self._cap_pos += 1
+        else:
+            # Pastas: acesso direto ao arquivo, sem decodificar os frames pulados
+            frame = cv.imread(self.image_paths[self.position])
+            ret = frame is not None
+        if ret:
+            self.last_index = self.position
+            self.position += self.stride
+        return ret, frame
+
+    def seek(self, index):
+        """
+        Posiciona a leitura no frame `index` (índice absoluto: o próximo read() devolve
+        esse frame). Em vídeos, a decodificação só acontece no read() seguinte.
+        """
+        self.position = index
+
+    # --- Índice do Vídeo (timestamps e keyframes) ---
+
+    def index(self):
+        """
+        Índice do vídeo: {'timestamps': [s, ...], 'keyframes': [frame, ...]}.
+        Montado uma vez por vídeo com o ffprobe (só lê os pacotes, sem decodificar)
+        e guardado ao lado do vídeo em '<video>.index.json'.
+        Retorna None para pastas ou se o ffprobe não estiver disponível.
+        """
+        if not self.is_video_file:
+            return None
+        if self._index is None:
+            self._index = self._load_index() or False
+        return self._index or None
+
+    def _load_index(self):
+        stat = os.stat(self.input_source)
+        signature = [stat.st_size, int(stat.st_mtime)]
+        sidecar = self.input_source + '.index.json'
+        try:
+            with open(sidecar) as f:
+                data = json.load(f)
+            if data.get('signature') == signature:
+                return data
+        except (OSError, ValueError):
+            pass
+
+        import shutil, subprocess # Só aqui: quem não indexa vídeos não paga a importação
+        if not shutil.which('ffprobe'):
+            return None
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', self.input_source],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+
+        packets = []
+        for line in result.stdout.splitlines():
+            pts, _, flags = line.partition(',')
+            try:
+                packets.append((float(pts), 'K' in flags))
+            except ValueError:
+                continue # Pacote sem pts
+        # Os pacotes vêm em ordem de decodificação; os frames, em ordem de apresentação
+        packets.sort()
+        data = dict(signature=signature,
+                    timestamps=[pts for pts, _ in packets],
+                    keyframes=[i for i, (_, key) in enumerate(packets) if key])
+        try:
+            with open(sidecar, 'w') as f:
+                json.dump(data, f)
+        except OSError:
+            pass # Pasta só de leitura: o índice fica só em memória
+        return data
+
+    def timestamp(self, index):
+        """Instante (em segundos) do frame `index`, ou None se não houver como saber."""
+        video_index = self.index()
+        if video_index is not None and index < len(video_index['timestamps']):
+            return video_index['timestamps'][index]
+        return index / self.fps if self.fps else None
+
+    def _goto(self, target):
+        """Deixa o decodificador pronto para entregar o frame `target`."""
+        gap = target - self._cap_pos
+        if gap == 0:
+            return
+        if gap > 0:
+            video_index = self.index()
+            if video_index is not None:
+                # Só vale o seek se existir um keyframe depois da posição atual
+                keyframes = video_index['keyframes']
+                i = bisect.bisect_right(keyframes, target) - 1
+                grab = i < 0 or keyframes[i] <= self._cap_pos
+            else:
+                grab = gap <= self.MAX_GRAB
+            if grab:
+                # grab() decodifica mas não converte/copia o frame
+                for _ in range(gap):
+                    self.cap.grab()
+                self._cap_pos = target
+                return
+        # O backend volta ao keyframe anterior e decodifica só a partir dele
+        self.cap.set(cv.CAP_PROP_POS_FRAMES, target)
+        self._cap_pos = target
+
+    def _reduction_for(self, scale):
+        """Maior fator de redução do decodificador que ainda não fica menor que a escala pedida."""
+        for r in (8, 4, 2):
+            if scale <= 1.0 / r + 1e-6:
+                return r
+        return 1
+
+    def read_pyramid(self, scales, need_color=True):
+        """
+        Lê o próximo frame já em cinza, em cada uma das escalas pedidas.
+
+        - Vídeo (ou pasta sem reduced_decode): decodifica colorido, converte para
+          cinza e só então reduz (redimensionar 1 canal custa 1/3 de 3 canais).
+        - Pasta com reduced_decode: decodifica direto em cinza reduzido para a maior
+          escala pedida; o colorido cheio só é lido se need_color=True.
+
+        :param scales: Escalas (ex: [0.5] ou [1.0, 0.75, 0.5]) em relação ao tamanho original.
+        :param need_color: Se False, o frame colorido não é retornado (nem decodificado, se possível).
+        :return: (ret, frame colorido ou None, dicionário escala -> cinza)
+        """
+        scales = sorted(set(scales), reverse=True)
+        frame = None
+
+        if self.is_video_file or not self.reduced_decode:
+            ret, frame = self.read()
+            if not ret:
+                return False, None, {}
+            if self.frame_size is None:
+                self.frame_size = (frame.shape[1], frame.shape[0])
+            gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        else:
+            if self._exhausted():
+                return False, None, {}
+            path = self.image_paths[self.position]
+            if self.frame_size is None:
+                # Uma decodificação completa, só no primeiro frame, para saber o tamanho original
+                first = cv.imread(path, cv.IMREAD_GRAYSCALE)
+                if first is None:
+                    return False, None, {}
+                self.frame_size = (first.shape[1], first.shape[0])
+            gray = cv.imread(path, self.REDUCED_FLAGS[self._reduction_for(scales[0])])
+            if gray is None:
+                return False, None, {}
+            if need_color:
+                frame = cv.imread(path)
+                if frame is None:
+                    return False, None, {}
+            self.last_index = self.position
+            self.position += self.stride
+
+        w, h = self.frame_size
+        grays = {}
+        for scale in scales:
+            size = (int(w * scale), int(h * scale))
+            if (gray.shape[1], gray.shape[0]) == size:
+                grays[scale] = gray
+            else:
+                grays[scale] = cv.resize(gray, size, interpolation=cv.INTER_AREA)
+        return True, (frame if need_color else None), grays
+
+    def read_gray(self, scale=1.0, need_color=True):
+        """Atalho de read_pyramid para uma única escala: (ret, frame ou None, cinza)."""
+        ret, frame, grays = self.read_pyramid([scale], need_color)
+        return ret, frame, grays.get(scale)
+
+    def release(self):
+        if self.cap: self.cap.release()
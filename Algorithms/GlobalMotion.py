@@ -0,0 +1,182 @@
+import threading
+
+import cv2 as cv
+import numpy as np
+
+class GlobalMotion:
+    """
+    Estima o movimento global da câmera (ego-motion) entre dois frames.
+
+    As filmagens de calçada são feitas andando com a câmera na mão, então o
+    movimento da câmera domina o fluxo denso. Estimar uma transformação global
+    é muito mais barato que o fluxo denso, e o fluxo residual isola os objetos
+    que se movem por conta própria (pedestres, carros...).
+
+    Métodos de estimação:
+    - 'phase': correlação de fase (FFT) em blocos (tiles) + ajuste robusto.
+    - 'lk': cantos Shi-Tomasi rastreados com LK esparso + ajuste RANSAC.
+
+    Modos de uso:
+    - 'stabilize': alinha o frame anterior ao atual ANTES do fluxo denso.
+    - 'subtract': calcula o fluxo normal e subtrai o fluxo global DEPOIS.
+
+    Pode ser compartilhado por algoritmos que rodam em threads (MultiEngine), mesmo
+    em escalas diferentes: as janelas e grades ficam em caches por tamanho, com trava.
+    Nesse caso, last_transform é o da última estimativa de qualquer um deles.
+    """
+
+    def __init__(self, method='phase', model='similarity', mode='subtract', tiles=(4, 4)):
+        """
+        :param method: 'phase' ou 'lk'.
+        :param model: 'translation', 'similarity' (rotação+escala+translação) ou 'affine'.
+        :param mode: 'stabilize' ou 'subtract'.
+        :param tiles: Grade (linhas, colunas) de blocos da correlação de fase.
+        """
+        if method not in ('phase', 'lk'):
+            raise ValueError("Método desconhecido. Use: 'phase', 'lk'")
+        if model not in ('translation', 'similarity', 'affine'):
+            raise ValueError("Modelo desconhecido. Use: 'translation', 'similarity', 'affine'")
+        if mode not in ('stabilize', 'subtract'):
+            raise ValueError("Modo desconhecido. Use: 'stabilize', 'subtract'")
+
+        self.method = method
+        self.model = model
+        self.mode = mode
+        self.tiles = tiles
+        self.min_response = 0.1 # Tiles com pico de correlação mais fraco são descartados
+        self.ransac_threshold = 2.0 # Pixels
+
+        # Parâmetros do método 'lk' (mesmos nomes do LucasKanade)
+        self.feature_params = dict(maxCorners=200, qualityLevel=0.01, minDistance=8, blockSize=7)
+        self.lk_params = dict(winSize=(21, 21), maxLevel=3,
+                              criteria=(cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 10, 0.03))
+
+        self.last_transform = None
+        self._windows = {} # (th, tw) -> janela de Hanning
+        self._grid_cache = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # A trava não vai junto (ex: engine_kwargs de um SharedPipeline com 'spawn')
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def params(self):
+        """Configuração que influencia o fluxo (entra na chave do FlowCache)."""
+        return dict(method=self.method, model=self.model, mode=self.mode, tiles=self.tiles)
+
+    # ------------------------------------------------------------ estimação
+
+    def estimate(self, prev_gray, gray_frame):
+        """
+        Retorna a matriz 2x3 que leva coordenadas do frame anterior para o atual.
+        Se a estimação falhar, retorna a identidade.
+        """
+        if self.method == 'phase':
+            src, dst = self._tile_shifts(prev_gray, gray_frame)
+        else:
+            src, dst = self._lk_tracks(prev_gray, gray_frame)
+
+        M = self._fit(src, dst)
+        self.last_transform = M
+        return M
+
+    def _tile_shifts(self, prev_gray, gray_frame):
+        """Correlação de fase em cada tile: (centro do tile, centro + deslocamento)."""
+        h, w = prev_gray.shape[:2]
+        rows, cols = self.tiles
+        th, tw = h // rows, w // cols
+        with self._lock:
+            window = self._windows.get((th, tw))
+            if window is None:
+                window = self._windows[(th, tw)] = cv.createHanningWindow((tw, th), cv.CV_32F)
+
+        a = np.float32(prev_gray)
+        b = np.float32(gray_frame)
+        src, dst = [], []
+        for r in range(rows):
+            for c in range(cols):
+                y, x = r * th, c * tw
+                (dx, dy), response = cv.phaseCorrelate(a[y:y+th, x:x+tw], b[y:y+th, x:x+tw], window)
+                if response < self.min_response:
+                    continue
+                cx, cy = x + tw / 2, y + th / 2
+                src.append((cx, cy))
+                dst.append((cx + dx, cy + dy))
+        return np.float32(src).reshape(-1, 2), np.float32(dst).reshape(-1, 2)
+
+    def _lk_tracks(self, prev_gray, gray_frame):
+        """Cantos do frame anterior rastreados no atual."""
+        p0 = cv.goodFeaturesToTrack(prev_gray, mask=None, **self.feature_params)
+        if p0 is None:
+            return np.zeros((0, 2), np.float32), np.zeros((0, 2), np.float32)
+        p1, st, _ = cv.calcOpticalFlowPyrLK(prev_gray, gray_frame, p0, None, **self.lk_params)
+        good = st.ravel() == 1
+        return p0.reshape(-1, 2)[good], p1.reshape(-1, 2)[good]
+
+    def _fit(self, src, dst):
+        """Ajuste robusto do modelo escolhido aos pares de pontos."""
+        M = np.float32([[1, 0, 0], [0, 1, 0]])
+        if len(src) == 0:
+            return M
+
+        if self.model == 'translation' or len(src) < 3:
+            # Mediana é robusta a tiles/pontos em objetos que se movem
+            M[:, 2] = np.median(dst - src, axis=0)
+            return M
+
+        if self.model == 'similarity':
+            A, _ = cv.estimateAffinePartial2D(src, dst, method=cv.RANSAC,
+                                              ransacReprojThreshold=self.ransac_threshold)
+        else:
+            A, _ = cv.estimateAffine2D(src, dst, method=cv.RANSAC,
+                                       ransacReprojThreshold=self.ransac_threshold)
+        if A is None:
+            M[:, 2] = np.median(dst - src, axis=0)
+            return M
+        return np.float32(A)
+
+    # ---------------------------------------------------------- compensação
+
+    def stabilize(self, prev_gray, M):
+        """Deforma o frame anterior para ficar alinhado ao atual."""
+        h, w = prev_gray.shape[:2]
+        return cv.warpAffine(prev_gray, M, (w, h), flags=cv.INTER_LINEAR,
+                             borderMode=cv.BORDER_REPLICATE)
+
+    def global_flow(self, M, flow_shape, image_shape):
+        """
+        Fluxo induzido pela transformação M, amostrado no centro de cada célula
+        do campo de fluxo (funciona tanto para fluxo denso quanto para grade de blocos).
+        """
+        fh, fw = flow_shape[:2]
+        h, w = image_shape[:2]
+        key = (fh, fw, h, w)
+        with self._lock:
+            if key not in self._grid_cache:
+                xs = (np.arange(fw, dtype=np.float32) + 0.5) * (w / fw) - 0.5
+                ys = (np.arange(fh, dtype=np.float32) + 0.5) * (h / fh) - 0.5
+                self._grid_cache[key] = np.meshgrid(xs, ys)
+            x, y = self._grid_cache[key]
+
+        flow = np.empty((fh, fw, 2), dtype=np.float32)
+        flow[..., 0] = (M[0, 0] - 1) * x + M[0, 1] * y + M[0, 2]
+        flow[..., 1] = M[1, 0] * x + (M[1, 1] - 1) * y + M[1, 2]
+        return flow
+
+    def apply(self, calc_flow, prev_gray, gray_frame):
+        """
+        Calcula o fluxo residual usando a função calc_flow(prev, atual) do algoritmo,
+        estabilizando antes ou subtraindo depois, conforme o modo.
+        """
+        M = self.estimate(prev_gray, gray_frame)
+        if self.mode == 'stabilize':
+            return calc_flow(self.stabilize(prev_gray, M), gray_frame)
+
+        flow = calc_flow(prev_gray, gray_frame)
+        return flow - self.global_flow(M, flow.shape, prev_gray.shape)
@@ -1,6 +1,7 @@
 import cv2 as cv
 import numpy as np
-import os
+from FrameSource import FrameSource
+from FlowCache import FlowCache
 
 class HornSchunck:
     """
@@ -12,25 +13,30 @@ class HornSchunck:
     - Visualização: Side-by-Side com Roda de Cores HSV.
     """
 
-    def __init__(self, input_source):
-        self.input_source = input_source
-        self.is_video_file = os.path.isfile(input_source)
-        self.image_paths = []
-        self.current_img_idx = 0
-        self.cap = None
-
-        # --- Configuração da Fonte ---
-        if self.is_video_file:
-            self.cap = cv.VideoCapture(input_source)
-            if not self.cap.isOpened():
-                raise ValueError(f"Erro ao abrir: {input_source}")
-        elif os.path.isdir(input_source):
-            valid_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
-            self.image_paths = sorted([os.path.join(input_source, f) for f in os.listdir(input_source) if f.lower().endswith(valid_exts)])
-            if not self.image_paths:
-                raise ValueError(f"Pasta vazia: {input_source}")
-        else:
-            raise ValueError(f"Entrada inválida.")
+    # Atributos que carregam estado de um frame para o próximo (salvos no Checkpoint).
+    # prev_filters fica de fora: é recalculado a partir de prev_gray quando falta.
+    _state_attrs = ('prev_gray', 'frame_idx')
+
+    def __init__(self, input_source, flow_cache=None, global_motion=None, temporal_filter=None,
+                 consistency=None):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens
+                             (None: sem fonte, só para calcular pares avulsos).
+        :param flow_cache: FlowCache opcional. Se fornecido, o fluxo de cada par é
+                           buscado no cache antes de ser calculado.
+                           Precisa de input_source (a entrada faz parte da chave).
+        :param global_motion: GlobalMotion opcional. Se fornecido, o movimento da câmera
+                              é removido e o fluxo resultante é o residual.
+        :param temporal_filter: TemporalFilter opcional. Suaviza o fluxo ao longo do tempo
+                                (o cache guarda o fluxo bruto, antes do filtro).
+        :param consistency: ConsistencyCheck opcional. Calcula também o fluxo de volta
+                            (uma segunda passada do HS, ver _calc_backward) e marca os
+                            vetores ocluídos/não confiáveis (last_mask), que aparecem em
+                            cinza na visualização e ficam fora das estatísticas.
+        """
+        # --- Configuração da Fonte (pode ser compartilhada com outros algoritmos) ---
+        self.source = FrameSource.open(input_source)
+        self.input_source = self.source.input_source if self.source is not None else None
 
         # --- Parâmetros Horn-Schunck ---
         # Alpha: Regularização de suavidade. 
@@ -38,10 +44,43 @@ class HornSchunck:
         self.alpha = 20.0 
         self.iterations = 40 # Iterações por frame (quanto mais, mais preciso e mais lento)
         self.epsilon = 0.001 # Critério de parada (opcional)
+        # Derivadas espaciais: 'hs' (kernel 2x2 do paper), 'sobel' ou 'scharr'
+        self.derivative = 'hs'
+
+        # Kernels fixos (criados uma vez só)
+        self._kx = np.array([[-1, 1], [-1, 1]], dtype=np.float32) * 0.25
+        self._ky = np.array([[-1, -1], [1, 1]], dtype=np.float32) * 0.25
+        self._kavg = np.ones((2, 2), dtype=np.float32) * 0.25
+        self.scale_factor = 0.75 # Mantemos o downscale para performance
+
+        # --- Parâmetros de Visualização (não afetam o fluxo nem o cache) ---
+        self.sensitivity = 100.0
+        self.threshold = 5.0  # Pixels com movimento menor que isso ficam pretos
+
+        # --- Cache de Fluxo ---
+        self.flow_cache = flow_cache
+        self._input_hash = FlowCache.input_fingerprint(self.input_source) if flow_cache else None
+
+        # --- Compensação do Movimento da Câmera ---
+        self.global_motion = global_motion
+
+        # --- Suavização Temporal ---
+        self.temporal_filter = temporal_filter
+
+        # --- Consistência Ida-e-Volta ---
+        self.consistency = consistency
 
         # Variáveis de estado
         self.prev_gray = None
-        
+        self.prev_filters = None # Respostas de filtro do frame anterior (cache)
+        self.frame_idx = -1 # Índice do frame atual (o segundo de cada par)
+        self.prev_idx = -1 # Índice do primeiro frame do par
+        self.last_flow = None # Último fluxo calculado (na resolução reduzida)
+        self.last_mask = None # Vetores consistentes do último fluxo (se houver consistency)
+        self._cur_filters = None
+        self._cur_transform = None # Matriz do GlobalMotion do par atual (None se veio do cache)
+        self._grid = None # Coordenadas (x, y) dos pixels, para deformar o frame anterior
+
         # Gera a legenda (roda de cores)
         self.legend_img = self._create_color_wheel(size=60)
 
@@ -61,42 +100,75 @@ class HornSchunck:
         cv.circle(wheel_bgr, (size, size), size, (255, 255, 255), 1)
         return wheel_bgr
 
+    def _get_state(self):
+        """Estado entre frames (para Checkpoint), incluindo o histórico do TemporalFilter."""
+        state = {name: getattr(self, name) for name in self._state_attrs}
+        if self.temporal_filter is not None:
+            state['temporal_filter'] = self.temporal_filter._get_state()
+        return state
+
+    def _set_state(self, state):
+        state = dict(state)
+        filter_state = state.pop('temporal_filter', None)
+        if filter_state is not None and self.temporal_filter is not None:
+            self.temporal_filter._set_state(filter_state)
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.prev_filters = None
+
     def _read_next_frame(self):
-        if self.is_video_file:
-            return self.cap.read()
+        return self.source.read()
+
+    def _frame_filters(self, img):
+        """
+        Calcula as respostas de filtro de UM frame (derivadas espaciais e média 2x2).
+        Como Ix, Iy e It são somas/diferenças das respostas de I1 e I2, cada frame
+        só precisa ser filtrado uma vez: o I2 de um par vira o I1 do próximo.
+        """
+        I = np.float32(img)
+
+        if self.derivative == 'hs':
+            # Kernel 2x2 simples usado no paper original (ganho 0.5 por frame)
+            fx = cv.filter2D(I, -1, self._kx)
+            fy = cv.filter2D(I, -1, self._ky)
+        elif self.derivative == 'sobel':
+            # Sobel 3x3 tem ganho 8; escala 1/16 mantém o ganho 0.5 por frame
+            fx = cv.Sobel(I, cv.CV_32F, 1, 0, ksize=3, scale=1/16)
+            fy = cv.Sobel(I, cv.CV_32F, 0, 1, ksize=3, scale=1/16)
+        elif self.derivative == 'scharr':
+            # Scharr tem ganho 32; escala 1/64 mantém o ganho 0.5 por frame
+            fx = cv.Scharr(I, cv.CV_32F, 1, 0, scale=1/64)
+            fy = cv.Scharr(I, cv.CV_32F, 0, 1, scale=1/64)
         else:
-            if self.current_img_idx < len(self.image_paths):
-                frame = cv.imread(self.image_paths[self.current_img_idx])
-                self.current_img_idx += 1
-                return (frame is not None), frame
-            return False, None
+            raise ValueError("Derivada desconhecida. Use: 'hs', 'sobel', 'scharr'")
+
+        # Média 2x2 usada no gradiente temporal (It = média(I1) - média(I2))
+        favg = cv.filter2D(I, -1, self._kavg)
+        return fx, fy, favg
 
-    def _compute_horn_schunck(self, img1, img2):
+    def _compute_horn_schunck(self, img1, img2, filters1=None, filters2=None):
         """
         Implementação matemática manual do algoritmo Horn-Schunck.
+
+        :param filters1, filters2: Respostas de filtro já calculadas (ver _frame_filters).
+                                   Se None, são calculadas aqui.
         """
-        # Converte para float32 para precisão matemática (0 a 255)
-        I1 = np.float32(img1)
-        I2 = np.float32(img2)
+        if filters1 is None:
+            filters1 = self._frame_filters(img1)
+        if filters2 is None:
+            filters2 = self._frame_filters(img2)
 
         # 1. Calcular Derivadas (Gradientes)
         # Ix e Iy (Gradientes espaciais) e It (Gradiente temporal)
-        # Usamos filtro Sobel ou simples diferenças
-        grad_kernel = np.array([[-1, 1], [-1, 1]]) * 0.25 # Kernel 2x2 simples usado no paper original
-        
-        # Pode-se usar Sobel do OpenCV, mas o kernel de média 2x2 é o clássico do HS
-        Ix = cv.filter2D(I1, -1, np.array([[-1, 1], [-1, 1]])*0.25) + \
-             cv.filter2D(I2, -1, np.array([[-1, 1], [-1, 1]])*0.25)
-             
-        Iy = cv.filter2D(I1, -1, np.array([[-1, -1], [1, 1]])*0.25) + \
-             cv.filter2D(I2, -1, np.array([[-1, -1], [1, 1]])*0.25)
-             
-        It = cv.filter2D(I1, -1, np.ones((2,2))*0.25) + \
-             cv.filter2D(I2, -1, np.ones((2,2))*-0.25)
+        fx1, fy1, favg1 = filters1
+        fx2, fy2, favg2 = filters2
+        Ix = fx1 + fx2
+        Iy = fy1 + fy2
+        It = favg1 - favg2
 
         # 2. Inicializar velocidades (u, v) com zeros
-        u = np.zeros_like(I1)
-        v = np.zeros_like(I1)
+        u = np.zeros_like(Ix)
+        v = np.zeros_like(Ix)
 
         # Kernel de média (Laplaciano) para a parte de suavidade
         # O paper original usa máscara: [[0, 1/4, 0], [1/4, 0, 1/4], [0, 1/4, 0]]
@@ -125,50 +197,185 @@ class HornSchunck:
 
         return u, v
 
-    def _process_and_draw(self, frame):
-        orig_h, orig_w = frame.shape[:2]
+    def _cache_params(self):
+        """Parâmetros que influenciam o fluxo (fazem parte da chave do cache)."""
+        return dict(alpha=self.alpha, iterations=self.iterations,
+                    derivative=self.derivative, scale_factor=self.scale_factor)
 
-        # Mantemos o downscale para performance
-        scale_factor = 0.75 
-        small_w = int(orig_w * scale_factor)
-        small_h = int(orig_h * scale_factor)
-        frame_small = cv.resize(frame, (small_w, small_h), interpolation=cv.INTER_AREA)
-        
-        gray_frame = cv.cvtColor(frame_small, cv.COLOR_BGR2GRAY)
+    def _calc_flow(self, prev_gray, gray_frame, prev_filters=None, filters=None):
+        """
+        Fluxo (H, W, 2) do par, já com a direção corrigida e sem o movimento
+        da câmera (se houver GlobalMotion). Sem cache.
+        """
+        # Movimento da câmera: estabilizar antes (o frame anterior deformado
+        # precisa de filtros novos) ou subtrair depois
+        M = None
+        if self.global_motion is not None:
+            M = self.global_motion.estimate(prev_gray, gray_frame)
+            if self.global_motion.mode == 'stabilize':
+                prev_gray = self.global_motion.stabilize(prev_gray, M)
+                prev_filters = None
+        self._cur_transform = M
+
+        u, v = self._compute_horn_schunck(prev_gray, gray_frame, prev_filters, filters)
+
+        # --- CORREÇÃO DE DIREÇÃO ---
+        # O carro vai para a direita, mas estava verde (esquerda). 
+        # Invertemos os vetores aqui.
+        flow = np.dstack((-u, -v))
+        # ---------------------------
+
+        if M is not None and self.global_motion.mode == 'subtract':
+            flow -= self.global_motion.global_flow(M, flow.shape, flow.shape)
+        return flow
+
+    def _compute_flow(self, prev_gray, gray_frame):
+        """
+        Consulta o cache (se houver) antes de calcular o fluxo do par.
+        Os filtros do frame atual ficam em self._cur_filters (None se veio do cache).
+        """
+        self._cur_filters = None
+        self._cur_transform = None
+        key = None
+        if self.flow_cache is not None:
+            key = self._cache_key()
+            flow = self.flow_cache.get(key)
+            if flow is not None:
+                return flow
+
+        # Reaproveita os filtros do frame anterior
+        self._cur_filters = self._frame_filters(gray_frame)
+        flow = self._calc_flow(prev_gray, gray_frame, self.prev_filters, self._cur_filters)
+        if key is not None:
+            self.flow_cache.put(key, flow)
+        return flow
+
+    def _cache_key(self, backward=False):
+        """Chave do par atual no FlowCache (backward=True: a do fluxo de volta)."""
+        params = self._cache_params()
+        params['reduced_decode'] = self.source.reduced_decode
+        if backward:
+            params['backward'] = True
+        if self.frame_idx - self.prev_idx != 1:
+            params['gap'] = self.frame_idx - self.prev_idx # Par com frames pulados (stride)
+        if self.global_motion is not None:
+            params['global_motion'] = self.global_motion.params()
+        return self.flow_cache.make_key(self._input_hash, self.frame_idx,
+                                        type(self).__name__, params)
+
+    def _calc_backward(self, prev_gray, gray_frame, forward):
+        """
+        Fluxo de volta (atual -> anterior) por uma segunda passada do HS, partindo do
+        fluxo de ida negado (como o _calc_reverse do Farneback). Resolver o par trocado
+        do zero não serve: com as derivadas simétricas do HS, o resultado seria
+        exatamente o fluxo de ida negado. Aqui o frame anterior é deformado pelo chute
+        e o HS estima só a correção; onde o chute não explica a imagem (oclusões,
+        vetores errados), a volta se afasta da ida e a verificação acusa.
+        Com GlobalMotion, a volta é calculada sobre o mesmo par que a ida (estabilizado
+        ou com o movimento da câmera devolvido ao chute e removido de novo no fim).
+        """
+        camera = None
+        if self.global_motion is not None:
+            M = self._cur_transform
+            if M is None:
+                M = self.global_motion.estimate(prev_gray, gray_frame)
+            if self.global_motion.mode == 'stabilize':
+                prev_gray = self.global_motion.stabilize(prev_gray, M)
+            else:
+                camera = self.global_motion.global_flow(M, forward.shape, forward.shape)
+                forward = forward + camera
+
+        init = -forward
+        h, w = gray_frame.shape[:2]
+        if self._grid is None or self._grid[0].shape != (h, w):
+            self._grid = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+        xs, ys = self._grid
+        warped = cv.remap(prev_gray, xs + init[..., 0], ys + init[..., 1], cv.INTER_LINEAR,
+                          borderMode=cv.BORDER_REPLICATE)
+        u, v = self._compute_horn_schunck(gray_frame, warped, self._cur_filters)
+        backward = init + np.dstack((-u, -v)) # Mesma correção de direção do _calc_flow
+        if camera is not None:
+            backward += camera # A câmera na volta é ~ a da ida negada
+        return backward
+
+    def _compute_backward(self, prev_gray, gray_frame, forward):
+        """Consulta o cache (se houver) antes de calcular o fluxo de volta do par."""
+        if self.flow_cache is None:
+            return self._calc_backward(prev_gray, gray_frame, forward)
+        key = self._cache_key(backward=True)
+        flow = self.flow_cache.get(key)
+        if flow is None:
+            flow = self._calc_backward(prev_gray, gray_frame, forward)
+            self.flow_cache.put(key, flow)
+        return flow
+
+    def _process_and_draw(self, frame, gray_frame=None, frame_idx=None):
+        """
+        :param frame: Frame colorido original, ou None se nenhuma saída visual precisa
+                      dele (aí só o fluxo é calculado e o retorno é None).
+        :param gray_frame: Frame em cinza já reduzido (scale_factor). Se None, é
+                           calculado aqui a partir do frame colorido.
+        :param frame_idx: Índice absoluto do frame na entrada (com start/stride, não é
+                          só um contador). Se None, é o anterior + 1.
+        """
+        self.prev_idx = self.frame_idx
+        self.frame_idx = self.frame_idx + 1 if frame_idx is None else frame_idx
+
+        if gray_frame is None:
+            orig_h, orig_w = frame.shape[:2]
+            small_w = int(orig_w * self.scale_factor)
+            small_h = int(orig_h * self.scale_factor)
+            frame_small = cv.resize(frame, (small_w, small_h), interpolation=cv.INTER_AREA)
+            
+            gray_frame = cv.cvtColor(frame_small, cv.COLOR_BGR2GRAY)
         
         if self.prev_gray is None:
             self.prev_gray = gray_frame
+            self.last_flow = None
+            if frame is None: return None
             return np.hstack((frame, np.zeros_like(frame)))
 
         # 1. Computar Horn-Schunck
-        u, v = self._compute_horn_schunck(self.prev_gray, gray_frame)
+        flow = self._compute_flow(self.prev_gray, gray_frame)
+        self.last_mask = None
+        if self.consistency is not None:
+            backward = self._compute_backward(self.prev_gray, gray_frame, flow)
+            self.last_mask = self.consistency.mask(flow, backward)
+        if self.temporal_filter is not None:
+            flow = self.temporal_filter.apply(flow)
+        self.last_flow = flow
 
-        # --- CORREÇÃO DE DIREÇÃO ---
-        # O carro vai para a direita, mas estava verde (esquerda). 
-        # Invertemos os vetores aqui.
-        u = -u
-        v = -v
-        # ---------------------------
+        combined = self._draw_flow(frame, flow, self.last_mask) if frame is not None else None
+        
+        self.prev_gray = gray_frame.copy()
+        self.prev_filters = self._cur_filters
+        return combined
+
+    def _draw_flow(self, frame, flow, mask=None):
+        """
+        Visualização HSV (com sensitivity/threshold) lado a lado com o frame original.
+        Com mask (ConsistencyCheck), os vetores não confiáveis ficam em cinza.
+        """
+        orig_h, orig_w = frame.shape[:2]
 
         # 2. Visualização
-        mag, ang = cv.cartToPolar(u, v)
+        mag, ang = cv.cartToPolar(flow[..., 0], flow[..., 1])
         
-        hsv_small = np.zeros_like(frame_small)
+        hsv_small = np.zeros((flow.shape[0], flow.shape[1], 3), dtype=np.uint8)
         hsv_small[..., 1] = 255
         hsv_small[..., 0] = ang * 180 / np.pi / 2
         
         # --- SEUS PARÂMETROS AJUSTADOS ---
         # Mantivemos sua lógica de Alpha alto, mas adicionamos um 'threshold'
         # para apagar o ruído do asfalto/árvores que sobra.
-        sensitivity = 100.0 
-        threshold = 5.0  # Pixels com movimento menor que isso ficam pretos
-        
-        mag_amplified = mag * sensitivity
+        mag_amplified = mag * self.sensitivity
         
         # Limpeza de ruído (Thresholding)
-        mag_amplified[mag_amplified < threshold] = 0
+        mag_amplified[mag_amplified < self.threshold] = 0
         
         hsv_small[..., 2] = np.clip(mag_amplified, 0, 255)
+        if mask is not None:
+            hsv_small[~mask] = (0, 0, 96)
         
         bgr_flow_small = cv.cvtColor(hsv_small, cv.COLOR_HSV2BGR)
 
@@ -188,32 +395,67 @@ class HornSchunck:
             img_fg = cv.bitwise_and(self.legend_img, self.legend_img, mask=mask)
             bgr_flow_large[y_off:y_off+l_h, x_off:x_off+l_w] = cv.add(img_bg, img_fg)
 
-        combined = np.hstack((frame, bgr_flow_large))
-        
-        self.prev_gray = gray_frame.copy()
-        return combined
+        return np.hstack((frame, bgr_flow_large))
     
-    def run(self, save_video=False, output_file='output_hs.mp4', display=True):
+    def run(self, save_video=False, output_file='output_hs.mp4', display=True, checkpoint=None,
+            start=None, end=None, stride=None, analytics=None, summary=None):
+        """
+        Executa o loop principal.
+
+        :param checkpoint: Checkpoint opcional. Salva o estado periodicamente e, se já
+                           existir um checkpoint, continua de onde parou.
+        :param start: Primeiro frame processado (índice absoluto na entrada).
+        :param end: Frame onde o processamento para (exclusivo).
+        :param stride: Passo entre frames (cada par vira (i, i + stride)).
+                       Em start/end/stride, None mantém o intervalo da FrameSource
+                       (por padrão, a entrada inteira).
+        :param analytics: FlowAnalytics opcional. Grava as estatísticas de cada par
+                          (por região) no CSV dele, em vez do campo inteiro.
+        :param summary: MotionSummary opcional. Grava, à parte, só os trechos com muito
+                        movimento (e o índice deles). Não é retomado pelo Checkpoint.
+        """
         print(f"Iniciando Horn-Schunck (Global) em: {self.input_source}")
+        if (start, end, stride) != (None, None, None):
+            self.source.set_range(start, end, stride)
         writer = None
+        # Sem vídeo nem janela, o frame colorido em resolução cheia não é necessário
+        need_color = save_video or display or summary is not None
+        if checkpoint: checkpoint.resume(self)
 
         while True:
-            ret, frame = self._read_next_frame()
+            ret, frame, gray_frame = self.source.read_gray(self.scale_factor, need_color)
             if not ret: break
 
-            final_image = self._process_and_draw(frame)
+            final_image = self._process_and_draw(frame, gray_frame, self.source.last_index)
+
+            if analytics and self.last_flow is not None:
+                analytics.update(self.frame_idx, self.last_flow, self.source.timestamp(self.frame_idx),
+                                 self.last_mask)
+
+            if summary and self.last_flow is not None:
+                summary.update(self.frame_idx, self.last_flow, final_image,
+                               self.source.timestamp(self.frame_idx), self.last_mask)
 
             if display:
                 cv.imshow('Original vs Horn-Schunck', final_image)
                 if cv.waitKey(1) & 0xFF == ord('q'): break
             
-            if save_video:
+            if save_video and checkpoint:
+                checkpoint.write(final_image, output_file)
+            elif save_video:
                 if writer is None:
                     h, w = final_image.shape[:2]
                     fourcc = cv.VideoWriter_fourcc(*'mp4v')
                     writer = cv.VideoWriter(output_file, fourcc, 20.0, (w, h))
                 writer.write(final_image)
 
-        if self.cap: self.cap.release()
+            if checkpoint: checkpoint.step(self)
+
+        self.source.release()
         if writer: writer.release()
-        cv.destroyAllWindows()
\ No newline at end of file
+        if checkpoint: checkpoint.finalize(output_file if save_video else None)
+        if analytics: analytics.close()
+        if summary: summary.close()
+        cv.destroyAllWindows()
+        if self.flow_cache:
+            print(f"Cache de fluxo: {self.flow_cache.hits} hits, {self.flow_cache.misses} misses")
\ No newline at end of file
@@ -1,6 +1,6 @@
 import cv2 as cv
 import numpy as np
-import os
+from FrameSource import FrameSource
 
 class LucasKanade:
     """
@@ -9,36 +9,19 @@ class LucasKanade:
     Permite visualização em tempo real e salvamento do resultado.
     """
 
+    # Atributos que carregam estado de um frame para o próximo (salvos no Checkpoint)
+    _state_attrs = ('prev_gray', 'p0')
+
     def __init__(self, input_source):
         """
         Inicializa o rastreador.
         
-        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens
+                             (None: sem fonte, só para calcular pares avulsos).
         """
-        self.input_source = input_source
-        self.is_video_file = os.path.isfile(input_source)
-        self.image_paths = []
-        self.current_img_idx = 0
-        self.cap = None
-
-        # --- Configuração da Fonte de Entrada ---
-        if self.is_video_file:
-            # Modo Vídeo
-            self.cap = cv.VideoCapture(input_source)
-            if not self.cap.isOpened():
-                raise ValueError(f"Não foi possível abrir o vídeo: {input_source}")
-        elif os.path.isdir(input_source):
-            # Modo Sequência de Imagens
-            valid_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
-            # Lista e ordena os arquivos para garantir a ordem temporal
-            self.image_paths = sorted([
-                os.path.join(input_source, f) for f in os.listdir(input_source)
-                if f.lower().endswith(valid_exts)
-            ])
-            if not self.image_paths:
-                raise ValueError(f"Nenhuma imagem encontrada na pasta: {input_source}")
-        else:
-            raise ValueError(f"Entrada inválida (não é arquivo nem pasta): {input_source}")
+        # --- Configuração da Fonte (pode ser compartilhada com outros algoritmos) ---
+        self.source = FrameSource.open(input_source)
+        self.input_source = self.source.input_source if self.source is not None else None
 
         # --- Parâmetros Lucas-Kanade ---
         self.lk_params = dict(winSize=(15, 15),
@@ -51,23 +34,23 @@ class LucasKanade:
                                    minDistance=7,
                                    blockSize=7)
 
+        self.scale_factor = 1.0 # Rastreamento na resolução original
+
         # --- Variáveis de Estado ---
         self.prev_gray = None
         self.p0 = None
 
+    def _get_state(self):
+        """Estado entre frames (para Checkpoint)."""
+        return {name: getattr(self, name) for name in self._state_attrs}
+
+    def _set_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def _read_next_frame(self):
         """Abstrai a leitura do próximo frame (seja de vídeo ou lista de imagens)."""
-        if self.is_video_file:
-            return self.cap.read()
-        else:
-            if self.current_img_idx < len(self.image_paths):
-                frame = cv.imread(self.image_paths[self.current_img_idx])
-                self.current_img_idx += 1
-                if frame is None:
-                    return False, None
-                return True, frame
-            else:
-                return False, None
+        return self.source.read()
 
     def _detect_features(self, gray_frame):
         """Detecta novos pontos de interesse."""
@@ -75,9 +58,10 @@ class LucasKanade:
         if self.p0 is None:
             self.p0 = np.array([], dtype=np.float32).reshape(0, 1, 2)
 
-    def _process_frame_logic(self, frame):
+    def _process_frame_logic(self, frame, gray_frame=None):
         """Lógica matemática do Fluxo Óptico."""
-        gray_frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        if gray_frame is None:
+            gray_frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
 
         if self.prev_gray is None or self.p0.shape[0] == 0:
             self._detect_features(gray_frame)
@@ -119,34 +103,60 @@ class LucasKanade:
 
         return vis_frame
 
-    def run(self, save_video=False, output_file='output_flow.mp4', display=True):
+    def _process_and_draw(self, frame, gray_frame=None, frame_idx=None):
+        """
+        Calcula e desenha um frame (mesma interface dos algoritmos densos).
+        Com frame=None (sem saída visual), só rastreia e retorna None.
+        O frame_idx é aceito só por compatibilidade (o LK não usa cache).
+        """
+        good_old, good_new = self._process_frame_logic(frame, gray_frame)
+        if frame is None:
+            return None
+        return self._draw_visuals(frame, good_old, good_new)
+
+    def run(self, save_video=False, output_file='output_flow.mp4', display=True, checkpoint=None,
+            start=None, end=None, stride=None):
         """
         Executa o loop principal.
         
         :param save_video: Se True, salva o resultado em um arquivo de vídeo.
         :param output_file: Nome do arquivo de saída (se save_video=True).
         :param display: Se True, mostra a janela com o vídeo processado.
+        :param checkpoint: Checkpoint opcional. Salva o estado periodicamente e, se já
+                           existir um checkpoint, continua de onde parou.
+        :param start: Primeiro frame processado (índice absoluto na entrada).
+        :param end: Frame onde o processamento para (exclusivo).
+        :param stride: Passo entre frames (cada par vira (i, i + stride)).
+                       Em start/end/stride, None mantém o intervalo da FrameSource
+                       (por padrão, a entrada inteira).
         """
         print(f"Iniciando processamento de: {self.input_source}")
+        if (start, end, stride) != (None, None, None):
+            self.source.set_range(start, end, stride)
         if save_video:
             print(f"Gravando saída em: {output_file}")
         
         writer = None
+        # Sem vídeo nem janela, o frame colorido em resolução cheia não é necessário
+        need_color = save_video or display
+        if checkpoint: checkpoint.resume(self)
 
         while True:
-            ret, frame = self._read_next_frame()
+            ret, frame, gray_frame = self.source.read_gray(self.scale_factor, need_color)
             if not ret:
                 print("Fim do processamento.")
                 break
 
             # 1. Calcular
-            good_old, good_new = self._process_frame_logic(frame)
+            good_old, good_new = self._process_frame_logic(frame, gray_frame)
 
             # 2. Desenhar
-            final_image = self._draw_visuals(frame, good_old, good_new)
+            final_image = self._draw_visuals(frame, good_old, good_new) if need_color else None
 
             # 3. Gravar (Opcional)
-            if save_video:
+            if save_video and checkpoint:
+                checkpoint.write(final_image, output_file)
+            elif save_video:
                 if writer is None:
                     # Inicializa o VideoWriter no primeiro frame para pegar as dimensões corretas
                     h, w = final_image.shape[:2]
@@ -163,7 +173,10 @@ class LucasKanade:
                     print("Interrompido pelo usuário.")
                     break
 
+            if checkpoint: checkpoint.step(self)
+
         # Limpeza
-        if self.cap: self.cap.release()
+        self.source.release()
         if writer: writer.release()
+        if checkpoint: checkpoint.finalize(output_file if save_video else None)
         cv.destroyAllWindows()
\ No newline at end of file
@@ -0,0 +1,124 @@
+import os
+import re
+import resource
+import sys
+
+_UNITS = {'': 1, 'B': 1, 'K': 1 << 10, 'KB': 1 << 10, 'M': 1 << 20, 'MB': 1 << 20,
+          'G': 1 << 30, 'GB': 1 << 30, 'T': 1 << 40, 'TB': 1 << 40}
+
+def parse_size(size):
+    """Converte '2GB', '512MB', '1.5G' (ou um número de bytes) em bytes."""
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B?)\s*', str(size).upper())
+    if not match:
+        raise ValueError(f"Tamanho de memória inválido: {size}. Ex: '2GB', '512MB'")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+def format_size(nbytes):
+    return f"{nbytes / (1 << 20):.0f} MB" if nbytes < 1 << 30 else f"{nbytes / (1 << 30):.2f} GB"
+
+def current_rss():
+    """RSS atual deste processo (bytes)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss() # Sem /proc: o pico é a melhor aproximação disponível
+
+def peak_rss(children=False):
+    """
+    Pico de RSS (bytes) deste processo ou, com children=True, do maior processo
+    filho já encerrado (ru_maxrss vem em KB no Linux e em bytes no macOS).
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+class MemoryBudget:
+    """
+    Orçamento de memória (RSS) de um job, para vários jobs dividirem um nó sem
+    que o sistema mate algum por falta de memória.
+
+    Cada componente pede ao orçamento quantas unidades cabem (workers, slots do
+    anel, pares por lote, frames em voo) a partir do custo de cada uma, calculado
+    pelo tamanho do frame. Se nem o mínimo cabe, o componente segue com o mínimo
+    (e um aviso) em vez de falhar; quem pode, diminui os tiles antes disso
+    (ver DPFlow). report() compara a previsão com o pico de RSS observado.
+    """
+
+    # Páginas próprias de um processo filho (fork): interpretador, OpenCV, NumPy
+    PROCESS_OVERHEAD = 64 << 20
+
+    def __init__(self, max_memory='2GB', headroom=0.15):
+        """
+        :param max_memory: Limite do job: '2GB', '512MB' ou um número de bytes.
+        :param headroom: Fração do limite deixada de folga (fragmentação, buffers
+                         do decodificador e do codificador de vídeo).
+        """
+        self.max_bytes = parse_size(max_memory)
+        if not 0.0 <= headroom < 1.0:
+            raise ValueError("headroom deve estar em [0, 1)")
+        self.headroom = headroom
+        self.baseline = current_rss() # O que já está carregado (intérprete, bibliotecas)
+        self.projected = {} # componente -> bytes previstos
+        self.processes = 1 # Processos cujos picos somam no total (ver report)
+
+    def available(self, exclude=None):
+        """Bytes ainda livres no orçamento (descontando a folga e os outros componentes)."""
+        used = sum(v for k, v in self.projected.items() if k != exclude)
+        return int(self.max_bytes * (1.0 - self.headroom)) - self.baseline - used
+
+    def fits(self, nbytes, exclude=None):
+        return nbytes <= self.available(exclude)
+
+    def fit(self, name, per_unit, fixed=0, wanted=1, minimum=1):
+        """
+        Quantas unidades de per_unit bytes (além de fixed) cabem, entre minimum e
+        wanted. Registra a previsão do componente name (substitui a anterior).
+        """
+        room = self.available(exclude=name) - fixed
+        n = int(room // per_unit) if per_unit > 0 else wanted
+        n = max(minimum, min(wanted, n))
+        if n * per_unit > room:
+            print(f"Aviso: {name} não cabe em {format_size(self.max_bytes)} nem com o mínimo "
+                  f"({minimum}); seguindo com o mínimo")
+        self.projected[name] = fixed + n * per_unit
+        return n
+
+    @staticmethod
+    def measure(fn, *args, **kwargs):
+        """
+        Executa fn e retorna (resultado, pico de memória alocada pelo NumPy/Python
+        durante a chamada, em bytes). Buffers internos do OpenCV não entram na conta.
+        """
+        import tracemalloc # Só quem mede paga a importação
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            result = fn(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        return result, max(0, peak)
+
+    def projected_total(self):
+        return self.baseline + sum(self.projected.values())
+
+    def report(self):
+        """Imprime a previsão por componente e o pico de RSS observado."""
+        parts = ', '.join(f"{name} {format_size(v)}" for name, v in self.projected.items())
+        print(f"Memória prevista: {format_size(self.projected_total())} de "
+              f"{format_size(self.max_bytes)} (base {format_size(self.baseline)}"
+              f"{', ' + parts if parts else ''})")
+        observed = peak_rss()
+        line = f"Pico de RSS observado: {format_size(observed)}"
+        if self.processes > 1:
+            child = peak_rss(children=True)
+            # Páginas herdadas no fork contam em todos os processos: é um teto, não a soma exata
+            line += (f" + {self.processes - 1} filhos de até {format_size(child)} "
+                     f"(total <= {format_size(observed + (self.processes - 1) * child)})")
+        print(line)
@@ -0,0 +1,142 @@
+import json
+import os
+from collections import deque
+
+import cv2 as cv
+import numpy as np
+
+class MotionSummary:
+    """
+    Resumo da saída visual: só os trechos com bastante movimento vão para o vídeo.
+
+    Cada par recebe uma nota barata: a fração dos vetores (amostrados numa grade
+    de step em step pixels, só os consistentes se houver máscara) com módulo acima
+    de motion_px. O limiar é adaptativo: mediana + k * desvio (MAD) das notas da
+    janela recente, nunca abaixo de min_score, para acompanhar o "ruído de fundo"
+    de cada cena. Um trecho começa quando a nota passa do limiar e termina quando
+    fica padding frames abaixo dele; os padding frames anteriores ao início (num
+    buffer) também entram, para dar contexto.
+
+    Só os frames dos trechos são codificados. O índice (.json) lista cada trecho com
+    os frames e instantes na entrada e a posição dele no vídeo resumido.
+    """
+
+    def __init__(self, output_file, index_file=None, motion_px=1.0, k=3.0, min_score=0.002,
+                 window=300, padding=10, step=4, fps=20.0):
+        """
+        :param output_file: Vídeo resumido (.mp4).
+        :param index_file: Índice dos trechos (.json). Padrão: output_file com extensão .json.
+        :param motion_px: Módulo (px, na resolução do fluxo) a partir do qual um vetor conta
+                          como movimento.
+        :param k: Quantos desvios (MAD) acima da mediana recente a nota precisa estar.
+        :param min_score: Nota mínima para um trecho (cenas paradas têm desvio ~0).
+        :param window: Frames de histórico usados no limiar adaptativo.
+        :param padding: Frames de contexto antes e depois de cada trecho.
+        :param step: Passo da grade de amostragem do fluxo (1 = todos os vetores).
+        :param fps: FPS do vídeo resumido.
+        """
+        self.output_file = output_file
+        self.index_file = index_file or os.path.splitext(output_file)[0] + '.json'
+        self.motion_px = motion_px
+        self.k = k
+        self.min_score = min_score
+        self.padding = padding
+        self.step = step
+        self.fps = fps
+
+        self._history = deque(maxlen=window)
+        self._preroll = deque(maxlen=padding) # (frame, instante, imagem) antes de um trecho
+        self._writer = None
+        self._segment = None # Trecho aberto
+        self._below = 0 # Frames seguidos abaixo do limiar no trecho aberto
+        self.segments = []
+        self.frames_seen = 0
+        self.frames_written = 0
+
+    def score(self, flow, valid=None):
+        """Fração dos vetores amostrados com módulo acima de motion_px."""
+        fx = flow[::self.step, ::self.step, 0]
+        fy = flow[::self.step, ::self.step, 1]
+        moving = fx * fx + fy * fy > self.motion_px * self.motion_px
+        if valid is not None:
+            sampled = valid[::self.step, ::self.step]
+            total = np.count_nonzero(sampled)
+            return np.count_nonzero(moving & sampled) / total if total else 0.0
+        return np.count_nonzero(moving) / moving.size
+
+    def threshold(self):
+        """Limiar atual: mediana + k * MAD (escalado para desvio padrão) da janela recente."""
+        if not self._history:
+            return self.min_score
+        history = np.fromiter(self._history, np.float64, len(self._history))
+        median = np.median(history)
+        mad = np.median(np.abs(history - median)) * 1.4826
+        return max(self.min_score, median + self.k * mad)
+
+    def update(self, frame_idx, flow, image, timestamp=None, valid=None):
+        """
+        :param frame_idx: Índice do frame (o segundo do par).
+        :param flow: Fluxo do par (qualquer resolução).
+        :param image: Saída visual do frame (ex: o lado a lado do run), gravada se o
+                      frame cair num trecho.
+        :param timestamp: Instante do frame na entrada (s), se conhecido.
+        :param valid: Máscara opcional dos vetores confiáveis (ConsistencyCheck).
+        """
+        self.frames_seen += 1
+        score = self.score(flow, valid)
+        active = score > self.threshold()
+        self._history.append(score)
+
+        if self._segment is None:
+            if not active:
+                self._preroll.append((frame_idx, timestamp, image))
+                return
+            self._open(frame_idx, timestamp)
+        if active:
+            self._below = 0
+        else:
+            self._below += 1
+            if self._below > self.padding:
+                self._close_segment()
+                self._preroll.append((frame_idx, timestamp, image))
+                return
+        self._segment['peak_score'] = max(self._segment['peak_score'], round(score, 5))
+        self._write(frame_idx, timestamp, image)
+
+    def _open(self, frame_idx, timestamp):
+        first_idx, first_ts = (self._preroll[0][:2] if self._preroll else (frame_idx, timestamp))
+        self._segment = dict(start_frame=first_idx, end_frame=first_idx, start_s=first_ts, end_s=first_ts,
+                             summary_start_s=round(self.frames_written / self.fps, 3), peak_score=0.0)
+        self._below = 0
+        while self._preroll:
+            self._write(*self._preroll.popleft())
+
+    def _write(self, frame_idx, timestamp, image):
+        if self._writer is None:
+            h, w = image.shape[:2]
+            fourcc = cv.VideoWriter_fourcc(*'mp4v')
+            self._writer = cv.VideoWriter(self.output_file, fourcc, self.fps, (w, h))
+        self._writer.write(image)
+        self.frames_written += 1
+        self._segment['end_frame'] = frame_idx
+        self._segment['end_s'] = timestamp
+
+    def _close_segment(self):
+        self.segments.append(self._segment)
+        self._segment = None
+
+    def close(self):
+        """Fecha o trecho aberto, o vídeo e grava o índice."""
+        if self._segment is not None:
+            self._close_segment()
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        self._preroll.clear()
+        index = dict(output_file=self.output_file, fps=self.fps, frames_seen=self.frames_seen,
+                     frames_written=self.frames_written, segments=self.segments)
+        with open(self.index_file, 'w') as f:
+            json.dump(index, f, indent=1)
+        kept = self.frames_written / max(self.frames_seen, 1)
+        print(f"Resumo: {len(self.segments)} trechos, {self.frames_written} de {self.frames_seen} "
+              f"frames ({kept:.0%}) em {self.output_file}")
@@ -0,0 +1,115 @@
+import cv2 as cv
+import numpy as np
+import os
+from FrameSource import FrameSource
+
+class MultiEngine:
+    """
+    Roda vários algoritmos de fluxo óptico sobre UMA única leitura da entrada.
+
+    Cada frame é decodificado uma vez, convertido para cinza uma vez e reduzido
+    uma vez por escala usada (pirâmide compartilhada, ver FrameSource.read_pyramid).
+    Os algoritmos recebem o mesmo frame em paralelo (pool de threads: o OpenCV e
+    boa parte do NumPy liberam o GIL), e cada um mantém seu próprio estado entre frames.
+    FlowCache e GlobalMotion podem ser compartilhados entre eles (são seguros entre
+    threads); um TemporalFilter guarda os fluxos de um algoritmo só e não pode.
+
+    Saída: um vídeo em grade (um algoritmo por linha) ou um vídeo por algoritmo.
+    """
+
+    def __init__(self, input_source, engines, workers=None):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param engines: Dicionário nome -> função que recebe a FrameSource compartilhada
+                        e cria o algoritmo. Ex: {'farneback': lambda src: Farneback(src)}
+        :param workers: Número de threads (padrão: um por algoritmo).
+        """
+        self.source = FrameSource.open(input_source)
+        self.input_source = self.source.input_source
+        self.engines = {name: create(self.source) for name, create in engines.items()}
+        owners = {}
+        for name, engine in self.engines.items():
+            temporal_filter = getattr(engine, 'temporal_filter', None)
+            if temporal_filter is not None:
+                if id(temporal_filter) in owners:
+                    raise ValueError(f"{owners[id(temporal_filter)]} e {name} usam o mesmo TemporalFilter; "
+                                     "crie um por algoritmo")
+                owners[id(temporal_filter)] = name
+        self.workers = workers or len(self.engines)
+
+    def _compose_grid(self, outputs):
+        """Empilha as saídas (uma por linha) na largura da primeira, com o nome de cada uma."""
+        target_w = next(iter(outputs.values())).shape[1]
+        rows = []
+        for name, img in outputs.items():
+            h, w = img.shape[:2]
+            if w != target_w:
+                img = cv.resize(img, (target_w, int(h * target_w / w)), interpolation=cv.INTER_AREA)
+            else:
+                img = img.copy()
+            cv.putText(img, name, (10, 30), cv.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2, cv.LINE_AA)
+            rows.append(img)
+        return np.vstack(rows)
+
+    def run(self, save_video=False, output_file='output_multi.mp4', display=True, layout='grid',
+            start=None, end=None, stride=None):
+        """
+        Executa o loop principal.
+
+        :param save_video: Se True, salva o resultado em vídeo.
+        :param output_file: Arquivo de saída. No layout 'separate', vira
+                            '<nome>_<algoritmo>.mp4' para cada algoritmo.
+        :param display: Se True, mostra a grade em uma janela.
+        :param layout: 'grid' (um vídeo só) ou 'separate' (um vídeo por algoritmo).
+        :param start: Primeiro frame processado (índice absoluto na entrada).
+        :param end: Frame onde o processamento para (exclusivo).
+        :param stride: Passo entre frames (cada par vira (i, i + stride)).
+                       Em start/end/stride, None mantém o intervalo da FrameSource
+                       (por padrão, a entrada inteira).
+        """
+        if layout not in ('grid', 'separate'):
+            raise ValueError("Layout desconhecido. Use: 'grid', 'separate'")
+
+        print(f"Iniciando {', '.join(self.engines)} em: {self.input_source}")
+        if (start, end, stride) != (None, None, None):
+            self.source.set_range(start, end, stride)
+        writers = {}
+        scales = {name: getattr(engine, 'scale_factor', 1.0) for name, engine in self.engines.items()}
+        need_color = save_video or display
+        stem, ext = os.path.splitext(output_file)
+
+        from concurrent.futures import ThreadPoolExecutor # Só quem roda paga a importação
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                # Uma decodificação, um cinza e uma redução por escala distinta
+                ret, frame, pyramid = self.source.read_pyramid(scales.values(), need_color)
+                if not ret: break
+
+                futures = {
+                    name: pool.submit(engine._process_and_draw, frame, pyramid[scales[name]],
+                                      self.source.last_index)
+                    for name, engine in self.engines.items()
+                }
+                outputs = {name: f.result() for name, f in futures.items()}
+
+                if layout == 'grid' and (save_video or display):
+                    outputs = {'grid': self._compose_grid(outputs)}
+
+                if display:
+                    for name, img in outputs.items():
+                        cv.imshow(f'Comparação: {name}', img)
+                    if cv.waitKey(1) & 0xFF == ord('q'): break
+
+                if save_video:
+                    for name, img in outputs.items():
+                        if name not in writers:
+                            h, w = img.shape[:2]
+                            path = output_file if layout == 'grid' else f"{stem}_{name}{ext}"
+                            fourcc = cv.VideoWriter_fourcc(*'mp4v')
+                            writers[name] = cv.VideoWriter(path, fourcc, 20.0, (w, h))
+                        writers[name].write(img)
+
+        self.source.release()
+        for writer in writers.values():
+            writer.release()
+        cv.destroyAllWindows()
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import Counter
+
+import cv2 as cv
+
+class Profiler:
+    """
+    Perfil do caminho crítico de um algoritmo (ex: por que o
+    HornSchunck._compute_horn_schunck está lento numa máquina específica).
+
+    Modos:
+    - 'sample': uma thread amostra a pilha Python da thread principal a cada
+      interval segundos, só enquanto os frames start_frame..start_frame+frames
+      estão sendo lidos (janela limitada, custo desprezível fora dela). Salva as
+      pilhas no formato "collapsed" (uma linha "f1;f2;...;fn contagem", entrada
+      direta do flamegraph.pl / speedscope).
+    - 'cprofile': a execução inteira dentro do cProfile. Salva o .prof (pstats,
+      snakeviz) e um resumo em texto das funções mais caras.
+
+    Os arquivos levam no nome o algoritmo, a resolução e um hash dos parâmetros;
+    o .json ao lado guarda os parâmetros completos e a máquina.
+    """
+
+    MODES = ('sample', 'cprofile')
+
+    def __init__(self, mode='sample', output_dir='profiles', interval=0.005, start_frame=0, frames=200):
+        """
+        :param mode: 'sample' ou 'cprofile'.
+        :param output_dir: Pasta dos perfis.
+        :param interval: Intervalo (s) entre amostras (modo 'sample').
+        :param start_frame: Frames lidos antes de começar a amostrar (aquecimento).
+        :param frames: Frames na janela amostrada (modo 'sample').
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Modo desconhecido: {mode}. Use: {', '.join(self.MODES)}")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.interval = interval
+        self.start_frame = start_frame
+        self.frames = frames
+        self.stacks = Counter() # Pilha "f1;f2;...;fn" -> amostras
+        self.samples = 0
+
+    @staticmethod
+    def _frames_read(source):
+        return max(0, (source.position - source.start) // source.stride)
+
+    @staticmethod
+    def _collapse(frame):
+        """Pilha da raiz até o frame, no formato collapsed ("arquivo:função" separados por ';')."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _sample(self, source, thread_id, stop):
+        """Thread de amostragem: só coleta dentro da janela de frames."""
+        window_end = self.start_frame + self.frames
+        while not stop.wait(self.interval):
+            n = self._frames_read(source)
+            if n < self.start_frame:
+                continue
+            if n > window_end:
+                return
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+                self.samples += 1
+
+    def _label(self, engine):
+        """Nome dos arquivos e metadados: algoritmo, parâmetros e resolução."""
+        params = engine._cache_params() if hasattr(engine, '_cache_params') else {}
+        frame_size = getattr(engine.source, 'frame_size', None)
+        scale = getattr(engine, 'scale_factor', 1.0)
+        resolution = f"{frame_size[0]}x{frame_size[1]}" if frame_size else 'na'
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:8]
+        name = f"{type(engine).__name__}_{resolution}_{digest}_{time.strftime('%Y%m%d-%H%M%S')}"
+        meta = dict(engine=type(engine).__name__, params=params, frame_size=frame_size,
+                    scale_factor=scale, mode=self.mode, input=str(engine.input_source),
+                    python=platform.python_version(), opencv=cv.__version__,
+                    machine=platform.machine(), processor=platform.processor(),
+                    cpu_count=os.cpu_count(), threads_opencv=cv.getNumThreads())
+        return name, meta
+
+    def run(self, engine, **run_kwargs):
+        """
+        Executa engine.run(**run_kwargs) sob o perfil e salva os arquivos.
+
+        :return: Caminhos dos arquivos gravados.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.stacks.clear()
+        self.samples = 0
+        t0 = time.perf_counter()
+        if self.mode == 'cprofile':
+            import cProfile
+            profile = cProfile.Profile()
+            profile.runcall(engine.run, **run_kwargs)
+        else:
+            stop = threading.Event()
+            sampler = threading.Thread(target=self._sample, name='profiler',
+                                       args=(engine.source, threading.get_ident(), stop), daemon=True)
+            sampler.start()
+            try:
+                engine.run(**run_kwargs)
+            finally:
+                stop.set()
+                sampler.join()
+        elapsed = time.perf_counter() - t0
+
+        name, meta = self._label(engine)
+        base = os.path.join(self.output_dir, name)
+        meta['elapsed_s'] = round(elapsed, 3)
+        if self.mode == 'cprofile':
+            paths = self._save_cprofile(profile, base)
+        else:
+            meta.update(interval=self.interval, start_frame=self.start_frame, frames=self.frames,
+                        samples=self.samples)
+            paths = self._save_samples(base)
+        with open(base + '.json', 'w') as f:
+            json.dump(meta, f, indent=1, default=str)
+        paths.append(base + '.json')
+        print(f"Perfil ({self.mode}) salvo em: {', '.join(paths)}")
+        return paths
+
+    def _save_cprofile(self, profile, base, top=25):
+        import io
+        import pstats
+        profile.dump_stats(base + '.prof')
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(top)
+        with open(base + '.txt', 'w') as f:
+            f.write(text.getvalue())
+        return [base + '.prof', base + '.txt']
+
+    def _save_samples(self, base, top=15):
+        with open(base + '.collapsed.txt', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        # Tempo próprio (a função no topo da pilha) e acumulado (em qualquer ponto da pilha)
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            names = stack.split(';')
+            own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+        n = max(self.samples, 1)
+        lines = [f"{self.samples} amostras a cada {self.interval * 1000:g} ms", "", "Tempo próprio:"]
+        lines += [f"{c / n:7.1%}  {name}" for name, c in own.most_common(top)]
+        lines += ["", "Acumulado:"]
+        lines += [f"{c / n:7.1%}  {name}" for name, c in total.most_common(top)]
+        with open(base + '.txt', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return [base + '.collapsed.txt', base + '.txt']
@@ -0,0 +1,249 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from FrameSource import FrameSource
+from MemoryBudget import MemoryBudget, format_size
+
+def _attach(ring):
+    """
+    Abre um anel criado pelo processo principal a partir de (nome, formato, dtype).
+    Vale para fork e spawn: com spawn, um ndarray sobre a memória compartilhada seria
+    serializado como cópia, e o que o processo escreve nunca chegaria ao coletor.
+    """
+    name, shape, dtype = ring
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype, buffer=shm.buf)
+
+def _decoder(input_source, start, end, stride, scale, frames_ring, n_slots, free_slots, tasks, results,
+             n_workers):
+    """
+    Processo decodificador: lê cada frame uma vez, já em cinza e reduzido, direto
+    para o anel de memória compartilhada, e publica o par (i-1, i) como tarefa.
+    """
+    shm, frames = _attach(frames_ring)
+    source = FrameSource(input_source, start=start, end=end, stride=stride)
+    count = 0
+    prev_idx = None
+    while True:
+        free_slots.acquire() # Espera um slot livre (o coletor libera)
+        ret, _, gray = source.read_gray(scale, need_color=False)
+        if not ret:
+            free_slots.release()
+            break
+        slot = count % n_slots
+        frames[slot] = gray
+        if count > 0:
+            # Tarefa: só índices (nada de frame serializado)
+            tasks.put((count, prev_idx, source.last_index, (count - 1) % n_slots, slot))
+        prev_idx = source.last_index
+        count += 1
+    source.release()
+    del frames
+    shm.close()
+    for _ in range(n_workers):
+        tasks.put(None)
+    results.put(('end', count))
+
+def _bound_engine(engine_cls, engine_kwargs, input_source):
+    """
+    Algoritmo ligado à entrada (input_source e reduced_decode entram na chave do
+    FlowCache, como numa execução sequencial), mas sem ler dela: os frames vêm do anel.
+    """
+    source = FrameSource(input_source)
+    source.release()
+    return engine_cls(source, **engine_kwargs)
+
+def _worker(engine_cls, engine_kwargs, input_source, frames_ring, flows_ring, tasks, results):
+    """
+    Processo de cálculo: lê os dois frames do par direto da memória compartilhada
+    e escreve o fluxo no slot do segundo frame (que só é reusado depois da coleta).
+    """
+    shm_frames, frames = _attach(frames_ring)
+    shm_flows, flows = _attach(flows_ring)
+    engine = _bound_engine(engine_cls, engine_kwargs, input_source)
+    initial_state = engine._get_state()
+    last_seq = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, prev_idx, frame_idx, prev_slot, slot = task
+        if last_seq != seq - 1:
+            # Par não consecutivo ao anterior deste processo: recomeça do primeiro frame,
+            # com o índice real dele (o intervalo do par entra na chave do cache)
+            engine._set_state(initial_state)
+            engine._process_and_draw(None, frames[prev_slot], prev_idx)
+        engine._process_and_draw(None, frames[slot], frame_idx)
+        flows[slot] = engine.last_flow
+        last_seq = seq
+        results.put((seq, frame_idx, slot))
+    del frames, flows
+    shm_frames.close()
+    shm_flows.close()
+
+class SharedPipeline:
+    """
+    Fluxo óptico em vários processos sobre UMA única decodificação da entrada.
+
+    - Um processo decodifica os frames (em cinza, na escala do algoritmo) para um
+      anel de slots em multiprocessing.shared_memory.
+    - N processos calculam o fluxo do par (i-1, i) lendo direto desse anel (sem
+      serializar frames) e escrevem o resultado num segundo anel, no slot do frame i.
+    - O coletor (processo principal) devolve os fluxos na ordem dos frames e libera
+      o slot do frame i-1 assim que o par (i-1, i) é consumido.
+
+    Ao contrário de threads (MultiEngine), processos escalam o laço NumPy do
+    Horn-Schunck com o número de núcleos.
+    """
+
+    def __init__(self, input_source, engine_cls, engine_kwargs=None, workers=None, slots=None,
+                 start=0, end=None, stride=1, max_memory=None):
+        """
+        :param input_source: Caminho para um arquivo de vídeo OU uma pasta contendo imagens.
+        :param engine_cls: Classe do algoritmo denso (ex: HornSchunck). Cada processo
+                           cria a sua instância com engine_cls(fonte, **engine_kwargs), com
+                           uma FrameSource da entrada que ele não lê (ver _bound_engine).
+        :param engine_kwargs: Parâmetros do algoritmo (precisam ser serializáveis).
+        :param workers: Processos de cálculo (padrão: núcleos - 1, no mínimo 1).
+        :param slots: Tamanho do anel (padrão: 2 * workers + 2).
+        :param start: Primeiro frame (índice absoluto). Ver FrameSource.
+        :param end: Frame final (exclusivo).
+        :param stride: Passo entre frames.
+        :param max_memory: Limite de memória do job ('2GB' ou um MemoryBudget). Os workers
+                           e os slots do anel são reduzidos até caber (no mínimo 1 worker),
+                           a partir do tamanho do frame e da memória medida do algoritmo.
+        """
+        self.input_source = input_source
+        self.engine_cls = engine_cls
+        self.engine_kwargs = engine_kwargs or {}
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.slots = slots or 2 * self.workers + 2
+        self._fixed_slots = slots is not None
+        self.memory = None
+        if max_memory is not None:
+            self.memory = max_memory if isinstance(max_memory, MemoryBudget) else MemoryBudget(max_memory)
+        self.start, self.end, self.stride = start, end, stride
+        # fork quando existe (processos sobem mais rápido); os anéis são abertos pelo nome
+        # nos processos filhos, então spawn também funciona
+        self._ctx = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+
+    def _probe(self):
+        """
+        Descobre a escala, o formato do frame reduzido, o formato do fluxo e a memória
+        de trabalho (bytes) de um par no algoritmo.
+        """
+        # Sem cache: o par de teste (o mesmo frame duas vezes) não pode ser gravado nele
+        kwargs = dict(self.engine_kwargs)
+        if 'flow_cache' in kwargs:
+            kwargs['flow_cache'] = None
+        engine = self.engine_cls(None, **kwargs)
+        source = FrameSource(self.input_source, start=self.start, end=self.end, stride=self.stride)
+        ret, _, gray = source.read_gray(engine.scale_factor, need_color=False)
+        source.release()
+        if not ret:
+            raise ValueError(f"Nenhum frame para processar em: {self.input_source}")
+        engine._process_and_draw(None, gray)
+        _, working = MemoryBudget.measure(engine._process_and_draw, None, gray)
+        return engine.scale_factor, gray.shape, engine.last_flow.shape, working
+
+    def _fit_memory(self, frame_bytes, flow_bytes, working):
+        """
+        Ajusta workers e slots ao orçamento: cada worker custa um processo, a memória
+        de trabalho do algoritmo (medida no _probe, ao menos 8 fluxos) e 2 slots do anel;
+        o decodificador custa um processo e os 2 slots restantes.
+        """
+        slot_bytes = frame_bytes + flow_bytes
+        per_worker = MemoryBudget.PROCESS_OVERHEAD + max(working, 8 * flow_bytes) + 2 * slot_bytes
+        fixed = MemoryBudget.PROCESS_OVERHEAD + 2 * slot_bytes
+        self.workers = self.memory.fit('pipeline', per_worker, fixed, wanted=self.workers)
+        if not self._fixed_slots or self.slots > 2 * self.workers + 2:
+            self.slots = 2 * self.workers + 2
+        self.memory.processes = self.workers + 2
+        print(f"Memória: {self.workers} workers, {self.slots} slots "
+              f"({format_size(per_worker)} por worker)")
+
+    def flows(self):
+        """Gerador: (índice do frame, fluxo do par que termina nele), em ordem."""
+        scale, frame_shape, flow_shape, working = self._probe()
+        frame_bytes = int(np.prod(frame_shape))
+        flow_bytes = int(np.prod(flow_shape)) * 4
+        if self.memory:
+            self._fit_memory(frame_bytes, flow_bytes, working)
+        shm_frames = shared_memory.SharedMemory(create=True, size=self.slots * frame_bytes)
+        shm_flows = shared_memory.SharedMemory(create=True, size=self.slots * flow_bytes)
+        frames_ring = (shm_frames.name, (self.slots,) + frame_shape, np.uint8)
+        flows_ring = (shm_flows.name, (self.slots,) + flow_shape, np.float32)
+        flows = np.ndarray(flows_ring[1], flows_ring[2], buffer=shm_flows.buf)
+
+        free_slots = self._ctx.Semaphore(self.slots)
+        tasks = self._ctx.Queue()
+        results = self._ctx.Queue()
+        processes = [self._ctx.Process(
+            target=_decoder,
+            args=(self.input_source, self.start, self.end, self.stride, scale, frames_ring,
+                  self.slots, free_slots, tasks, results, self.workers), daemon=True)]
+        processes += [self._ctx.Process(
+            target=_worker,
+            args=(self.engine_cls, self.engine_kwargs, self.input_source, frames_ring, flows_ring,
+                  tasks, results), daemon=True)
+            for _ in range(self.workers)]
+
+        try:
+            for p in processes:
+                p.start()
+
+            # --- Coletor ordenado ---
+            pending = {}
+            next_seq = 1
+            total = None
+            while total is None or next_seq < total:
+                try:
+                    msg = results.get(timeout=1.0)
+                except queue.Empty:
+                    if any(p.exitcode not in (None, 0) for p in processes):
+                        raise RuntimeError("Um processo do pipeline terminou com erro")
+                    continue
+                if msg[0] == 'end':
+                    total = msg[1]
+                    continue
+                seq, frame_idx, slot = msg
+                pending[seq] = (frame_idx, slot)
+                while next_seq in pending:
+                    frame_idx, slot = pending.pop(next_seq)
+                    yield frame_idx, flows[slot].copy()
+                    free_slots.release() # O frame seq-1 não é mais necessário
+                    next_seq += 1
+        finally:
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+            del flows
+            for shm in (shm_frames, shm_flows):
+                shm.close()
+                shm.unlink()
+
+    def run(self, flow_dir=None):
+        """
+        Processa a entrada inteira.
+
+        :param flow_dir: Se fornecido, salva o fluxo bruto de cada par como .npy nessa pasta
+                         (mesmo formato do Farneback.run).
+        """
+        print(f"Iniciando {self.engine_cls.__name__} em {self.workers} processos: {self.input_source}")
+        if flow_dir:
+            os.makedirs(flow_dir, exist_ok=True)
+        t0 = time.perf_counter()
+        n = 0
+        for frame_idx, flow in self.flows():
+            if flow_dir:
+                np.save(os.path.join(flow_dir, f"{frame_idx:06d}.npy"), flow)
+            n += 1
+        elapsed = time.perf_counter() - t0
+        print(f"{n} pares em {elapsed:.1f}s ({n / max(elapsed, 1e-9):.1f} pares/s)")
+        if self.memory:
+            self.memory.report()
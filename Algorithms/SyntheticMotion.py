@@ -0,0 +1,139 @@
+import os
+
+import cv2 as cv
+import numpy as np
+
+class SyntheticMotion:
+    """
+    Gerador de sequências sintéticas com fluxo óptico conhecido (ground truth).
+
+    - Fundo texturizado visto por uma câmera que translada, gira e aproxima/afasta
+      (a mesma transformação a cada frame, em torno do centro da imagem).
+    - Objetos texturizados (elipses) que se movem por conta própria sobre o fundo,
+      com oclusão: na sobreposição vale o objeto de cima.
+
+    O fluxo de cada par (t, t+1) é o deslocamento de cada pixel do frame t até o
+    frame t+1 (mesma convenção dos algoritmos: frame_t(p) ≈ frame_t+1(p + fluxo)).
+    Tudo é calculado em bloco (warpAffine / operações de array), sem laços por pixel,
+    e é determinístico para uma mesma seed.
+    """
+
+    def __init__(self, width=640, height=480, n_frames=30, translation=(2.0, 1.0), rotation=0.0,
+                 zoom=0.0, n_objects=3, object_speed=3.0, seed=0):
+        """
+        :param width: Largura dos frames.
+        :param height: Altura dos frames.
+        :param n_frames: Número de frames (n_frames - 1 campos de fluxo).
+        :param translation: Translação da câmera (px/frame) em x e y.
+        :param rotation: Rotação da câmera (graus/frame).
+        :param zoom: Zoom por frame (0.01 = aproxima 1% a cada frame).
+        :param n_objects: Objetos com movimento independente.
+        :param object_speed: Velocidade máxima dos objetos (px/frame).
+        :param seed: Semente (mesma seed = mesma sequência).
+        """
+        self.width = width
+        self.height = height
+        self.n_frames = n_frames
+        self.translation = translation
+        self.rotation = rotation
+        self.zoom = zoom
+        self.n_objects = n_objects
+        self.object_speed = object_speed
+        self.seed = seed
+
+    def __repr__(self):
+        return (f"SyntheticMotion({self.width}x{self.height}, {self.n_frames} frames, "
+                f"translation={self.translation}, rotation={self.rotation}, zoom={self.zoom}, "
+                f"objects={self.n_objects}, seed={self.seed})")
+
+    @staticmethod
+    def _texture(height, width, rng):
+        """Textura colorida suave em várias escalas (ruído em oitavas, ampliado)."""
+        texture = np.zeros((height, width, 3), np.float32)
+        for octave in (2, 4, 8, 16, 32):
+            h, w = max(height // octave, 2), max(width // octave, 2)
+            noise = rng.random((h, w, 3), dtype=np.float32)
+            texture += cv.resize(noise, (width, height), interpolation=cv.INTER_CUBIC)
+        texture -= texture.min()
+        return texture * (255.0 / max(texture.max(), 1e-6))
+
+    def _camera_step(self):
+        """Transformação 2x3 do frame t para o frame t+1 (coordenadas de imagem)."""
+        center = (self.width / 2.0, self.height / 2.0)
+        M = cv.getRotationMatrix2D(center, self.rotation, 1.0 + self.zoom)
+        M[:, 2] += self.translation
+        return M
+
+    def generate(self):
+        """
+        Gera a sequência inteira.
+        :return: (frames (N, H, W, 3) uint8, fluxos (N-1, H, W, 2) float32)
+        """
+        rng = np.random.default_rng(self.seed)
+        w, h, n = self.width, self.height, self.n_frames
+
+        # --- Fundo: textura maior que o frame, amostrada pela câmera ---
+        # A câmera leva p (frame t) para M p (frame t+1); o frame t amostra a textura
+        # em A_t p, com A_t+1 = A_t M^-1 (o mesmo ponto da textura, seguido pela câmera).
+        margin = int(max(w, h) * (0.5 + abs(self.zoom) * n)) + int(np.hypot(*self.translation) * n)
+        background = self._texture(h + 2 * margin, w + 2 * margin, rng)
+        M = self._camera_step()
+        M3 = np.vstack([M, [0, 0, 1]])
+        M_inv = np.linalg.inv(M3)
+        A = np.array([[1, 0, margin], [0, 1, margin], [0, 0, 1]], np.float64)
+
+        xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+        # Fluxo da câmera: igual em todos os pares (M p - p)
+        camera_flow = np.dstack([M[0, 0] * xs + M[0, 1] * ys + M[0, 2] - xs,
+                                 M[1, 0] * xs + M[1, 1] * ys + M[1, 2] - ys]).astype(np.float32)
+
+        frames = np.empty((n, h, w, 3), np.uint8)
+        flows = np.empty((max(n - 1, 0), h, w, 2), np.float32)
+        layers = np.empty((n, h, w, 3), np.float32)
+        for t in range(n):
+            layers[t] = cv.warpAffine(background, A[:2], (w, h),
+                                      flags=cv.INTER_LINEAR | cv.WARP_INVERSE_MAP,
+                                      borderMode=cv.BORDER_REFLECT)
+            A = A @ M_inv
+        flows[:] = camera_flow
+
+        # --- Objetos: textura própria + máscara elíptica, translação própria ---
+        for _ in range(self.n_objects):
+            size = int(rng.uniform(0.15, 0.3) * min(w, h))
+            sprite = self._texture(size, size, rng)
+            mask = np.zeros((size, size), np.float32)
+            cv.ellipse(mask, (size // 2, size // 2), (size // 2 - 1, int(size * rng.uniform(0.3, 0.5))),
+                       rng.uniform(0, 180), 0, 360, 1.0, -1, cv.LINE_AA)
+            start = rng.uniform([0, 0], [w - size, h - size])
+            velocity = rng.uniform(-self.object_speed, self.object_speed, 2).astype(np.float32)
+
+            for t in range(n):
+                offset = start + velocity * t
+                T = np.float32([[1, 0, offset[0]], [0, 1, offset[1]]])
+                alpha = cv.warpAffine(mask, T, (w, h), flags=cv.INTER_LINEAR)[..., None]
+                if not alpha.any():
+                    continue
+                layer = cv.warpAffine(sprite, T, (w, h), flags=cv.INTER_LINEAR)
+                layers[t] = layers[t] * (1 - alpha) + layer * alpha
+                if t < n - 1:
+                    # Onde o objeto cobre o pixel (e está por cima), o fluxo é o dele
+                    flows[t][alpha[..., 0] > 0.5] = velocity
+
+        np.clip(layers, 0, 255, out=layers)
+        frames[:] = layers.astype(np.uint8)
+        return frames, flows
+
+    def save(self, folder):
+        """
+        Grava a sequência em disco: 'frames/NNNNNN.png' (entrada para os algoritmos)
+        e 'flow/NNNNNN.npy' (ground truth do par que termina no frame NNNNNN,
+        mesma numeração do flow_dir do Farneback).
+        """
+        frames, flows = self.generate()
+        os.makedirs(os.path.join(folder, 'frames'), exist_ok=True)
+        os.makedirs(os.path.join(folder, 'flow'), exist_ok=True)
+        for i, frame in enumerate(frames):
+            cv.imwrite(os.path.join(folder, 'frames', f"{i:06d}.png"), frame)
+        for i, flow in enumerate(flows, start=1):
+            np.save(os.path.join(folder, 'flow', f"{i:06d}.npy"), flow)
+        return folder
@@ -0,0 +1,112 @@
+import cv2 as cv
+import numpy as np
+
+class TemporalFilter:
+    """
+    Suavização temporal do fluxo denso (reduz a cintilação de um frame para o outro,
+    que deixa ruidoso o movimento acima do limiar).
+
+    Modos:
+    - 'ema': média móvel exponencial (saída = alpha * atual + (1 - alpha) * anterior).
+    - 'median': mediana, pixel a pixel, dos últimos K fluxos.
+
+    Os K últimos fluxos ficam num buffer circular alocado uma vez só (no primeiro
+    fluxo ou quando a resolução muda); as atualizações são feitas no lugar, sem
+    alocar nada por frame. A saída de apply() é um buffer interno, sobrescrito no
+    próximo frame (copie se precisar guardá-la). Use um filtro por algoritmo,
+    já que ele guarda o histórico dos fluxos de quem o usa (salvo no Checkpoint do algoritmo).
+    """
+
+    def __init__(self, mode='ema', alpha=0.5, k=5):
+        """
+        :param mode: 'ema' ou 'median'.
+        :param alpha: Peso do fluxo atual no modo 'ema' (1.0 = sem suavização).
+        :param k: Número de fluxos na mediana (modo 'median').
+        """
+        if mode not in ('ema', 'median'):
+            raise ValueError("Modo desconhecido. Use: 'ema', 'median'")
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha deve estar em (0, 1]")
+        if k < 1:
+            raise ValueError("k deve ser pelo menos 1")
+        self.mode = mode
+        self.alpha = alpha
+        self.k = k if mode == 'median' else 1
+        self._ring = None # (k, H, W, 2): os últimos fluxos
+        self._work = None # (k + 1, H, W, 2): espaço de trabalho da mediana
+        self._out = None
+        self._count = 0 # Fluxos já no buffer (até k)
+        self._pos = 0 # Posição do próximo fluxo no buffer
+
+    def params(self):
+        """Configuração do filtro (para identificar a saída, como GlobalMotion.params)."""
+        return dict(mode=self.mode, alpha=self.alpha) if self.mode == 'ema' else dict(mode=self.mode, k=self.k)
+
+    def reset(self):
+        """Esquece o histórico (ex: ao pular para outro trecho da entrada)."""
+        self._count = 0
+        self._pos = 0
+
+    def _get_state(self):
+        """Histórico do filtro (para Checkpoint). Cópia: os buffers são reusados no lugar."""
+        if self._ring is None:
+            return dict(shape=None)
+        history = self._out if self.mode == 'ema' else self._ring
+        return dict(shape=self._ring.shape[1:], history=history.copy(), count=self._count, pos=self._pos)
+
+    def _set_state(self, state):
+        if state['shape'] is None:
+            self._ring = None # Realocado (e zerado) no próximo fluxo
+            return
+        self._allocate(state['shape'])
+        np.copyto(self._out if self.mode == 'ema' else self._ring, state['history'])
+        self._count = state['count']
+        self._pos = state['pos']
+
+    def _allocate(self, shape):
+        self._ring = np.empty((self.k,) + shape, np.float32)
+        if self.mode == 'ema':
+            self._out = np.empty(shape, np.float32)
+        else:
+            self._work = np.empty((self.k + 1,) + shape, np.float32)
+        self.reset()
+
+    def apply(self, flow):
+        """Acrescenta o fluxo ao histórico e retorna o fluxo suavizado."""
+        if self._ring is None or self._ring.shape[1:] != flow.shape:
+            self._allocate(flow.shape)
+
+        if self.mode == 'ema':
+            if self._count == 0:
+                np.copyto(self._out, flow)
+            else:
+                cv.accumulateWeighted(flow, self._out, self.alpha)
+            self._count = 1
+            return self._out
+
+        np.copyto(self._ring[self._pos], flow)
+        self._pos = (self._pos + 1) % self.k
+        self._count = min(self._count + 1, self.k)
+        return self._median()
+
+    def _median(self):
+        """
+        Mediana dos fluxos do buffer por ordenação parcial (bolha) com mínimo e
+        máximo vetorizados: após n // 2 + 1 passadas, as posições do meio já estão
+        no lugar. Cada troca só troca referências entre os buffers de trabalho.
+        """
+        n = self._count
+        np.copyto(self._work[:n], self._ring[:n])
+        slots = list(self._work[:n])
+        spare = self._work[n]
+        for p in range(n // 2 + 1):
+            for j in range(n - 1 - p):
+                a, b = slots[j], slots[j + 1]
+                np.minimum(a, b, out=spare)
+                np.maximum(a, b, out=b)
+                slots[j], spare = spare, a
+
+        if n % 2:
+            return slots[n // 2]
+        cv.addWeighted(slots[n // 2 - 1], 0.5, slots[n // 2], 0.5, 0, dst=spare)
+        return spare
@@ -0,0 +1,60 @@
+import time
+import cv2 as cv
+from Farneback import Farneback
+from DIS import DIS
+from BlockMatching import BlockMatching
+
+def carregar_frames(engine, max_frames):
+    """Decodifica os frames antes da medição, para medir só o cálculo."""
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = engine._read_next_frame()
+        if not ret: break
+        frames.append(frame)
+    return frames
+
+def medir(nome, engine, frames):
+    """
+    Mede a vazão (fps) de um algoritmo denso:
+    - 'fluxo': só o cálculo do fluxo (já em cinza e reduzido).
+    - 'total': fluxo + visualização lado a lado (_process_and_draw).
+    """
+    grays = []
+    for frame in frames:
+        h, w = frame.shape[:2]
+        small = cv.resize(frame, (int(w * engine.scale_factor), int(h * engine.scale_factor)),
+                          interpolation=cv.INTER_AREA)
+        grays.append(cv.cvtColor(small, cv.COLOR_BGR2GRAY))
+
+    t0 = time.perf_counter()
+    for prev, gray in zip(grays, grays[1:]):
+        engine._calc_flow(prev, gray)
+    t_fluxo = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for frame in frames:
+        engine._process_and_draw(frame)
+    t_total = time.perf_counter() - t0
+
+    pares = len(grays) - 1
+    print(f"{nome:<28} fluxo: {pares / t_fluxo:7.1f} fps | total: {len(frames) / t_total:7.1f} fps")
+
+
+if __name__ == "__main__":
+    video_path = 'Dataset/cars6'
+    max_frames = 100
+
+    engines = {
+        'Farneback': lambda: Farneback(video_path),
+        'DIS (ultrafast)': lambda: DIS(video_path, preset='ultrafast'),
+        'DIS (fast)': lambda: DIS(video_path, preset='fast'),
+        'DIS (fast, sem refinamento)': lambda: DIS(video_path, preset='fast', variational_refinement=False),
+        'DIS (medium)': lambda: DIS(video_path, preset='medium'),
+        'BlockMatching (diamond)': lambda: BlockMatching(video_path, search='diamond'),
+        'BlockMatching (three_step)': lambda: BlockMatching(video_path, search='three_step'),
+    }
+
+    frames = carregar_frames(Farneback(video_path), max_frames)
+    print(f"Benchmark em {video_path}: {len(frames)} frames de {frames[0].shape[1]}x{frames[0].shape[0]}")
+    for nome, criar in engines.items():
+        medir(nome, criar(), frames)
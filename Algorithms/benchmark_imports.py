@@ -0,0 +1,78 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ALGORITHMS_DIR = os.path.dirname(os.path.abspath(__file__))
+SIDESEEING_DIR = os.path.join(os.path.dirname(ALGORITHMS_DIR), 'sideseeing')
+
+def _carregar_arquivo(caminho, nome):
+    """Código que importa um script pelo caminho (os exportadores têm '-' no nome do arquivo)."""
+    return (f"import importlib.util; spec = importlib.util.spec_from_file_location({nome!r}, {caminho!r}); "
+            f"spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+
+# Ponto de entrada -> código que um job executa antes de começar a trabalhar
+# (o runner test.py importa só o módulo do algoritmo escolhido; o FlowCache é opcional)
+ENTRY_POINTS = {
+    'runner: lk': 'import LucasKanade',
+    'runner: farneback': 'import Farneback',
+    'runner: hs': 'import HornSchunck',
+    'runner: dis': 'import DIS',
+    'runner: bm': 'import BlockMatching',
+    'runner: dpflow': 'import DPFlow',
+    'runner: traj': 'import DenseTrajectories',
+    'runner: multi': 'import MultiEngine, LucasKanade, Farneback, HornSchunck',
+    'SharedPipeline': 'import SharedPipeline',
+    'FlowService': 'import FlowService',
+    'flow_client': 'import flow_client',
+    'convert_frames_to_video': 'import convert_frames_to_video',
+    'Report (export-relatorios)': _carregar_arquivo(
+        os.path.join(SIDESEEING_DIR, 'export-relatorios', 'export.py'), 'export'),
+    'VisualReport (export-jn)': _carregar_arquivo(
+        os.path.join(SIDESEEING_DIR, 'export-jn', 'jupy-export.py'), 'jupy_export'),
+}
+
+def _executar(codigo, *opcoes):
+    return subprocess.run([sys.executable, *opcoes, '-c', codigo], cwd=ALGORITHMS_DIR,
+                          capture_output=True, text=True)
+
+def medir_partida(codigo, repeticoes):
+    """
+    Tempo (s) de partida de um interpretador novo que só executa o código: o mínimo
+    e a mediana de várias execuções. Retorna (None, None, erro) se o código falhar.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        result = _executar(codigo)
+        tempos.append(time.perf_counter() - t0)
+        if result.returncode != 0:
+            return None, None, result.stderr.strip().splitlines()[-1]
+    return min(tempos), statistics.median(tempos), None
+
+def mais_lentos(codigo, top=3):
+    """Módulos com maior tempo próprio de importação (python -X importtime)."""
+    result = _executar(codigo, '-X', 'importtime')
+    modulos = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, nome = line[len('import time:'):].split('|')
+        modulos.append((int(self_us), nome.strip()))
+    return sorted(modulos, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    repeticoes = 5
+
+    _, base, _ = medir_partida('pass', repeticoes)
+    print(f"Interpretador vazio: {base * 1000:.0f} ms (descontado abaixo)")
+    print(f"{'Ponto de entrada':<28} {'mín':>8} {'mediana':>8}   mais lentos (tempo próprio)")
+    for nome, codigo in ENTRY_POINTS.items():
+        minimo, mediana, erro = medir_partida(codigo, repeticoes)
+        if erro:
+            print(f"{nome:<28} falhou: {erro}")
+            continue
+        lentos = ', '.join(f"{m} {us / 1000:.0f}ms" for us, m in mais_lentos(codigo))
+        print(f"{nome:<28} {(minimo - base) * 1000:6.0f}ms {(mediana - base) * 1000:6.0f}ms   {lentos}")
@@ -1,8 +1,18 @@
 import cv2
 import os
-import glob
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 
+from FrameSource import FrameSource, natural_key
+from MemoryBudget import MemoryBudget
+
+def listar_imagens(path_imagens):
+    """Lista as imagens do diretório uma única vez, em ordem natural ('2.png' antes de '10.png')."""
+    return sorted([os.path.join(path_imagens, f) for f in os.listdir(path_imagens)
+                   if f.lower().endswith(FrameSource.VALID_EXTS)], key=natural_key)
+
 def criar_video_apartir_imagens(path_imagens, nome_video="video_output.mp4", fps=30):
     """
     Cria um vídeo a partir de imagens em um diretório
@@ -13,15 +23,8 @@ def criar_video_apartir_imagens(path_imagens, nome_video="video_output.mp4", fps
         fps (int): Frames por segundo do vídeo
     """
     
-    # Encontrar todas as imagens no diretório
-    extensoes = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff']
-    lista_imagens = []
-    
-    for extensao in extensoes:
-        lista_imagens.extend(glob.glob(os.path.join(path_imagens, extensao)))
-    
-    # Ordenar as imagens por nome
-    lista_imagens.sort()
+    # Encontrar todas as imagens no diretório (ordem natural)
+    lista_imagens = listar_imagens(path_imagens)
     
     if not lista_imagens:
         print("Nenhuma imagem encontrada no diretório especificado.")
@@ -68,6 +71,136 @@ def criar_video_apartir_imagens(path_imagens, nome_video="video_output.mp4", fps
     print(f"Vídeo criado com sucesso: {nome_video}")
     print(f"Tamanho do arquivo: {os.path.getsize(nome_video) / (1024*1024):.2f} MB")
 
+def quadros_do_engine(engine, start=None, end=None, stride=None):
+    """
+    Gera as imagens de saída (lado a lado) de um algoritmo, frame a frame, para
+    gravar o vídeo direto da memória, sem passar por uma pasta de imagens.
+
+    :param engine: Algoritmo já criado (LucasKanade, Farneback, HornSchunck, DIS, ...).
+    :param start: Primeiro frame (ver run dos algoritmos).
+    :param end: Frame onde para (exclusivo).
+    :param stride: Passo entre frames.
+    """
+    if (start, end, stride) != (None, None, None):
+        engine.source.set_range(start, end, stride)
+    try:
+        while True:
+            ret, frame, gray_frame = engine.source.read_gray(engine.scale_factor)
+            if not ret:
+                break
+            yield engine._process_and_draw(frame, gray_frame, engine.source.last_index)
+    finally:
+        engine.source.release()
+
+def _ler_imagem(caminho_imagem, tamanho):
+    imagem = cv2.imread(caminho_imagem)
+    if imagem is not None and (imagem.shape[1], imagem.shape[0]) != tamanho:
+        imagem = cv2.resize(imagem, tamanho)
+    return imagem
+
+def _decodificar(lista_imagens, tamanho, workers, janela=None):
+    """
+    Decodifica (e redimensiona) as imagens num pool de threads (o OpenCV libera
+    o GIL), com no máximo janela imagens em voo (padrão: 4 por thread), e as
+    entrega na ordem da lista.
+    """
+    janela = janela or 4 * workers
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pendentes = iter(lista_imagens)
+        em_voo = deque((c, pool.submit(_ler_imagem, c, tamanho)) for c in islice(pendentes, janela))
+        while em_voo:
+            caminho_imagem, futuro = em_voo.popleft()
+            for proxima in islice(pendentes, 1): # Repõe a janela
+                em_voo.append((proxima, pool.submit(_ler_imagem, proxima, tamanho)))
+            imagem = futuro.result()
+            if imagem is None:
+                print(f"Erro ao ler imagem: {caminho_imagem}")
+                continue
+            yield imagem
+
+def criar_video_streaming(fonte, nome_video="video_output.mp4", fps=None, workers=None,
+                          frames_por_parte=None, max_memory=None):
+    """
+    Cria um vídeo em streaming: as imagens são listadas uma vez (ordem natural),
+    decodificadas em paralelo e gravadas na ordem, sem guardar nada além da janela
+    em voo.
+
+    Args:
+        fonte: Diretório com as imagens, um algoritmo (grava a saída dele, frame a
+               frame) ou qualquer iterável de imagens BGR já decodificadas.
+        nome_video (str): Nome do arquivo de vídeo de saída. Com frames_por_parte,
+                          as partes ficam em '<nome>_000.mp4', '<nome>_001.mp4', ...
+        fps (float): Frames por segundo. None = o fps real da entrada do algoritmo
+                     (dividido pelo stride) ou 30 para pastas de imagens.
+        workers (int): Threads de decodificação (padrão: número de núcleos).
+        frames_por_parte (int): Se fornecido, divide a saída em partes desse tamanho.
+        max_memory: Limite de memória ('2GB' ou um MemoryBudget). Só para diretórios:
+                    a janela de imagens em voo (e, se preciso, as threads) diminui
+                    até caber, pelo tamanho da primeira imagem.
+
+    Returns:
+        list: Arquivos de vídeo gravados.
+    """
+    workers = workers or os.cpu_count() or 1
+    if hasattr(fonte, '_process_and_draw'): # Algoritmo: grava a saída dele
+        if fps is None and fonte.source.fps:
+            fps = fonte.source.fps / fonte.source.stride
+        quadros = quadros_do_engine(fonte)
+    elif isinstance(fonte, (str, Path)):
+        lista_imagens = listar_imagens(fonte)
+        if not lista_imagens:
+            print("Nenhuma imagem encontrada no diretório especificado.")
+            return []
+        print(f"Encontradas {len(lista_imagens)} imagens")
+        primeira_imagem = cv2.imread(lista_imagens[0])
+        if primeira_imagem is None:
+            print(f"Erro ao ler a primeira imagem: {lista_imagens[0]}")
+            return []
+        tamanho = (primeira_imagem.shape[1], primeira_imagem.shape[0])
+        janela = None
+        if max_memory is not None:
+            memoria = max_memory if isinstance(max_memory, MemoryBudget) else MemoryBudget(max_memory)
+            # Cada imagem em voo: a decodificada e, no pior caso, a redimensionada
+            janela = memoria.fit('janela', 2 * primeira_imagem.nbytes, wanted=4 * workers)
+            workers = min(workers, janela)
+            print(f"Memória: {janela} imagens em voo, {workers} threads")
+        quadros = _decodificar(lista_imagens, tamanho, workers, janela)
+    else:
+        quadros = fonte
+    fps = fps or 30
+
+    base, extensao = os.path.splitext(nome_video)
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    arquivos, video, tamanho, n_parte = [], None, None, 0
+    total = 0
+    for imagem in quadros:
+        if tamanho is None:
+            tamanho = (imagem.shape[1], imagem.shape[0])
+            print(f"Criando vídeo: {nome_video} ({tamanho[0]}x{tamanho[1]}, {fps:g} fps)")
+        elif (imagem.shape[1], imagem.shape[0]) != tamanho:
+            imagem = cv2.resize(imagem, tamanho)
+
+        if video is None or (frames_por_parte and n_parte >= frames_por_parte):
+            if video is not None:
+                video.release()
+            nome = f"{base}_{len(arquivos):03d}{extensao}" if frames_por_parte else nome_video
+            video = cv2.VideoWriter(nome, fourcc, fps, tamanho)
+            arquivos.append(nome)
+            n_parte = 0
+
+        video.write(imagem)
+        n_parte += 1
+        total += 1
+        if total % 500 == 0:
+            print(f"Processado: {total} imagens")
+
+    if video is not None:
+        video.release()
+    print(f"Vídeo criado com sucesso: {total} frames em {len(arquivos)} arquivo(s)")
+    if max_memory is not None and isinstance(fonte, (str, Path)):
+        memoria.report()
+    return arquivos
+
 def main():
     # Defina o path das imagens aqui
     path_imagens = "./Dataset/cars6-viz"  
@@ -80,7 +213,10 @@ def main():
     nome_video = "Dataset/cars6.mp4"
     fps = 24 
     
-    criar_video_apartir_imagens(path_imagens, nome_video, fps)
+    criar_video_streaming(path_imagens, nome_video, fps)
+    # Partes de 10 mil frames, ou direto da saída de um algoritmo (sem pasta intermediária):
+    #criar_video_streaming(path_imagens, "Dataset/cars6.mp4", fps, frames_por_parte=10000)
+    #criar_video_streaming(HornSchunck('Dataset/cars6'), "Outputs/hs_cars6.mp4")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import io
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+class FlowClient:
+    """Cliente simples do FlowService (ver FlowService.py)."""
+
+    def __init__(self, url='http://127.0.0.1:8765'):
+        self.url = url.rstrip('/')
+
+    def _post(self, engine, body, content_type):
+        req = urllib.request.Request(f"{self.url}/flow?engine={engine}", data=body,
+                                     headers={'Content-Type': content_type})
+        with urllib.request.urlopen(req) as resp:
+            data = np.load(io.BytesIO(resp.read()))
+            return data['flow'], data['pairs']
+
+    def pairs(self, engine, input_source, pairs):
+        """Fluxo de pares (i, j) de uma entrada em disco. Retorna (flows float16, pares)."""
+        body = json.dumps({'input': input_source, 'pairs': [list(p) for p in pairs]}).encode()
+        return self._post(engine, body, 'application/json')
+
+    def range(self, engine, input_source, start=0, end=None, stride=1):
+        """Fluxo dos pares consecutivos de um trecho da entrada."""
+        body = json.dumps({'input': input_source, 'start': start, 'end': end,
+                           'stride': stride}).encode()
+        return self._post(engine, body, 'application/json')
+
+    def images(self, engine, prev, nxt):
+        """Fluxo de imagens enviadas direto (um par ou N pares empilhados)."""
+        buffer = io.BytesIO()
+        np.savez(buffer, prev=prev, next=nxt)
+        return self._post(engine, buffer.getvalue(), 'application/octet-stream')[0]
+
+    def metrics(self):
+        with urllib.request.urlopen(f"{self.url}/metrics") as resp:
+            return json.loads(resp.read())
+
+
+if __name__ == "__main__":
+    # Simula várias ferramentas pedindo fluxo ao mesmo tempo (suba o FlowService antes)
+    video_path = 'Dataset/cars6'
+    client = FlowClient()
+
+    def pedido(i):
+        flows, _ = client.pairs('dis', video_path, [(i, i + 1)])
+        return flows.shape
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        shapes = list(pool.map(pedido, range(64)))
+    print(f"64 pares em {time.perf_counter() - t0:.2f}s, fluxo {shapes[0]}")
+
+    flows, pairs = client.range('farneback', video_path, start=0, end=20)
+    print(f"Trecho 0-20: {len(pairs)} pares, {flows.nbytes / 1e6:.1f} MB")
+    print(json.dumps(client.metrics(), indent=2))
@@ -1,19 +1,129 @@
-from LucasKanade import LucasKanade
-from Farneback import Farneback
-from HornSchunck import HornSchunck
+# Imports sob demanda: cada job só importa o algoritmo e as opções que usa
+# (com milhares de jobs curtos, o tempo de importação pesa na vazão)
+import argparse
+
+# Perfil do caminho crítico (relatórios de desempenho de campo), sem editar o script:
+#   python test.py --profile sample --profile-start 50 --profile-frames 200
+#   python test.py --profile cprofile
+parser = argparse.ArgumentParser(description="Roda o algoritmo configurado abaixo.")
+parser.add_argument('--profile', choices=('sample', 'cprofile'),
+                    help="'sample': amostra a pilha numa janela de frames (collapsed para flamegraph); "
+                         "'cprofile': a execução inteira no cProfile (.prof)")
+parser.add_argument('--profile-start', type=int, default=0, help="Frames lidos antes de amostrar")
+parser.add_argument('--profile-frames', type=int, default=200, help="Frames amostrados")
+parser.add_argument('--profile-dir', default='Outputs/profiles', help="Pasta dos perfis")
+# Cache de fluxo em disco (opcional): re-renderizar com outra visualização não recalcula o fluxo
+#   python test.py --flow-cache Outputs/flow_cache --flow-cache-mb 4096
+parser.add_argument('--flow-cache', metavar='PASTA', help="Ativa o FlowCache nessa pasta")
+parser.add_argument('--flow-cache-mb', type=float, default=4096, help="Tamanho máximo do cache (MB)")
+args = parser.parse_args()
 
 video_path = 'Dataset/cars6'
 #video_path = 'Dataset/my_video.mp4'
+# Pasta ainda sendo gravada pelo app de captura: processa os frames conforme chegam
+#from FrameSource import FrameSource
+#video_path = FrameSource('Dataset/live_capture', follow=True, idle_timeout=30)
 
-# Escolha: 'lk', 'farneback', 'hs'
+# Escolha: 'lk', 'farneback', 'hs', 'dis', 'bm', 'dpflow', 'traj' (trajetórias densas)
+# ou 'multi' (vários de uma vez, uma só leitura)
 algoritmo = 'farneback' 
 
+# Cache de fluxo: desligado por padrão (ver --flow-cache)
+flow_cache = None
+if args.flow_cache:
+    from FlowCache import FlowCache
+    flow_cache = FlowCache(args.flow_cache, max_size_mb=args.flow_cache_mb)
+
+# Movimento da câmera: None mantém o fluxo bruto; com GlobalMotion sobra só o residual
+global_motion = None
+#from GlobalMotion import GlobalMotion
+#global_motion = GlobalMotion(method='phase', model='similarity', mode='subtract')
+
+# Suavização temporal: None mantém o fluxo de cada par; 'ema' ou 'median' reduzem a cintilação
+temporal_filter = None
+#from TemporalFilter import TemporalFilter
+#temporal_filter = TemporalFilter(mode='median', k=5)
+
+# Consistência ida-e-volta: vetores ocluídos/não confiáveis em cinza e fora das estatísticas
+consistency = None
+#from ConsistencyCheck import ConsistencyCheck
+#consistency = ConsistencyCheck()
+
+# Limite de memória do job (nós compartilhados): lotes, tiles, workers e filas se ajustam
+# ao tamanho do frame para caber, e o pico de RSS é comparado com a previsão no fim
+max_memory = None
+#max_memory = '2GB'
+
 if algoritmo == 'lk':
+    from LucasKanade import LucasKanade
     tracker = LucasKanade(video_path)
 elif algoritmo == 'farneback':
-    tracker = Farneback(video_path)
+    from Farneback import Farneback
+    tracker = Farneback(video_path, flow_cache=flow_cache, global_motion=global_motion,
+                        temporal_filter=temporal_filter, consistency=consistency)
 elif algoritmo == 'hs':
-    tracker = HornSchunck(video_path)
+    from HornSchunck import HornSchunck
+    tracker = HornSchunck(video_path, flow_cache=flow_cache, global_motion=global_motion,
+                          temporal_filter=temporal_filter, consistency=consistency)
+elif algoritmo == 'dis':
+    from DIS import DIS
+    tracker = DIS(video_path, preset='fast', flow_cache=flow_cache, global_motion=global_motion,
+                  temporal_filter=temporal_filter, consistency=consistency)
+elif algoritmo == 'bm':
+    from BlockMatching import BlockMatching
+    tracker = BlockMatching(video_path, block_size=16, search='diamond', flow_cache=flow_cache,
+                            global_motion=global_motion, temporal_filter=temporal_filter,
+                            consistency=consistency)
+elif algoritmo == 'dpflow':
+    from DPFlow import DPFlow
+    # Modelo carregado uma vez (worker persistente), pares em lotes na CPU
+    tracker = DPFlow(video_path, ckpt_path='sintel', batch_size=4, threads=8, tile_size=768,
+                     flow_cache=flow_cache, temporal_filter=temporal_filter, consistency=consistency,
+                     max_memory=max_memory)
+elif algoritmo == 'traj':
+    from DenseTrajectories import DenseTrajectories
+    from DIS import DIS
+    from ConsistencyCheck import ConsistencyCheck
+    # Pontos levados pelo fluxo (DIS + consistência) frame a frame; tracks_file= no run grava as trajetórias
+    tracker = DenseTrajectories(video_path, grid_step=8,
+                                flow_engine=lambda src: DIS(src, flow_cache=flow_cache,
+                                                            consistency=ConsistencyCheck()))
+elif algoritmo == 'multi':
+    from MultiEngine import MultiEngine
+    from LucasKanade import LucasKanade
+    from Farneback import Farneback
+    from HornSchunck import HornSchunck
+    # FlowCache e GlobalMotion podem ser compartilhados (travas internas), mesmo com
+    # escalas diferentes; TemporalFilter, não: use um por algoritmo
+    tracker = MultiEngine(video_path, {
+        'lk': lambda src: LucasKanade(src),
+        'farneback': lambda src: Farneback(src, flow_cache=flow_cache, global_motion=global_motion),
+        'hs': lambda src: HornSchunck(src, flow_cache=flow_cache, global_motion=global_motion),
+    })
 
-tracker.run(save_video=True, output_file='Outputs/farneback_video_cars6.mp4', display=False)
+run_kwargs = dict(save_video=True, output_file='Outputs/farneback_video_cars6.mp4', display=False)
+if args.profile:
+    from Profiler import Profiler
+    Profiler(args.profile, args.profile_dir, start_frame=args.profile_start,
+             frames=args.profile_frames).run(tracker, **run_kwargs)
+else:
+    tracker.run(**run_kwargs)
+# Jobs longos (não vale para 'multi'): retoma do último checkpoint se o processo cair
+#from Checkpoint import Checkpoint
+#tracker.run(save_video=True, output_file='Outputs/farneback_video_cars6.mp4', display=False,
+#            checkpoint=Checkpoint('Outputs/farneback_cars6.ckpt', every=500))
+# Só um trecho da entrada (índices absolutos), um frame a cada 2:
+#tracker.run(save_video=True, output_file='Outputs/farneback_video_cars6.mp4', display=False,
+#            start=1000, end=4000, stride=2)
+# Só o fluxo, em vários processos (uma decodificação, frames em memória compartilhada):
+#from SharedPipeline import SharedPipeline
+#from HornSchunck import HornSchunck
+#SharedPipeline(video_path, HornSchunck, workers=4,
+#               max_memory=max_memory).run(flow_dir='Outputs/hs_flow_cars6')
+# Estatísticas por região em CSV (alguns KB por frame) em vez do campo inteiro:
+#from FlowAnalytics import FlowAnalytics
+#tracker.run(display=False, analytics=FlowAnalytics('Outputs/farneback_cars6_stats.csv', grid=(3, 3)))
+# Só os trechos com movimento (vídeo curto + índice .json com os instantes de cada trecho):
+#from MotionSummary import MotionSummary
+#tracker.run(display=False, summary=MotionSummary('Outputs/farneback_cars6_resumo.mp4', padding=20))
 #tracker.run(display=True)
\ No newline at end of file
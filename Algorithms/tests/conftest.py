@@ -0,0 +1,22 @@
+import os
+import sys
+
+import cv2 as cv
+import pytest
+
+# Os módulos do Algorithms são importados pelo nome (como no test.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SyntheticMotion import SyntheticMotion
+
+@pytest.fixture(autouse=True)
+def sem_janelas(monkeypatch):
+    # Os testes não abrem janelas; no OpenCV headless o destroyAllWindows do run() falha
+    monkeypatch.setattr(cv, 'destroyAllWindows', lambda: None)
+
+@pytest.fixture(scope='session')
+def frames_dir(tmp_path_factory):
+    """Pasta com uma sequência sintética curta (câmera em translação + objetos)."""
+    folder = tmp_path_factory.mktemp('synthetic')
+    SyntheticMotion(width=160, height=120, n_frames=12, seed=1).save(str(folder))
+    return str(folder / 'frames')
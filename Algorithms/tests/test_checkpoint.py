@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from Checkpoint import Checkpoint
+from Farneback import Farneback
+from HornSchunck import HornSchunck
+from TemporalFilter import TemporalFilter
+
+class Interrompido(Exception):
+    pass
+
+def _gravar_fluxos(engine, flows, interromper_em=None):
+    """Guarda o fluxo (já filtrado) de cada frame; com interromper_em, simula a queda do job."""
+    process = engine._process_and_draw
+    def process_and_draw(frame, gray_frame=None, frame_idx=None):
+        if frame_idx == interromper_em:
+            raise Interrompido()
+        result = process(frame, gray_frame, frame_idx)
+        if engine.last_flow is not None:
+            flows[frame_idx] = engine.last_flow.copy()
+        return result
+    engine._process_and_draw = process_and_draw
+    return engine
+
+@pytest.mark.parametrize('engine_cls', [Farneback, HornSchunck])
+@pytest.mark.parametrize('filter_kwargs', [dict(mode='ema', alpha=0.3), dict(mode='median', k=3)])
+def test_retomada_igual_a_execucao_direta(frames_dir, tmp_path, engine_cls, filter_kwargs):
+    direct = {}
+    engine = engine_cls(frames_dir, temporal_filter=TemporalFilter(**filter_kwargs))
+    _gravar_fluxos(engine, direct).run(display=False)
+
+    resumed = {}
+    checkpoint_path = str(tmp_path / 'job.ckpt')
+    engine = engine_cls(frames_dir, temporal_filter=TemporalFilter(**filter_kwargs))
+    _gravar_fluxos(engine, resumed, interromper_em=9) # Último checkpoint: depois do frame 7
+    with pytest.raises(Interrompido):
+        engine.run(display=False, checkpoint=Checkpoint(checkpoint_path, every=4))
+    assert os.path.exists(checkpoint_path)
+
+    # Processo novo: algoritmo e filtro novos, só o checkpoint em comum
+    engine = engine_cls(frames_dir, temporal_filter=TemporalFilter(**filter_kwargs))
+    _gravar_fluxos(engine, resumed).run(display=False, checkpoint=Checkpoint(checkpoint_path, every=4))
+
+    assert sorted(resumed) == sorted(direct)
+    for frame_idx, flow in direct.items():
+        np.testing.assert_array_equal(flow, resumed[frame_idx])
@@ -0,0 +1,45 @@
+import cv2 as cv
+import numpy as np
+
+from BlockMatching import BlockMatching
+from ConsistencyCheck import ConsistencyCheck
+from HornSchunck import HornSchunck
+
+def _translacao(dx, width=320, height=240, seed=0):
+    """Par de frames com textura aleatória deslocada dx px na horizontal."""
+    rng = np.random.default_rng(seed)
+    base = cv.GaussianBlur((rng.random((height + 20, width + 20)) * 255).astype(np.float32), (0, 0), 2)
+    moved = cv.warpAffine(base, np.float32([[1, 0, dx], [0, 1, 0]]), base.shape[::-1])
+    crop = lambda img: cv.normalize(img[10:10 + height, 10:10 + width], None, 0, 255,
+                                    cv.NORM_MINMAX).astype(np.uint8)
+    return crop(base), crop(moved)
+
+def test_fluxo_parado_na_borda_e_consistente():
+    flow = np.zeros((15, 20, 2), np.float32)
+    assert ConsistencyCheck().mask(flow, -flow, cell=16).all()
+
+def test_block_matching_tolera_vetores_inteiros():
+    prev_gray, gray = _translacao(1.5)
+    engine = BlockMatching(None, consistency=ConsistencyCheck())
+    engine._process_and_draw(None, prev_gray, 0)
+    engine._process_and_draw(None, gray, 1)
+    # 1.5 px vira 1 ou 2 por bloco, ida e volta: a diferença de 1 px não é oclusão
+    assert set(np.unique(engine.last_flow[..., 0])) == {1.0, 2.0}
+    assert engine.last_mask.mean() > 0.95
+
+def test_horn_schunck_calcula_a_volta(frames_dir):
+    engine = HornSchunck(frames_dir, consistency=ConsistencyCheck())
+    backward = engine._compute_backward
+    pairs = []
+    def compute_backward(prev_gray, gray_frame, forward):
+        result = backward(prev_gray, gray_frame, forward)
+        pairs.append((forward.copy(), result.copy()))
+        return result
+    engine._compute_backward = compute_backward
+    engine.run(display=False)
+
+    assert pairs
+    for forward, result in pairs:
+        # Não é só a ida negada: a volta vem de um segundo passe do HS
+        assert not np.allclose(result, -forward, atol=1e-3)
+        assert np.abs(result + forward).mean() < 0.5
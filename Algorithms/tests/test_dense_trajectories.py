@@ -0,0 +1,51 @@
+import numpy as np
+
+from DIS import DIS
+from DenseTrajectories import DenseTrajectories, sample_flow
+
+def test_sample_flow_mais_pontos_que_shrt_max():
+    h, w = 300, 400
+    ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+    flow = np.dstack((xs * 0.01, ys * -0.02)) # Linear: a bilinear é exata
+    rng = np.random.default_rng(0)
+    xy = rng.uniform([0, 0], [w - 1, h - 1], (40000, 2)).astype(np.float32)
+    sampled = sample_flow(flow, xy)
+    assert sampled.shape == (40000, 2)
+    np.testing.assert_allclose(sampled[:, 0], xy[:, 0] * 0.01, atol=1e-3)
+    np.testing.assert_allclose(sampled[:, 1], xy[:, 1] * -0.02, atol=1e-3)
+
+def test_advect_mais_pontos_que_shrt_max():
+    tracker = DenseTrajectories(None, flow_engine=lambda src: DIS(src), grid_step=2)
+    h, w = 400, 400
+    rng = np.random.default_rng(0)
+    tracker.points = rng.uniform(10, 380, (40000, 2)).astype(np.float32)
+    tracker.ids = np.arange(40000)
+    tracker.ages = np.zeros(40000, np.int32)
+    tracker.tails = np.repeat(tracker.points[:, None], tracker.tail_length, axis=1)
+    flow = np.zeros((h, w, 2), np.float32)
+    flow[..., 0] = 1.5
+    before = tracker.points.copy()
+    tracker._advect(flow, None, (h, w))
+    assert len(tracker.points) == 40000
+    np.testing.assert_allclose(tracker.points - before, np.broadcast_to([1.5, 0.0], before.shape), atol=1e-4)
+
+def test_pontos_que_convergem_viram_um_so():
+    tracker = DenseTrajectories(None, flow_engine=lambda src: DIS(src), grid_step=8)
+    tracker.points = np.float32([[10.2, 10.1], [10.9, 11.5], [30.0, 30.0]])
+    tracker.ids = np.arange(3)
+    tracker.ages = np.int32([2, 5, 1])
+    tracker.tails = np.repeat(tracker.points[:, None], tracker.tail_length, axis=1)
+    tracker._dedupe((64, 64))
+    assert tracker.ids.tolist() == [1, 2] # Dos dois na mesma meia célula, fica o mais antigo
+
+def test_pontos_ativos_nao_crescem(frames_dir):
+    tracker = DenseTrajectories(frames_dir, grid_step=4, quality=None)
+    counts = []
+    while True:
+        ret, _, gray = tracker.source.read_gray(tracker.scale_factor, need_color=False)
+        if not ret:
+            break
+        h, w = gray.shape
+        tracker._process_and_draw(None, gray, tracker.source.last_index)
+        counts.append(len(tracker.points))
+    assert max(counts) <= (h // 2 + 1) * (w // 2 + 1) # No máximo um por meia célula
@@ -0,0 +1,11 @@
+import pytest
+
+from Farneback import Farneback
+from FlowCache import FlowCache
+
+def test_cache_sem_entrada_e_recusado(tmp_path):
+    with pytest.raises(ValueError):
+        Farneback(None, flow_cache=FlowCache(str(tmp_path)))
+
+def test_sem_cache_nao_precisa_de_entrada():
+    assert Farneback(None).flow_cache is None
@@ -0,0 +1,29 @@
+import json
+import os
+
+import FlowService as flow_service
+from DIS import DIS
+from FlowService import FlowService
+
+def test_intervalo_sem_fim_usa_a_fonte_do_pool(frames_dir, monkeypatch):
+    opened = []
+    original = flow_service.FrameSource
+    def counting(*args, **kwargs):
+        opened.append(args[0])
+        return original(*args, **kwargs)
+    monkeypatch.setattr(flow_service, 'FrameSource', counting)
+
+    service = FlowService({'dis': lambda src: DIS(src)})
+    for worker in service.workers.values():
+        worker.thread.start()
+    try:
+        body = json.dumps({'input': frames_dir, 'stride': 2}).encode()
+        for _ in range(3):
+            job = service._parse_request('application/json', body)
+            flows = service.submit('dis', job)
+        n_frames = len(os.listdir(frames_dir))
+        assert job.pairs == list(zip(range(0, n_frames, 2), range(2, n_frames, 2)))
+        assert len(flows) == len(job.pairs)
+        assert opened == [frames_dir] # Uma fonte só, do pool do worker, para os 3 pedidos
+    finally:
+        service.stop()
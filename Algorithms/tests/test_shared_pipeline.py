@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+from Farneback import Farneback
+from FlowCache import FlowCache
+from SharedPipeline import SharedPipeline
+
+def _cached_keys(folder):
+    return sorted(name for _, _, files in os.walk(folder) for name in files if name.endswith('.npy'))
+
+def test_pipeline_grava_as_mesmas_chaves_que_a_execucao_sequencial(frames_dir, tmp_path):
+    # start=1 e stride=2: todo par tem intervalo 2, e o primeiro frame de cada worker não é o 0
+    sequential = FlowCache(str(tmp_path / 'sequencial'))
+    Farneback(frames_dir, flow_cache=sequential).run(display=False, start=1, stride=2)
+
+    pipeline = SharedPipeline(frames_dir, Farneback, dict(flow_cache=FlowCache(str(tmp_path / 'pipeline'))),
+                              workers=2, start=1, stride=2)
+    flows = dict(pipeline.flows())
+
+    keys = _cached_keys(tmp_path / 'sequencial')
+    assert len(keys) == len(flows) == 5
+    assert keys == _cached_keys(tmp_path / 'pipeline')
+    for name in keys:
+        path = os.path.join(name[:2], name)
+        np.testing.assert_array_equal(np.load(tmp_path / 'sequencial' / path),
+                                      np.load(tmp_path / 'pipeline' / path))
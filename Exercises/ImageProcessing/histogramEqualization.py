@@ -11,16 +11,14 @@ class ImageGenerator:
         image = np.zeros((height, width), dtype=np.uint8)
         
         if pattern_type == 'gradient':
-            for x in range(width):
-                image[:, x] = int((x / width) * 255)
+            # Uma linha calculada de uma vez e repetida em todas as linhas
+            image[:, :] = (np.arange(width) / width * 255).astype(np.uint8)
         elif pattern_type == 'solid':
             image[:, :] = intensity
         elif pattern_type == 'checkerboard':
             square_size = max(width, height) // 8
-            for y in range(height):
-                for x in range(width):
-                    if ((x // square_size) + (y // square_size)) % 2 != 0:
-                        image[y, x] = 255
+            Y, X = np.ogrid[:height, :width]
+            image[((X // square_size) + (Y // square_size)) % 2 != 0] = 255
         elif pattern_type == 'random':
             image = np.random.randint(0, 256, (height, width), dtype=np.uint8)
         elif pattern_type == 'circle':
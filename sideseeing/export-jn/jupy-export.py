@@ -1,11 +1,13 @@
+from __future__ import annotations
+
 import os
 import json
 import base64
-from markdown import markdown 
 from datetime import datetime
-from bs4 import BeautifulSoup # web scrapping
-from jinja2 import Environment, FileSystemLoader, Template
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+
+if TYPE_CHECKING: # Só para as anotações: markdown, bs4 e jinja2 são importados onde são usados
+    from jinja2 import Template
 
 class VisualReport:
 
@@ -40,6 +42,7 @@ class VisualReport:
             template_dir = os.path.dirname(self.default_template_path) or '.'
             template_file_name = os.path.basename(self.default_template_path)
 
+            from jinja2 import Environment, FileSystemLoader
             self.env = Environment(loader=FileSystemLoader(template_dir))
             self._default_template = self.env.get_template(template_file_name)
         
@@ -54,6 +57,7 @@ class VisualReport:
         template_dir = os.path.dirname(template_path) or '.'
         template_file_name = os.path.basename(template_path)
 
+        from jinja2 import Environment, FileSystemLoader
         env = Environment(loader=FileSystemLoader(template_dir))
 
         return env.get_template(template_file_name)
@@ -62,6 +66,7 @@ class VisualReport:
         """
         Extrai título da primeira tag `<h1>` encontrada.
         """
+        from bs4 import BeautifulSoup # web scrapping
         soup = BeautifulSoup(html_content, 'html.parser')
         h1_tag = soup.find('h1')
 
@@ -71,6 +76,7 @@ class VisualReport:
         """
         Processa uma célula markdown e retorna um componente e um status do título.
         """
+        from markdown import markdown
         html_content = markdown("".join(cell['source']))
         title = None
         
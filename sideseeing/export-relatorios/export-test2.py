@@ -1,13 +1,15 @@
+from __future__ import annotations
+
 import os
 import io
 import base64
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-import sideseeing, plot
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader, Template
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+
+if TYPE_CHECKING: # Só para as anotações: as dependências pesadas são importadas onde são usadas
+    import sideseeing
+    from jinja2 import Template
 
 class Report:
 
@@ -37,6 +39,7 @@ class Report:
         template_dir = os.path.dirname(path) or '.'
         template_file_name = os.path.basename(path)
         
+        from jinja2 import Environment, FileSystemLoader
         env = Environment(loader=FileSystemLoader(template_dir))
         return env.get_template(template_file_name)
 
@@ -47,6 +50,7 @@ class Report:
         if not os.path.isdir(dir_path):
             raise NotADirectoryError(f"O caminho especificado não é um diretório: {dir_path}")
             
+        import sideseeing
         ds = sideseeing.SideSeeingDS(root_dir=dir_path)
         title = f"Relatório de '{os.path.basename(dir_path)}'"
         return title, ds
@@ -203,7 +207,8 @@ class Report:
 
 
 
-dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
-out_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/out/report.html'
-r = Report()
-r.generate_report(dir_path, out_path)
\ No newline at end of file
+if __name__ == "__main__":
+    dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
+    out_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/out/report.html'
+    r = Report()
+    r.generate_report(dir_path, out_path)
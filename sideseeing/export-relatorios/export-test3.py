@@ -1,14 +1,16 @@
+from __future__ import annotations
+
 import os
 import io
 import base64
 import json
 import importlib.resources
-import pandas as pd
-import matplotlib.pyplot as plt
-import sideseeing, plot
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader, Template, PackageLoader
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+
+if TYPE_CHECKING: # Só para as anotações: as dependências pesadas são importadas onde são usadas
+    import sideseeing
+    from jinja2 import Template
 
 class Report:
 
@@ -39,6 +41,7 @@ class Report:
         template_dir = os.path.dirname(path) or '.'
         template_file_name = os.path.basename(path)
         
+        from jinja2 import Environment, FileSystemLoader
         env = Environment(loader=FileSystemLoader(template_dir))
         return env.get_template(template_file_name)
 
@@ -49,6 +52,7 @@ class Report:
         if not os.path.isdir(dir_path):
             raise NotADirectoryError(f"O caminho especificado não é um diretório: {dir_path}")
             
+        import sideseeing
         ds = sideseeing.SideSeeingDS(root_dir=dir_path)
         title = f"Relatório de '{os.path.basename(dir_path)}'"
         return title, ds
@@ -218,7 +222,8 @@ class Report:
         print(f"Relatório salvo com sucesso em: {output_path}")
 
 
-dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
-out_path = '/home/renzo/Documents/GitHub/sideseeing-tools/coisas/out/report.html'
-r = Report()
-r.generate_report(dir_path, out_path)
\ No newline at end of file
+if __name__ == "__main__":
+    dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
+    out_path = '/home/renzo/Documents/GitHub/sideseeing-tools/coisas/out/report.html'
+    r = Report()
+    r.generate_report(dir_path, out_path)
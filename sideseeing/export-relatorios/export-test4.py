@@ -1,15 +1,16 @@
+from __future__ import annotations
+
 import os
 import io
 import base64
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from . import sideseeing, plot
 import shutil
 import importlib.resources
 from datetime import datetime
-from jinja2 import Environment, PackageLoader
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+
+if TYPE_CHECKING: # Só para as anotações: as dependências pesadas são importadas onde são usadas
+    from . import sideseeing
 
 class Report:
 
@@ -20,6 +21,7 @@ class Report:
         """
         Inicializa a classe Report.
         """
+        from jinja2 import Environment, PackageLoader
         env = Environment(
             loader=PackageLoader(self.DEFAULT_TEMPLATE_PACKAGE.split('.')[0], 
                                  self.DEFAULT_TEMPLATE_PACKAGE.split('.', 1)[1])
@@ -34,6 +36,7 @@ class Report:
         if not os.path.isdir(dir_path):
             raise NotADirectoryError(f"O caminho especificado não é um diretório: {dir_path}")
             
+        from . import sideseeing
         ds = sideseeing.SideSeeingDS(root_dir=dir_path)
         title = f"Relatório de '{os.path.basename(dir_path)}'"
         return title, ds
@@ -223,8 +226,9 @@ class Report:
 
 # --- SEU SCRIPT DE TESTE ---
 
-dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
-out_path = '/home/renzo/Documents/GitHub/sideseeing-tools/coisas/out/report.html'
+if __name__ == "__main__":
+    dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
+    out_path = '/home/renzo/Documents/GitHub/sideseeing-tools/coisas/out/report.html'
 
-r = Report()
-r.generate_report(dir_path, out_path)
\ No newline at end of file
+    r = Report()
+    r.generate_report(dir_path, out_path)
@@ -1,12 +1,14 @@
+from __future__ import annotations
+
 import os
 import io
 import base64
-import pandas as pd
-import matplotlib.pyplot as plt
-import sideseeing, plot
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader, Template
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+
+if TYPE_CHECKING: # Só para as anotações: as dependências pesadas são importadas onde são usadas
+    import sideseeing
+    from jinja2 import Template
 
 class Report:
 
@@ -36,6 +38,7 @@ class Report:
         template_dir = os.path.dirname(path) or '.'
         template_file_name = os.path.basename(path)
         
+        from jinja2 import Environment, FileSystemLoader
         env = Environment(loader=FileSystemLoader(template_dir))
         return env.get_template(template_file_name)
 
@@ -46,6 +49,7 @@ class Report:
         if not os.path.isdir(dir_path):
             raise NotADirectoryError(f"O caminho especificado não é um diretório: {dir_path}")
             
+        import sideseeing
         ds = sideseeing.SideSeeingDS(root_dir=dir_path)
         title = f"Relatório de '{os.path.basename(dir_path)}'"
         return title, ds
@@ -86,6 +90,8 @@ class Report:
         Processa os dados de sensores usando a função externa plot_sensor para cada instância.
         """
         print("Processando dados de sensores...")
+        import matplotlib.pyplot as plt
+        import plot
         html_components = []
         plotter = plot.SideSeeingPlotter(ds)
         sensors_axis = {
@@ -173,7 +179,8 @@ class Report:
         print(f"Relatório salvo com sucesso em: {output_path}")
 
 
-dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
-out_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/out/1.html'
-r = Report()
-r.generate_report(dir_path, out_path)
+if __name__ == "__main__":
+    dir_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/dataset'
+    out_path = '/home/renzo/Documents/GitHub/temp-SideSeeing-Exporter/out/1.html'
+    r = Report()
+    r.generate_report(dir_path, out_path)